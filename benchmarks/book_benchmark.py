@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Measure the memory used per Book and the rate at which Books are
+constructed, from distinct CSV-like rows.
+
+Usage: python3 benchmarks/book_benchmark.py [number_of_books]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book, bkFields
+
+DEFAULT_COUNT = 1000000
+
+
+def make_rows(count):
+    '''
+    Make count distinct rows keyed by CSV column title, as read by
+    csv.DictReader.
+    '''
+    rows = []
+    for i in range(count):
+        rows.append({
+            'ISBN': '{:010d}'.format(i),
+            'ISBN10': '{:010d}'.format(i),
+            'ISBN13': 'Unknown',
+            'LCCN': 'Unknown',
+            'Title': 'Title {}'.format(i),
+            'Author': 'Author {}'.format(i % 5000),
+            'Binding': 'Paperback',
+            'Publisher': 'Publisher {}'.format(i % 1000),
+            'Published': 'December 1985',
+            'UsedPrice': '$3.59'})
+    return rows
+
+
+def main():
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    else:
+        count = DEFAULT_COUNT
+
+    print('Making {} rows...'.format(count))
+    rows = make_rows(count)
+
+    # Memory: only count what the books add on top of the row strings
+    gc.collect()
+    tracemalloc.start()
+    books = [Book(**row) for row in rows]
+    used, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Check the books hold what they were given
+    assert books[-1].title == rows[-1]['Title']
+    assert books[-1].isbn13 == 'Unknown'
+    assert len(bkFields) == 10
+
+    del books
+    gc.collect()
+
+    # Speed
+    started = time.perf_counter()
+    books = [Book(**row) for row in rows]
+    elapsed = time.perf_counter() - started
+    assert len(books) == count
+
+    print('Books:          {}'.format(count))
+    print('Bytes per book: {:.1f}'.format(used / count))
+    print('Books/s:        {:.0f}'.format(count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Measure the time DuplicateFinder takes over a generated library, and
+how many of the planted duplicates it finds. A tenth of the books are
+given a near duplicate: a copy with a typo, different case or
+punctuation, no ISBN, or an ISBN-10 instead of an ISBN-13.
+
+Usage: python3 benchmarks/dedup_benchmark.py [number_of_books] [workers]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book, UNKNOWN
+from booksearch.duplicates import DuplicateFinder
+from booksearch.identifier import isbn13_check_digit
+
+DEFAULT_COUNT = 100000
+
+SYLLABLES = '''
+ka lo mi ra ten vor est al ur bin cha del fen gor han is jul kem lan mor
+nus or pel qua ris sol tur ul ven wes xan yor zel ber cor dan el fir
+'''.split()
+
+
+def make_words(count, chooser):
+    '''Make count distinct made up words of two to four syllables.'''
+    words = set()
+    while len(words) < count:
+        words.add(''.join(
+            chooser.choice(SYLLABLES) for i in range(chooser.randrange(2, 5))))
+    return sorted(words)
+
+
+def isbn10(n):
+    digits = '{:09d}'.format(n)
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits))
+    check = (11 - total % 11) % 11
+    return digits + ('X' if check == 10 else str(check))
+
+
+def isbn13(n):
+    digits = '978{:09d}'.format(n)
+    return digits + isbn13_check_digit(digits)
+
+
+def near_duplicate(book, chooser):
+    change = chooser.randrange(4)
+    title = book.title
+    isbn = book.isbn
+    if change == 0:
+        # A typo
+        i = chooser.randrange(len(title))
+        title = title[:i] + chooser.choice('abcdefghijklmnopqrstuvwxyz') + title[i + 1:]
+        isbn = UNKNOWN
+    elif change == 1:
+        title = title.upper() + '.'
+        isbn = UNKNOWN
+    elif change == 2:
+        title = 'The ' + title.replace(' ', ', ', 1)
+        isbn = UNKNOWN
+    return Book(isbn=isbn, title=title, author=book.author)
+
+
+def make_books(count, seed=1):
+    '''Make the books, and the set of (original, duplicate) index pairs.'''
+    chooser = random.Random(seed)
+    words = make_words(5000, chooser)
+    names = make_words(1000, chooser)
+    books = []
+    planted = []
+    originals = int(count / 1.1)
+    for n in range(originals):
+        title = ' '.join(chooser.choice(words) for i in range(chooser.randrange(2, 7)))
+        author = '{}, {}'.format(
+            chooser.choice(names).title(), chooser.choice(names).title())
+        books.append(Book(isbn=isbn13(n), title=title.title(), author=author))
+    while len(books) < count:
+        original = chooser.randrange(originals)
+        book = near_duplicate(books[original], chooser)
+        if book.isbn == books[original].isbn:
+            book.isbn = isbn10(original)
+        planted.append((original, len(books)))
+        books.append(book)
+    return books, planted
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    books, planted = make_books(count)
+
+    finder = DuplicateFinder(workers=workers)
+    started = time.perf_counter()
+    clusters = finder.find(books)
+    elapsed = time.perf_counter() - started
+
+    cluster_of = {}
+    for number, cluster in enumerate(clusters):
+        for book in cluster:
+            cluster_of[id(book)] = number
+    found = len([
+        1 for original, duplicate in planted
+        if id(books[original]) in cluster_of and
+        cluster_of.get(id(books[original])) == cluster_of.get(id(books[duplicate]))])
+
+    print('{} books, {} workers: {:.2f}s'.format(count, finder.workers, elapsed))
+    print('{} distinct titles, {} pairs compared, {} matched'.format(
+        finder.records, finder.candidates, finder.matches))
+    print('{} clusters of {} books, largest {}'.format(
+        len(clusters), sum(len(c) for c in clusters),
+        max([len(c) for c in clusters] or [0])))
+    print('Planted duplicates found: {}/{}'.format(found, len(planted)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Measure the time taken to export a library of generated books in each
+format, and how far the process's peak memory grows beyond that of
+the books themselves while exporting, which should be next to nothing
+whatever the number of books.
+
+Usage: python3 benchmarks/export_benchmark.py [number_of_books]
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book, UNKNOWN
+from booksearch.exporter import export_books, FORMATS
+
+DEFAULT_COUNT = 1000000
+
+
+def make_books(count):
+    return [
+        Book(isbn='978{:010d}'.format(n),
+             title='Title <{}> & "Subtitle"'.format(n),
+             author=UNKNOWN if n % 7 == 0 else 'Author\t{}'.format(n % 5000),
+             binding='Paperback',
+             publisher='Publisher {}'.format(n % 300),
+             published='1999')
+        for n in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    books = make_books(count)
+    print('{} books'.format(count))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format in sorted(FORMATS):
+            filename = os.path.join(directory, 'library.' + export_format)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            started = time.perf_counter()
+            exported = export_books(books, filename)
+            elapsed = time.perf_counter() - started
+            grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+            assert exported == count
+            print('{:<6} {:6.2f}s, {:6.1f}MB written, peak memory grew {:6.2f}MB'.format(
+                export_format, elapsed, os.path.getsize(filename) / 1e6, grown / 1024))
+
+
+if __name__ == '__main__':
+    main()
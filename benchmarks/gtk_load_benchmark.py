@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Measure how long GTKLibrary takes to open a generated library and draw
+its window, and how much memory it uses, for each way of filling the
+view:
+
+    rows     a row appended and set at a time, as it used to be
+    bulk     the BookListStore filled in bulk before it is shown
+    virtual  the LibraryTreeModel, drawing rows from the library
+
+Each is run in a process of its own, so the memory figures are apart.
+Needs PyGObject and a display.
+
+Usage: python3 benchmarks/gtk_load_benchmark.py [number_of_books]
+"""
+
+import csv
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import bkFields, UNKNOWN
+
+DEFAULT_COUNT = 100000
+
+MODES = ('rows', 'bulk', 'virtual')
+
+
+def write_library(filename, count):
+    with open(filename, 'wt') as library_file:
+        writer = csv.writer(library_file, lineterminator='\n', delimiter='|')
+        writer.writerow([f[1] for f in bkFields])
+        for n in range(count):
+            writer.writerow([
+                '978{:010d}'.format(n), UNKNOWN, UNKNOWN, UNKNOWN,
+                'Title & Subtitle {}'.format(n),
+                UNKNOWN if n % 7 == 0 else 'Author {}'.format(n % 5000),
+                'Paperback', 'Publisher {}'.format(n % 300), '1999', UNKNOWN])
+
+
+def load(mode, filename):
+    '''Open the library in this process, returning the figures.'''
+    from gi.repository import Gtk
+    from booksearch.gtkLibrary import GTKLibrary
+    from booksearch.gtkBookModel import COLUMN_ISBN, COLUMN_TITLE, COLUMN_AUTHOR, \
+        COLUMN_REFERENCE, COLUMN_STATUS, cell_markup
+    from booksearch.library import Library
+
+    class RowByRowLibrary(GTKLibrary):
+        '''Fills the model as GTKLibrary used to.'''
+
+        def read_from_file(self):
+            Library.read_from_file(self)
+            for book in self.book_list:
+                iter = self.book_model.append()
+                self.book_model.set(
+                    iter,
+                    COLUMN_ISBN, book.isbn,
+                    COLUMN_TITLE, cell_markup(book.title),
+                    COLUMN_AUTHOR, cell_markup(book.author),
+                    COLUMN_REFERENCE, book,
+                    COLUMN_STATUS, '')
+
+    library_class = RowByRowLibrary if mode == 'rows' else GTKLibrary
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    library = library_class(
+        filename=filename, searchers={}, virtual=(mode == 'virtual'))
+    loaded = time.perf_counter() - started
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+    shown = time.perf_counter() - started
+
+    return dict(
+        mode=mode,
+        books=library.book_count,
+        loaded=loaded,
+        shown=shown,
+        memory=(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        print(json.dumps(load(sys.argv[2], sys.argv[3])))
+        sys.stdout.flush()
+        # Don't let the window save the library on the way out
+        os._exit(0)
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    if importlib.util.find_spec('gi') is None:
+        sys.exit('### PyGObject is needed for this benchmark.')
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'library.csv')
+        write_library(filename, count)
+        print('{} books'.format(count))
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, filename],
+                stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            figures = json.loads(output.strip().splitlines()[-1])
+            print('{mode:<8} loaded in {loaded:6.2f}s, shown in {shown:6.2f}s, '
+                  '{memory:7.1f}MB'.format(**figures))
+
+
+if __name__ == '__main__':
+    main()
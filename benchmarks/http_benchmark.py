@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Compare the per-lookup latency of OpenLibraryOrg using a new urlopen
+connection per lookup against the shared keep-alive HTTPClient, using
+the local stand-in server. The server delays each new connection to
+stand in for a TCP and TLS handshake.
+
+Usage: python3 benchmarks/http_benchmark.py [lookups] [connect_delay_ms]
+"""
+
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.httpClient import HTTPClient, Response
+from booksearch.isbnSearch import OpenLibraryOrg, Modes
+
+from standin_server import StandInServer, make_openlibrary_entries
+
+
+class UrlopenClient(object):
+    '''A client opening a new connection per request, as urlopen does.'''
+
+    def get(self, url, timeout=None):
+        page = urllib.request.urlopen(url, timeout=timeout)
+        return Response(url, page.status, page.reason, page.headers, page.read())
+
+
+def run(searcher, isbns):
+    started = time.perf_counter()
+    for isbn in isbns:
+        book = searcher.search(isbn, Modes.ISBN)
+        assert book.author != 'Unknown'
+    return (time.perf_counter() - started) / len(isbns)
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    connect_delay = float(sys.argv[2]) / 1000.0 if len(sys.argv) > 2 else 0.02
+
+    entries = make_openlibrary_entries(lookups)
+    isbns = [key.split(':')[1] for key in entries]
+
+    server = StandInServer(openlibrary=entries, connect_delay=connect_delay).start()
+    try:
+        searcher = OpenLibraryOrg()
+        server.point_searchers(open_library=searcher)
+
+        searcher.set_http_client(UrlopenClient())
+        before = dict(server.counts)
+        urlopen_latency = run(searcher, isbns)
+        urlopen_connections = server.counts['connections'] - before['connections']
+
+        client = HTTPClient()
+        searcher.set_http_client(client)
+        before = dict(server.counts)
+        pooled_latency = run(searcher, isbns)
+        pooled_connections = server.counts['connections'] - before['connections']
+        client.close()
+    finally:
+        server.stop()
+
+    print('Lookups: {}, connection delay: {:.0f} ms'.format(
+        lookups, connect_delay * 1000))
+    print('urlopen:    {:7.2f} ms/lookup, {} connections'.format(
+        urlopen_latency * 1000, urlopen_connections))
+    print('HTTPClient: {:7.2f} ms/lookup, {} connections'.format(
+        pooled_latency * 1000, pooled_connections))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure the rate at which books are loaded from a library CSV file,
+comparing csv.DictReader with Book(**row) against csv.reader with
+Book.from_row, and check that both give the same books.
+
+Usage: python3 benchmarks/load_benchmark.py [number_of_books]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book, bkFields
+from booksearch.library import Library
+
+DEFAULT_COUNT = 200000
+
+
+def write_library(filename, count):
+    with open(filename, 'wt') as library_file:
+        writer = csv.writer(library_file, lineterminator='\n', delimiter='|')
+        writer.writerow([f[1] for f in bkFields])
+        for i in range(count):
+            writer.writerow([
+                '{:010d}'.format(i),
+                '{:010d}'.format(i),
+                'Unknown',
+                '',
+                ' Title {} '.format(i),
+                'Author {}'.format(i % 5000),
+                'Paperback',
+                'Publisher {}'.format(i % 1000),
+                'December 1985',
+                '$3.59'])
+
+
+def load_dict_reader(filename):
+    with open(filename, 'rt') as library_file:
+        return [Book(**row) for row in csv.DictReader(library_file, delimiter='|')]
+
+
+def load_from_row(filename):
+    with open(filename, 'rt') as library_file:
+        reader = csv.reader(library_file, delimiter='|')
+        positions = Book.header_positions(next(reader))
+        return [Book.from_row(row, positions) for row in reader if row]
+
+
+def timed(name, count, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    print('{:<28} {:>10.0f} books/s'.format(name, count / elapsed))
+    return result
+
+
+def main():
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    else:
+        count = DEFAULT_COUNT
+
+    handle, filename = tempfile.mkstemp(suffix='.csv')
+    os.close(handle)
+    try:
+        write_library(filename, count)
+
+        by_dict = timed('DictReader + Book(**row)', count, load_dict_reader, filename)
+        by_row = timed('reader + Book.from_row', count, load_from_row, filename)
+
+        library = Library(filename)
+        timed('Library.read_from_file', count, library.read_from_file)
+
+        # Both paths must give the same books
+        assert len(by_dict) == len(by_row) == library.book_count
+        for a, b in zip(by_dict, by_row):
+            assert a.as_dict() == b.as_dict()
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
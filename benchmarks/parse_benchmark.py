@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare the time taken to extract the book details from saved
+www.isbnsearch.org pages (benchmarks/fixtures) by the single pass
+HTMLParser extractor, and by the BeautifulSoup parsing that
+ISBNSearchOrg used before it (if bs4 is installed).
+
+Usage: python3 benchmarks/parse_benchmark.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.isbnSearchParser import parse_isbnsearch_page
+
+try:
+    from bs4 import BeautifulSoup, SoupStrainer
+    HAVE_SOUP = True
+except ImportError:
+    HAVE_SOUP = False
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+DEFAULT_REPEATS = 2000
+
+
+def parse_with_soup(page):
+    '''The book details as ISBNSearchOrg found them with BeautifulSoup.'''
+    book_data = {}
+    soup = BeautifulSoup(page, 'html.parser', parse_only=SoupStrainer('div'))
+
+    try:
+        book_data['title'] = soup.h2.string.replace('&', '&amp;')
+    except AttributeError:
+        pass
+
+    for label in soup.find_all('strong'):
+        if label.string == 'ISBN-13:':
+            book_data['isbn13'] = label.find_next_sibling('a').contents[0]
+        if label.string == 'ISBN-10:':
+            book_data['isbn10'] = label.find_next_sibling('a').contents[0]
+        if label.string == 'Author:':
+            book_data['author'] = label.nextSibling.string.replace('&', '&amp;')
+        if label.string == 'Authors:':
+            book_data['author'] = label.nextSibling.replace('&', '&amp;')
+        if label.string == 'Binding:':
+            book_data['binding'] = label.nextSibling.replace('&', '&amp;')
+        if label.string == 'Publisher:':
+            book_data['publisher'] = label.nextSibling.replace('&', '&amp;')
+        if label.string == 'Published:':
+            book_data['published'] = label.nextSibling.replace('&', '&amp;')
+
+    try:
+        book_data['usedPrice'] = ','.join(str(c) for c in soup.find_all('table', class_='prices')[1].tbody.tr.td.find_next_sibling(class_='price').p.a.contents)
+    except IndexError:
+        pass
+
+    return dict((field, value.strip()) for field, value in book_data.items())
+
+
+def time_parser(parse, page, repeats):
+    started = time.perf_counter()
+    for i in range(repeats):
+        parse(page)
+    return (time.perf_counter() - started) / repeats
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+
+    if not HAVE_SOUP:
+        print('bs4 is not installed, timing the HTMLParser extractor only')
+
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(FIXTURES, name), 'rb') as page_file:
+            page = page_file.read()
+
+        fast = parse_isbnsearch_page(page)
+        print('{} ({} bytes)'.format(name, len(page)))
+        print('    HTMLParser:    {:8.1f} us/page'.format(
+            time_parser(parse_isbnsearch_page, page, repeats) * 1e6))
+
+        if HAVE_SOUP:
+            soup = parse_with_soup(page)
+            print('    BeautifulSoup: {:8.1f} us/page'.format(
+                time_parser(parse_with_soup, page, repeats) * 1e6))
+            for field in sorted(set(fast) | set(soup)):
+                if fast.get(field) != soup.get(field):
+                    print('    {}: {!r} (BeautifulSoup {!r})'.format(
+                        field, fast.get(field), soup.get(field)))
+
+        for field, value in sorted(fast.items()):
+            print('    {:10} {}'.format(field, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Measure the search pipeline offline. A stand-in server, run in its own
+process, replays the recorded OpenLibrary and isbnsearch.org answers in
+benchmarks/fixtures for a set of generated ISBNs, with optional latency
+and injected errors. Each scenario looks the ISBNs up and reports the
+lookups per second, the p50/p95/p99 lookup latency and the CPU time
+used per lookup (by this process only, not the server).
+
+The results are saved as JSON, by default to
+benchmarks/results/replay-<commit>.json, and can be compared with the
+results of an earlier commit using --compare.
+
+Usage: python3 benchmarks/replay_benchmark.py [options]
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+from booksearch.book import Book, UNKNOWN
+from booksearch.httpClient import HTTPClient
+from booksearch.identifier import isbn13_check_digit
+from booksearch.isbnSearch import Modes, ISBNSearchOrg, OpenLibraryOrg, SearchPool
+from booksearch.library import Library
+from booksearch.requery import Requery
+from booksearch.scheduler import RequestScheduler
+from booksearch.textLibrary import TextLibrary
+
+from standin_server import StandInServer, point_searchers
+
+FIXTURES = os.path.join(BENCHMARKS, 'fixtures')
+RESULTS = os.path.join(BENCHMARKS, 'results')
+
+# The ISBN in the recorded answers, replaced by each generated ISBN
+RECORDED_ISBN = '9780141439518'
+
+SCENARIOS = (
+    'openlibrary',
+    'isbnsearch',
+    'find_book',
+    'find_book_concurrent',
+    'bulk_batched',
+    'bulk_requery')
+
+
+def make_isbns(count, start=978100000000):
+    '''Make count valid ISBN-13s.'''
+    isbns = []
+    for i in range(count):
+        digits = str(start + i)
+        isbns.append(digits + isbn13_check_digit(digits))
+    return isbns
+
+
+def make_answers(isbns, missing, seed):
+    '''
+    Make the server's OpenLibrary entries and isbnsearch.org pages for
+    the ISBNs, from the recorded fixtures. A fraction (missing) of the
+    ISBNs are left out, as unknown to both sites. Returns the entries,
+    the pages and the set of ISBNs left out.
+    '''
+    with open(os.path.join(FIXTURES, 'openlibrary_books.json'), 'rt') as f:
+        entry = json.load(f)['ISBN:' + RECORDED_ISBN]
+    with open(os.path.join(FIXTURES, 'isbnsearch_found.html'), 'rt') as f:
+        page = f.read()
+
+    chooser = random.Random(seed)
+    left_out = set(i for i in isbns if chooser.random() < missing)
+
+    entries = {}
+    pages = {}
+    for isbn in isbns:
+        if isbn in left_out:
+            continue
+        isbn_entry = copy.deepcopy(entry)
+        isbn_entry['identifiers']['isbn_13'] = [isbn]
+        entries['ISBN:' + isbn] = isbn_entry
+        pages[isbn] = page.replace(RECORDED_ISBN, isbn)
+    return entries, pages, left_out
+
+
+def serve(connection, **settings):
+    '''Run the stand-in server, answering commands from the connection.'''
+    server = StandInServer(**settings).start()
+    connection.send(server.url)
+    while True:
+        command = connection.recv()
+        if command == 'counts':
+            connection.send(dict(server.counts))
+        else:
+            break
+    server.stop()
+
+
+class ServerProcess(object):
+    '''The stand-in server, run in a child process.'''
+
+    def __init__(self, **settings):
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=serve, args=(child,), kwargs=settings)
+        self._process.daemon = True
+        self._process.start()
+        self.url = self._connection.recv()
+
+    def counts(self):
+        self._connection.send('counts')
+        return self._connection.recv()
+
+    def stop(self):
+        self._connection.send('stop')
+        self._process.join()
+
+
+class TimedRequery(Requery):
+    '''A Requery recording the latency of each book's queries.'''
+
+    def __init__(self, *args, **kwargs):
+        Requery.__init__(self, *args, **kwargs)
+        self.latencies = []
+
+    def query(self, identifier, mode):
+        started = time.perf_counter()
+        answers = Requery.query(self, identifier, mode)
+        self.latencies.append(time.perf_counter() - started)
+        return answers
+
+    def write_checkpoint(self, identifiers):
+        pass
+
+
+def make_searchers(url, args):
+    '''Make searchers pointed at the server, sharing a client and scheduler.'''
+    client = HTTPClient()
+    scheduler = RequestScheduler(
+        max_retries=args.retries,
+        backoff_base=args.backoff / 1000.0,
+        seed=args.seed)
+
+    open_library = OpenLibraryOrg()
+    isbn_search = ISBNSearchOrg()
+    for searcher in (open_library, isbn_search):
+        searcher.set_http_client(client)
+        searcher.set_scheduler(scheduler)
+    point_searchers(url, open_library=open_library, isbn_search=isbn_search)
+
+    searchers = {
+        Modes.ISBN: [isbn_search, open_library],
+        Modes.LCCN: [open_library]}
+    return searchers, client
+
+
+def run_searcher(searcher, isbns):
+    latencies = []
+    books = []
+    for isbn in isbns:
+        started = time.perf_counter()
+        books.append(searcher.search(isbn, Modes.ISBN))
+        latencies.append(time.perf_counter() - started)
+    return latencies, books
+
+
+def run_find_book(searchers, isbns, workers, directory):
+    search_pool = SearchPool(max_workers=workers) if workers > 0 else None
+    library = TextLibrary(
+        os.path.join(directory, 'library.csv'),
+        searchers=searchers,
+        noquestions=True,
+        search_pool=search_pool,
+        journal=True)
+    latencies = []
+    for isbn in isbns:
+        started = time.perf_counter()
+        library.find_book(isbn)
+        latencies.append(time.perf_counter() - started)
+    library.save_to_file()
+    if search_pool is not None:
+        search_pool.shutdown()
+    return latencies, library.book_list
+
+
+def run_bulk_batched(searcher, isbns):
+    '''Each lookup waits for its whole batch, so that is its latency.'''
+    latencies = []
+    books = []
+    for start in range(0, len(isbns), searcher.batch_size):
+        chunk = isbns[start:start + searcher.batch_size]
+        started = time.perf_counter()
+        books.extend(searcher.search_many(chunk, Modes.ISBN))
+        latencies.extend([time.perf_counter() - started] * len(chunk))
+    return latencies, books
+
+
+def run_bulk_requery(searchers, isbns, workers, directory):
+    library = Library(os.path.join(directory, 'library.csv'))
+    for isbn in isbns:
+        library.add_book(Book(isbn=isbn))
+    requery = TimedRequery(
+        library,
+        searchers,
+        max_workers=workers,
+        progress_interval=3600)
+    requery.run()
+    return requery.latencies, library.book_list
+
+
+def percentile(values, percent):
+    '''The nearest-rank percentile of the sorted values.'''
+    if len(values) == 0:
+        return None
+    rank = int(round(percent / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+def run_scenario(name, server, isbns, left_out, args):
+    searchers, client = make_searchers(server.url, args)
+    open_library = searchers[Modes.LCCN][0]
+    isbn_search = searchers[Modes.ISBN][0]
+
+    before = server.counts()
+    with tempfile.TemporaryDirectory() as directory, \
+            open(os.devnull, 'wt') as devnull, \
+            redirect_stdout(devnull):
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+
+        if name == 'openlibrary':
+            latencies, books = run_searcher(open_library, isbns)
+        elif name == 'isbnsearch':
+            latencies, books = run_searcher(isbn_search, isbns)
+        elif name == 'find_book':
+            latencies, books = run_find_book(searchers, isbns, 0, directory)
+        elif name == 'find_book_concurrent':
+            latencies, books = run_find_book(
+                searchers, isbns, args.workers, directory)
+        elif name == 'bulk_batched':
+            latencies, books = run_bulk_batched(open_library, isbns)
+        elif name == 'bulk_requery':
+            latencies, books = run_bulk_requery(
+                searchers, isbns, args.workers, directory)
+
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+    client.close()
+    after = server.counts()
+
+    # A lookup failed if a known book came back without an author
+    failed = len([b for b in books
+                  if b.isbn not in left_out and b.author == UNKNOWN])
+
+    latencies.sort()
+    return {
+        'lookups': len(isbns),
+        'seconds': round(elapsed, 4),
+        'lookups_per_second': round(len(isbns) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'cpu_ms_per_lookup': round(cpu / len(isbns) * 1000, 3),
+        'failed': failed,
+        'requests': after['requests'] - before['requests'],
+        'connections': after['connections'] - before['connections'],
+        'errors': after['errors'] - before['errors']}
+
+
+def git_commit():
+    '''The current commit, with a + if the tree has changes, or None.'''
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BENCHMARKS, stderr=subprocess.DEVNULL).decode().strip()
+        changes = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=BENCHMARKS, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + '+' if changes else commit
+
+
+def print_results(results, baseline=None):
+    print('{:<22} {:>10} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+        'scenario', 'lookups/s', 'p50 ms', 'p95 ms', 'p99 ms', 'cpu ms', 'failed'))
+    for name, r in results['scenarios'].items():
+        print('{:<22} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.3f} {:>7}'.format(
+            name, r['lookups_per_second'], r['p50_ms'], r['p95_ms'],
+            r['p99_ms'], r['cpu_ms_per_lookup'], r['failed']))
+        if baseline is not None and name in baseline['scenarios']:
+            b = baseline['scenarios'][name]
+            print('{:<22} {:>+9.1f}% {:>+8.1f}% {:>+8.1f}% {:>+8.1f}% {:>+8.1f}%'.format(
+                '  vs ' + str(baseline.get('commit')),
+                change(r['lookups_per_second'], b['lookups_per_second']),
+                change(r['p50_ms'], b['p50_ms']),
+                change(r['p95_ms'], b['p95_ms']),
+                change(r['p99_ms'], b['p99_ms']),
+                change(r['cpu_ms_per_lookup'], b['cpu_ms_per_lookup'])))
+
+
+def change(new, old):
+    if old == 0:
+        return 0.0
+    return (new - old) * 100.0 / old
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the search pipeline against a local stand-in server')
+    parser.add_argument(
+        "-n", "--lookups", type=int, default=200,
+        help="number of ISBNs looked up by each scenario (default: %(default)s)")
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="milliseconds the server waits before answering (default: %(default)s)")
+    parser.add_argument(
+        "--connect-delay", type=float, default=0.0,
+        help="milliseconds the server waits on each new connection (default: %(default)s)")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0,
+        help="fraction of requests answered with --error-status (default: %(default)s)")
+    parser.add_argument(
+        "--error-status", type=int, default=503,
+        help="HTTP status of the injected errors (default: %(default)s)")
+    parser.add_argument(
+        "--missing", type=float, default=0.1,
+        help="fraction of ISBNs unknown to both sites (default: %(default)s)")
+    parser.add_argument(
+        "--retries", type=int, default=3,
+        help="retries of failed requests (default: %(default)s)")
+    parser.add_argument(
+        "--backoff", type=float, default=10.0,
+        help="milliseconds of backoff before the first retry (default: %(default)s)")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4,
+        help="workers used by the concurrent scenarios (default: %(default)s)")
+    parser.add_argument(
+        "-s", "--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+        help="run only this scenario, may be repeated (default: all)")
+    parser.add_argument(
+        "--seed", type=int, default=1,
+        help="seed for the missing ISBNs, errors and backoff (default: %(default)s)")
+    parser.add_argument(
+        "-o", "--output", default=None,
+        help="JSON results file (default: benchmarks/results/replay-<commit>.json)")
+    parser.add_argument(
+        "--compare", default=None, metavar="FILE",
+        help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    isbns = make_isbns(args.lookups)
+    entries, pages, left_out = make_answers(isbns, args.missing, args.seed)
+
+    server = ServerProcess(
+        openlibrary=entries,
+        isbnsearch=pages,
+        latency=args.latency / 1000.0,
+        connect_delay=args.connect_delay / 1000.0,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed)
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': dict(
+            (k, v) for k, v in vars(args).items()
+            if k not in ('output', 'compare', 'scenarios')),
+        'scenarios': {}}
+
+    try:
+        for name in args.scenarios or SCENARIOS:
+            results['scenarios'][name] = run_scenario(
+                name, server, isbns, left_out, args)
+    finally:
+        server.stop()
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'rt') as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS, exist_ok=True)
+        output = os.path.join(
+            RESULTS, 'replay-{}.json'.format(commit or 'unknown'))
+    with open(output, 'wt') as output_file:
+        json.dump(results, output_file, indent=2)
+        output_file.write('\n')
+    print('Results saved to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the time taken to look books up with the searchers asked in a
+fixed order against the order chosen by AdaptiveSearchers, with stand-in
+searchers: the first listed slow and usually missing, as a site that has
+gone downhill would be, the second quick and usually finding the book.
+Each lookup stops at the first searcher to find the book, as the text
+mode does without --fill.
+
+Usage: python3 benchmarks/searcher_order_benchmark.py [lookups]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import UNKNOWN
+from booksearch.isbnSearch import BaseSearcher, Modes
+from booksearch.searcherRanking import AdaptiveSearchers
+from booksearch.searchStats import SearchStats
+
+
+class StandInSearcher(BaseSearcher):
+    '''Finds a book with the given chance, after the given delay.'''
+
+    def __init__(self, name, delay, hit_rate, seed):
+        super(StandInSearcher, self).__init__()
+        self.name = name
+        self.delay = delay
+        self.hit_rate = hit_rate
+        self._random = random.Random(seed)
+
+    def lookup(self, isbn, mode):
+        time.sleep(self.delay)
+        if self._random.random() < self.hit_rate:
+            return {'isbn': isbn, 'title': 'Title', 'author': 'Author'}
+        return None
+
+
+def run(searchers, lookups):
+    started = time.perf_counter()
+    found = 0
+    for n in range(lookups):
+        book = None
+        for searcher in searchers[Modes.ISBN]:
+            book = searcher.search('978{:010d}'.format(n), Modes.ISBN, book=book)
+            if book.author != UNKNOWN:
+                found += 1
+                break
+    return (time.perf_counter() - started) / lookups, found
+
+
+def make_searchers(stats):
+    slow = StandInSearcher('slow.example', delay=0.02, hit_rate=0.3, seed=1)
+    quick = StandInSearcher('quick.example', delay=0.005, hit_rate=0.9, seed=2)
+    for searcher in (slow, quick):
+        searcher.set_stats(stats)
+    return {Modes.ISBN: [slow, quick]}
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    fixed_latency, fixed_found = run(make_searchers(SearchStats()), lookups)
+
+    stats = SearchStats()
+    adaptive = AdaptiveSearchers(make_searchers(stats), stats=stats, seed=3)
+    adaptive_latency, adaptive_found = run(adaptive, lookups)
+
+    print('{} lookups'.format(lookups))
+    print('fixed    {:6.1f}ms per lookup, {} found'.format(
+        fixed_latency * 1000, fixed_found))
+    print('adaptive {:6.1f}ms per lookup, {} found'.format(
+        adaptive_latency * 1000, adaptive_found))
+
+
+if __name__ == '__main__':
+    main()
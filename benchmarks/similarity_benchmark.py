@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of the field similarity scoring: compare_many
+against scoring one pair at a time, for each available backend, and
+Book.update_unknowns merging conflicting books against the comparison
+it used to make (lower casing and scoring every field with its own
+SequenceMatcher call).
+
+Usage: python3 benchmarks/similarity_benchmark.py [number_of_pairs]
+"""
+
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch import book as book_module
+from booksearch.book import (
+    Book, bkFields, UNKNOWN, FUZZ_FACTOR, SIMILARITY_BACKENDS,
+    clear_similarity_cache, compare_many, set_similarity_backend, similarity)
+
+DEFAULT_COUNT = 20000
+
+WORDS = '''
+river house night garden shadow city winter light history war empire
+secret stone fire island journey music letter memory silence ocean
+mountain queen king daughter son road glass bird forest machine world
+'''.split()
+
+
+def vary(value, chooser):
+    '''Return the value with a change a second source might make.'''
+    change = chooser.randrange(4)
+    if change == 0:
+        return value.upper()
+    if change == 1:
+        i = chooser.randrange(len(value))
+        return value[:i] + 'x' + value[i + 1:]
+    if change == 2:
+        return value + ' : ' + chooser.choice(WORDS).title()
+    return ' '.join(chooser.choice(WORDS) for i in range(4)).title()
+
+
+def make_pairs(count, seed=1):
+    chooser = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        value = ' '.join(
+            chooser.choice(WORDS) for i in range(chooser.randrange(2, 6))).title()
+        pairs.append((vary(value, chooser), value))
+    return pairs
+
+
+def make_books(pairs):
+    '''Pairs of books conflicting in title, author and publisher.'''
+    books = []
+    for n, (first, second) in enumerate(pairs):
+        books.append((
+            dict(title=first, author=second[::-1], publisher='Publisher {}'.format(n % 50)),
+            dict(title=second, author=first[::-1], publisher='Publisher {}'.format(n % 70))))
+    return books
+
+
+def old_update_unknowns(book, resolver=None, **kwargs):
+    '''Book.update_unknowns as it was before compare_many.'''
+    sm = SequenceMatcher()
+    for f in bkFields:
+        if getattr(book, f[0]) == UNKNOWN:
+            setattr(book, f[0], kwargs.get(f[0], kwargs.get(f[1], UNKNOWN)))
+        else:
+            new = kwargs.get(f[0], '')
+            if isinstance(new, list):
+                new = ','.join(new)
+            new = new.lower()
+            old = getattr(book, f[0])
+            if isinstance(old, list):
+                old = ','.join(old)
+            old = old.lower()
+            if new != '' and new != old:
+                sm.set_seqs(new, old)
+                # The old scale, which put every difference to the resolver
+                ratio = int(sm.ratio() * 10)
+                if ratio < FUZZ_FACTOR:
+                    if resolver is not None:
+                        setattr(book, f[0], resolver(f[0], new, old))
+
+
+def rate(count, function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    pairs = make_pairs(count)
+
+    print('{} field pairs'.format(count))
+    for name in sorted(SIMILARITY_BACKENDS):
+        set_similarity_backend(name)
+
+        clear_similarity_cache()
+        one_at_a_time = rate(
+            count, lambda: [similarity(a, b) for a, b in pairs])
+        clear_similarity_cache()
+        batched = rate(count, compare_many, pairs)
+        clear_similarity_cache()
+        thresholded = rate(count, compare_many, pairs, FUZZ_FACTOR)
+        print('{:<11} one at a time {:>9.0f}/s, compare_many {:>9.0f}/s, '
+              'with threshold {:>9.0f}/s'.format(
+                  name, one_at_a_time, batched, thresholded))
+
+    set_similarity_backend(book_module.similarity_backend)
+    books = make_books(pairs)
+    silent = lambda field, new, old: old
+
+    clear_similarity_cache()
+
+    def merge_old():
+        for first, second in books:
+            old_update_unknowns(
+                Book(isbn='1', **first), resolver=silent, **second)
+
+    def merge_new():
+        for first, second in books:
+            Book(isbn='1', **first).update_unknowns(resolver=silent, **second)
+
+    print('update_unknowns ({}): before {:.0f} merges/s, now {:.0f} merges/s'.format(
+        book_module.similarity_backend, rate(count, merge_old), rate(count, merge_new)))
+
+
+if __name__ == '__main__':
+    main()
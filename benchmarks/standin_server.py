@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for openlibrary.org and www.isbnsearch.org, for
+measuring the searchers without using the real sites.
+
+The server answers the OpenLibrary books API (/api/books?bibkeys=...)
+from a dictionary of bibkey to JSON entry, and isbnsearch.org pages
+(/isbn/<isbn>) from a dictionary of ISBN to HTML. It keeps connections
+alive, gzips responses when asked, and can add latency per request,
+a delay per new connection (standing in for a TLS handshake), and
+errors.
+"""
+
+import gzip
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    # Send the headers and body without waiting for acknowledgements
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+        if self.server.connect_delay > 0:
+            time.sleep(self.server.connect_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, content_type, body):
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body)
+            gzipped = True
+        else:
+            gzipped = False
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if server.error_rate > 0 and server.random.random() < server.error_rate:
+            server.count('errors')
+            self.send_body(server.error_status, 'text/plain', b'error')
+            return
+
+        parts = urllib.parse.urlsplit(self.path)
+
+        if parts.path == '/api/books':
+            query = urllib.parse.parse_qs(parts.query)
+            answer = {}
+            for bibkeys in query.get('bibkeys', []):
+                for bibkey in bibkeys.split(','):
+                    if bibkey in server.openlibrary:
+                        answer[bibkey] = server.openlibrary[bibkey]
+            self.send_body(
+                200, 'application/json', json.dumps(answer).encode())
+
+        elif parts.path.startswith('/isbn/'):
+            page = server.isbnsearch.get(parts.path[len('/isbn/'):])
+            if page is None:
+                self.send_body(404, 'text/html', b'<html>Not found</html>')
+            else:
+                self.send_body(200, 'text/html; charset=utf-8', page.encode())
+
+        else:
+            self.send_body(404, 'text/plain', b'unknown')
+
+
+class StandInServer(ThreadingHTTPServer):
+    '''
+    The stand-in server, listening on a free port of localhost. Use
+    start and stop to run it on a background thread.
+    '''
+
+    daemon_threads = True
+
+    def __init__(
+            self,
+            openlibrary=None,
+            isbnsearch=None,
+            latency=0.0,
+            connect_delay=0.0,
+            error_rate=0.0,
+            error_status=503,
+            seed=1):
+
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+
+        self.openlibrary = openlibrary if openlibrary is not None else {}
+        self.isbnsearch = isbnsearch if isbnsearch is not None else {}
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+
+        self.counts = {'connections': 0, 'requests': 0, 'errors': 0}
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def count(self, name):
+        with self._count_lock:
+            self.counts[name] += 1
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def point_searchers(self, open_library=None, isbn_search=None):
+        '''Point the given searchers at this server.'''
+        point_searchers(self.url, open_library, isbn_search)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def point_searchers(url, open_library=None, isbn_search=None):
+    '''Point the given searchers at the stand-in server at url.'''
+    if open_library is not None:
+        open_library.isbn_url = url + '/api/books?bibkeys=ISBN:{}&format=json&jscmd=data'
+        open_library.lccn_url = url + '/api/books?bibkeys=LCCN:{}&format=json&jscmd=data'
+        open_library.bibkeys_url = url + '/api/books?bibkeys={}&format=json&jscmd=data'
+    if isbn_search is not None:
+        isbn_search.search_url = url + '/isbn/'
+
+
+def make_openlibrary_entries(count, start=9780000000000):
+    '''Make count OpenLibrary books API entries keyed by ISBN bibkey.'''
+    entries = {}
+    for i in range(count):
+        isbn = str(start + i)
+        entries['ISBN:' + isbn] = {
+            'title': 'Title {}'.format(i),
+            'authors': [{'name': 'Author {}'.format(i % 100), 'url': ''}],
+            'publishers': [{'name': 'Publisher {}'.format(i % 10)}],
+            'publish_date': '1985',
+            'identifiers': {'isbn_13': [isbn]}}
+    return entries
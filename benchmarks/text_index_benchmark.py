@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Measure how long a TextIndex takes to build over a generated library,
+to answer word and prefix queries, and to follow books being added,
+edited and removed, against scanning every book for each query.
+
+Usage: python3 benchmarks/text_index_benchmark.py [number_of_books]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book
+from booksearch.textIndex import TextIndex, book_tokens, query_terms
+
+DEFAULT_COUNT = 500000
+
+SYLLABLES = '''
+ka lo mi ra ten vor est al ur bin cha del fen gor han is jul kem lan mor
+nus or pel qua ris sol tur ul ven wes xan yor zel ber cor dan el fir
+'''.split()
+
+
+def make_words(count, chooser):
+    '''Make count distinct made up words of two to four syllables.'''
+    words = set()
+    while len(words) < count:
+        words.add(''.join(
+            chooser.choice(SYLLABLES) for i in range(chooser.randrange(2, 5))))
+    return sorted(words)
+
+
+def make_books(count, seed=1):
+    chooser = random.Random(seed)
+    words = make_words(20000, chooser)
+    names = make_words(5000, chooser)
+    publishers = ['{} {}'.format(chooser.choice(names).title(), kind)
+                  for kind in ('Press', 'Books', 'Publishing') for i in range(100)]
+    books = []
+    for n in range(count):
+        title = ' '.join(chooser.choice(words) for i in range(chooser.randrange(2, 7)))
+        author = '{}, {}'.format(
+            chooser.choice(names).title(), chooser.choice(names).title())
+        books.append(Book(
+            isbn=str(n), title=title.title(), author=author,
+            publisher=chooser.choice(publishers)))
+    return books, words, names
+
+
+def scan(books, text):
+    '''Answer a query by looking at every book.'''
+    terms = query_terms(text)
+    return [
+        book for book in books
+        if all(any(t.startswith(term) for t in book_tokens(book)) for term in terms)]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    books, words, names = make_books(count)
+    chooser = random.Random(2)
+
+    index, elapsed = timed(TextIndex, books)
+    print('{} books, {} distinct words: built in {:.1f}s'.format(
+        count, len(index), elapsed / 1000))
+
+    queries = []
+    for i in range(20):
+        queries.append(chooser.choice(words))
+        queries.append(chooser.choice(words)[:3])
+        queries.append('{} {}'.format(chooser.choice(names), chooser.choice(words)[:4]))
+        queries.append(chooser.choice(SYLLABLES))
+
+    times = []
+    for query in queries:
+        found, elapsed = timed(index.search, query, 20)
+        times.append(elapsed)
+    times.sort()
+    print('{} queries: median {:.2f}ms, worst {:.2f}ms'.format(
+        len(times), times[len(times) // 2], times[-1]))
+
+    query = queries[0]
+    found, elapsed = timed(index.search, query)
+    scanned, scan_elapsed = timed(scan, books, query)
+    assert set(found) == set(scanned)
+    print('"{}": {} books in {:.2f}ms, {:.0f}ms scanning every book'.format(
+        query, len(found), elapsed, scan_elapsed))
+
+    def edit():
+        for book in books[:1000]:
+            new = book.title + ' Revised'
+            index.changed(book, 'title', book.title, new)
+            book.title = new
+        for book in books[1000:2000]:
+            index.remove(book)
+        for book in books[1000:2000]:
+            index.add(book)
+
+    result, elapsed = timed(edit)
+    print('3000 edits, removals and additions: {:.1f}us each'.format(
+        elapsed * 1000 / 3000))
+
+
+if __name__ == '__main__':
+    main()
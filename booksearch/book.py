@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 
+import functools
+import unicodedata
 from difflib import SequenceMatcher
 
+# The similarity backends, fastest first
+try:
+    from rapidfuzz import fuzz as rapidfuzz_fuzz
+    HAVE_RAPIDFUZZ = True
+except ImportError:
+    HAVE_RAPIDFUZZ = False
+
 try:
     from fuzzywuzzy import fuzz
     HAVE_FUZZ = True
@@ -41,26 +50,146 @@ bkFields = [
 # The string used for unknown book fields.
 UNKNOWN = 'Unknown'
 
-# A sequence matcher from the standard library to determine if
-# two conflicting book field values are worth bothering the user
-# about.
-SM = SequenceMatcher()
-
-# A fuzz factor that determines the tolerance for the diff
+# A fuzz factor that determines the tolerance for the diff: two
+# conflicting book field values less similar than this (0 to 100) are
+# worth bothering the user about.
 FUZZ_FACTOR = 60
 
+# The number of normalised field values remembered
+NORMALISED_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=NORMALISED_CACHE_SIZE)
+def normalise(value):
+    '''
+    Return the form of a field value that is compared for similarity:
+    case folded, without accents, and with whitespace runs collapsed.
+    Remembered, as the same values are compared again and again.
+    '''
+    value = unicodedata.normalize('NFKD', value.casefold())
+    if not value.isascii():
+        value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(value.split())
+
+
+@functools.lru_cache(maxsize=NORMALISED_CACHE_SIZE)
+def _sequence_matcher_ratio(first, second):
+    '''
+    Score a pair with difflib. Remembered, as merges see the same pairs
+    of publishers, bindings and so on again and again.
+    '''
+    return int(round(SequenceMatcher(None, first, second).ratio() * 100))
+
+
+def _sequence_matcher_many(pairs, threshold):
+    '''
+    Score the pairs with difflib, skipping the comparison of pairs whose
+    lengths are too different to reach the threshold.
+    '''
+    scores = []
+    for first, second in pairs:
+        if threshold > 0:
+            # An upper bound from the lengths alone. The score is the
+            # ratio rounded, so it can only fall short of the threshold
+            # if the bound is more than half a point below it
+            total = len(first) + len(second)
+            if total > 0:
+                bound = 200 * min(len(first), len(second)) / total
+                if bound < threshold - 0.5:
+                    scores.append(int(round(bound)))
+                    continue
+        scores.append(_sequence_matcher_ratio(first, second))
+    return scores
+
+
+def _ratio_many(ratio):
+    '''Make a compare_many backend from a ratio(first, second) function.'''
+    def many(pairs, threshold):
+        return [int(round(ratio(first, second))) for first, second in pairs]
+    return many
+
+
+# The similarity backends by name, each scoring a list of pairs of
+# normalised values from 0 to 100. A score below the threshold may
+# be a lower score than the true one.
+SIMILARITY_BACKENDS = {'difflib': _sequence_matcher_many}
+if HAVE_FUZZ:
+    SIMILARITY_BACKENDS['fuzzywuzzy'] = _ratio_many(fuzz.ratio)
+if HAVE_RAPIDFUZZ:
+    SIMILARITY_BACKENDS['rapidfuzz'] = _ratio_many(rapidfuzz_fuzz.ratio)
+
+# The backend used, the fastest available unless set_similarity_backend
+# chooses another
+similarity_backend = (
+    'rapidfuzz' if HAVE_RAPIDFUZZ else
+    'fuzzywuzzy' if HAVE_FUZZ else
+    'difflib')
+
+
+def set_similarity_backend(name):
+    '''Choose the similarity backend, by its SIMILARITY_BACKENDS name.'''
+    global similarity_backend
+    if name not in SIMILARITY_BACKENDS:
+        raise ValueError('No similarity backend {}, have: {}'.format(
+            name, ', '.join(sorted(SIMILARITY_BACKENDS))))
+    similarity_backend = name
+
+
+def compare_many(pairs, threshold=0):
+    '''
+    Return the similarity, from 0 to 100, of each (first, second) pair of
+    field values, compared in their normalised forms. Scores below the
+    threshold are only guaranteed to be below it, which lets some
+    backends skip work.
+    '''
+    normalised = [(normalise(first), normalise(second)) for first, second in pairs]
+    return SIMILARITY_BACKENDS[similarity_backend](normalised, threshold)
+
+
+def clear_similarity_cache():
+    '''Forget the remembered normalised values and scores.'''
+    normalise.cache_clear()
+    _sequence_matcher_ratio.cache_clear()
+
+
+def similarity(first, second, threshold=0):
+    '''Return the similarity, from 0 to 100, of two field values.'''
+    return compare_many([(first, second)], threshold)[0]
+
 
 def check_and_sanitise(s):
     # TODO: Parse the input string for non-escaped html entities
     pass
 
 
+def clean_value(value):
+    '''
+    Return the value as stored in a book field: stripped of surrounding
+    whitespace, lists joined with commas, and UNKNOWN if empty.
+    '''
+    if isinstance(value, list):
+        value = ','.join(value)
+    if value == '' or value is None:
+        return UNKNOWN
+    return value.strip()
+
+
+# The attribute names holding the book fields, in bkFields order.
+_FIELD_SLOTS = tuple('_' + f[0] for f in bkFields)
+
+
 class Book(object):
     '''
     A class to hold book information. The information held is based
     upon the bkFields list of tuples.
+
+    The fields are held in slots rather than a per-instance dictionary
+    to keep large libraries small and quick to load. Books can be weakly
+    referenced, so that a library need only keep those in use.
     '''
 
+    __slots__ = _FIELD_SLOTS + ('_observers', '__weakref__')
+
     def __init__(self, **kwargs):
         '''
         Initialise the book from the given keyword arguments
@@ -69,7 +198,51 @@ class Book(object):
         with a preference for the property name. If neither are found,
         UNKNOWN is used as the default.
         '''
-        self.update(**kwargs)
+        # A new book has no observers, so set the slots directly
+        # rather than through the property setters.
+        self._observers = None
+        for f, slot in zip(bkFields, _FIELD_SLOTS):
+            value = kwargs.get(f[0])
+            if value is None:
+                value = kwargs.get(f[1])
+            setattr(self, slot, clean_value(value))
+
+    @staticmethod
+    def header_positions(header):
+        '''
+        Resolve a CSV header row to the position of each of bkFields'
+        columns (or None if absent), matching the property name (f[0])
+        in preference to the column name (f[1]), as the constructor does.
+        Resolve once per file, then build books with from_row.
+        '''
+        # Like csv.DictReader, the last of any repeated names wins
+        columns = {}
+        for position, name in enumerate(header):
+            columns[name] = position
+
+        positions = []
+        for f in bkFields:
+            position = columns.get(f[0])
+            if position is None:
+                position = columns.get(f[1])
+            positions.append(position)
+        return positions
+
+    @classmethod
+    def from_row(cls, row, positions):
+        '''
+        Create a book from a list of CSV values, as read by csv.reader,
+        using the positions returned by header_positions.
+        '''
+        book = cls.__new__(cls)
+        book._observers = None
+        length = len(row)
+        for slot, position in zip(_FIELD_SLOTS, positions):
+            if position is None or position >= length:
+                setattr(book, slot, UNKNOWN)
+            else:
+                setattr(book, slot, clean_value(row[position]))
+        return book
 
     def update(self, **kwargs):
         '''
@@ -92,12 +265,14 @@ class Book(object):
     def update_unknowns(self, resolver=None, **kwargs):
         '''
         Update the book information from the given keyword arguments,
-        but only if the current book information is UNKNOWN.
+        but only if the current book information is UNKNOWN. Known
+        values that differ by more than FUZZ_FACTOR allows are given to
+        the resolver, as resolver(field, new, old), to choose between.
         '''
-        global HAVE_FUZZ
-
+        conflicts = []
         for f in bkFields:
-            if getattr(self, f[0]) == UNKNOWN:
+            old = getattr(self, f[0])
+            if old == UNKNOWN:
                 # We have an UNKNOWN value, just update it
                 setattr(
                     self,
@@ -108,33 +283,43 @@ class Book(object):
                             f[1],
                             UNKNOWN)))
             else:
-                # Get the new an old values, do a fuzzy comparison,
-                # and resolve (or not) based on user input.
-
                 new = kwargs.get(f[0], '')
                 if isinstance(new, list):
                     new = ','.join(new)
-                new = new.lower()
-
-                old = getattr(self, f[0])
-                if isinstance(old, list):
-                    old = ','.join(old)
-                old = old.lower()
-
-                if new != '' and new != old:
-                    if HAVE_FUZZ:
-                        ratio = fuzz.ratio(new, old)
-                    else:
-                        SM.set_seqs(new, old)
-                        ratio = int(SM.ratio() * 10)
-                    if ratio < FUZZ_FACTOR:
-                        if resolver is not None:
-                            choice = resolver(f[0], new, old)
-                            setattr(self, f[0], choice)
-                        else:
-                            print('Not setting different values for: {}'.format(f[0]))
-                            print('\tnew:{}\n\told:{}\n\tratio:{}'.format(
-                                new, old, ratio))
+                if new == '' or new == UNKNOWN or new == old:
+                    continue
+                if normalise(new) != normalise(old):
+                    conflicts.append((f[0], new, old))
+
+        if len(conflicts) == 0:
+            return
+
+        # Score all the conflicting fields at once, and resolve (or not)
+        # based on user input.
+        ratios = compare_many(
+            [(new, old) for field, new, old in conflicts], FUZZ_FACTOR)
+        for (field, new, old), ratio in zip(conflicts, ratios):
+            if ratio < FUZZ_FACTOR:
+                if resolver is not None:
+                    choice = resolver(field, new, old)
+                    setattr(self, field, choice)
+                else:
+                    print('Not setting different values for: {}'.format(field))
+                    print('\tnew:{}\n\told:{}\n\tratio:{}'.format(
+                        new, old, ratio))
+
+    def as_dict(self, known_only=False):
+        '''
+        Return the book fields as a dictionary keyed by property name,
+        suitable for passing to update or update_unknowns. If known_only
+        is True, fields that are UNKNOWN are left out.
+        '''
+        fields = {}
+        for f in bkFields:
+            value = getattr(self, f[0])
+            if not known_only or value != UNKNOWN:
+                fields[f[0]] = value
+        return fields
 
     def display_unknowns(self, **kwargs):
         '''
@@ -145,6 +330,34 @@ class Book(object):
             if getattr(self, f[0]) == UNKNOWN:
                 print('\t', f[0])
 
+    def add_observer(self, observer):
+        '''
+        Register an object to be told about changes to this book's fields.
+        The observer must provide a book_changed(book, field, old, new)
+        method.
+        '''
+        if self._observers is None:
+            self._observers = []
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        '''
+        Stop telling the given observer about changes to this book.
+        '''
+        try:
+            self._observers.remove(observer)
+        except (AttributeError, ValueError):
+            pass
+
+    def _notify(self, field, old, new):
+        '''
+        Tell all observers that a field has changed value.
+        '''
+        if old != new and self._observers:
+            for observer in self._observers:
+                observer.book_changed(self, field, old, new)
+
     # def unknown_title(self):
     #     if self.title == UNKNOWN:
     #         self.title = input('Enter Unknown title:')
@@ -168,10 +381,10 @@ class Book(object):
 
     @isbn.setter
     def isbn(self, value):
-        if value == '' or value is None:
-            self._isbn = UNKNOWN
-        else:
-            self._isbn = value.strip()
+        old = self._isbn
+        self._isbn = clean_value(value)
+        if self._observers:
+            self._notify('isbn', old, self._isbn)
 
     @property
     def isbn10(self):
@@ -182,10 +395,10 @@ class Book(object):
 
     @isbn10.setter
     def isbn10(self, value):
-        if value == '' or value is None:
-            self._isbn10 = UNKNOWN
-        else:
-            self._isbn10 = value.strip()
+        old = self._isbn10
+        self._isbn10 = clean_value(value)
+        if self._observers:
+            self._notify('isbn10', old, self._isbn10)
 
     @property
     def isbn13(self):
@@ -196,10 +409,10 @@ class Book(object):
 
     @isbn13.setter
     def isbn13(self, value):
-        if value == '' or value is None:
-            self._isbn13 = UNKNOWN
-        else:
-            self._isbn13 = value.strip()
+        old = self._isbn13
+        self._isbn13 = clean_value(value)
+        if self._observers:
+            self._notify('isbn13', old, self._isbn13)
 
     @property
     def lccn(self):
@@ -210,10 +423,10 @@ class Book(object):
 
     @lccn.setter
     def lccn(self, value):
-        if value == '' or value is None:
-            self._lccn = UNKNOWN
-        else:
-            self._lccn = value.strip()
+        old = self._lccn
+        self._lccn = clean_value(value)
+        if self._observers:
+            self._notify('lccn', old, self._lccn)
 
     @property
     def title(self):
@@ -224,10 +437,10 @@ class Book(object):
 
     @title.setter
     def title(self, value):
-        if value == '' or value is None:
-            self._title = UNKNOWN
-        else:
-            self._title = value.strip()
+        old = self._title
+        self._title = clean_value(value)
+        if self._observers:
+            self._notify('title', old, self._title)
 
     @property
     def author(self):
@@ -235,10 +448,10 @@ class Book(object):
 
     @author.setter
     def author(self, value):
-        if value == '' or value is None:
-            self._author = UNKNOWN
-        else:
-            self._author = value.strip()
+        old = self._author
+        self._author = clean_value(value)
+        if self._observers:
+            self._notify('author', old, self._author)
 
     @property
     def binding(self):
@@ -246,10 +459,10 @@ class Book(object):
 
     @binding.setter
     def binding(self, value):
-        if value == '' or value is None:
-            self._binding = UNKNOWN
-        else:
-            self._binding = value.strip()
+        old = self._binding
+        self._binding = clean_value(value)
+        if self._observers:
+            self._notify('binding', old, self._binding)
 
     @property
     def publisher(self):
@@ -257,10 +470,10 @@ class Book(object):
 
     @publisher.setter
     def publisher(self, value):
-        if value == '' or value is None:
-            self._publisher = UNKNOWN
-        else:
-            self._publisher = value.strip()
+        old = self._publisher
+        self._publisher = clean_value(value)
+        if self._observers:
+            self._notify('publisher', old, self._publisher)
 
     @property
     def published(self):
@@ -268,10 +481,10 @@ class Book(object):
 
     @published.setter
     def published(self, value):
-        if value == '' or value is None:
-            self._published = UNKNOWN
-        else:
-            self._published = value.strip()
+        old = self._published
+        self._published = clean_value(value)
+        if self._observers:
+            self._notify('published', old, self._published)
 
     @property
     def usedPrice(self):
@@ -279,12 +492,10 @@ class Book(object):
 
     @usedPrice.setter
     def usedPrice(self, value):
-        if isinstance(value, list):
-            self._usedPrice = ','.join(value)
-        elif value == '' or value is None:
-            self._usedPrice = UNKNOWN
-        else:
-            self._usedPrice = value.strip()
+        old = self._usedPrice
+        self._usedPrice = clean_value(value)
+        if self._observers:
+            self._notify('usedPrice', old, self._usedPrice)
 
     def __repr__(self):
         return 'Book(isbn="' + self._isbn + \
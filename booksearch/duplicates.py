@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Find clusters of duplicate books in a library without comparing every
+pair of books.
+
+Books are first matched exactly: on any equivalent ISBN (an ISBN-10
+matches its ISBN-13), and on identical normalised title and author.
+The distinct titles left are then blocked with MinHash locality
+sensitive hashing over their character trigrams, and only the pairs
+sharing a bucket are scored, with the same FUZZ_FACTOR similarity used
+when merging books.
+"""
+
+import hashlib
+import os
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from .book import UNKNOWN, FUZZ_FACTOR, compare_many
+from .identifier import canonical_isbn
+
+# Each title is put in BANDS buckets, each keyed by the ROWS smallest
+# trigram hashes under a different hash function (a bottom-k MinHash).
+# Titles whose trigram sets have a Jaccard similarity of about
+# (1 / BANDS) ** (1 / ROWS) or more are likely to share a bucket.
+BANDS = 12
+ROWS = 6
+
+# Buckets larger than this are split by author surname before scoring,
+# and any group of the split still larger is left unscored
+MAX_BUCKET = 200
+
+# The number of items handed to a worker process at a time
+CHUNK_SIZE = 5000
+
+# Below this many distinct titles the work is done in this process
+MIN_PARALLEL = 20000
+
+# 30 bit hashes, which Python handles fastest
+_SEEDS = [random.Random(n).getrandbits(30) for n in range(BANDS)]
+
+_NOT_WORDS = re.compile(r'[\W_]+')
+_ARTICLES = ('the ', 'a ', 'an ')
+_AUTHOR_SEPARATORS = re.compile(r';|&| and ')
+
+
+def normalise_title(title):
+    '''
+    Return the title lower cased, with punctuation and a leading article
+    removed, or '' if it is unknown.
+    '''
+    if title == UNKNOWN:
+        return ''
+    title = _NOT_WORDS.sub(' ', title.lower()).strip()
+    for article in _ARTICLES:
+        if title.startswith(article):
+            return title[len(article):]
+    return title
+
+
+def normalise_author(author):
+    '''Return the author lower cased without punctuation, or ''.'''
+    if author == UNKNOWN:
+        return ''
+    return _NOT_WORDS.sub(' ', author.lower()).strip()
+
+
+def author_key(author):
+    '''
+    Return the surname of the first author, lower cased: the part before
+    a comma ("Austen, Jane"), or else the last word ("Jane Austen").
+    '''
+    if author == UNKNOWN:
+        return ''
+    first = _AUTHOR_SEPARATORS.split(author, 1)[0]
+    if ',' in first:
+        first = first.split(',', 1)[0]
+    else:
+        words = first.split()
+        first = words[-1] if words else ''
+    return _NOT_WORDS.sub('', first.lower())
+
+
+def band_keys(titles):
+    '''
+    Return, for each normalised title, the keys of the LSH buckets it
+    falls in: one per band of its MinHash signature.
+    '''
+    hashes = {}
+    keys = []
+    for title in titles:
+        padded = ' {} '.format(title)
+        shingles = set(padded[i:i + 3] for i in range(len(padded) - 2))
+        values = []
+        for shingle in shingles:
+            value = hashes.get(shingle)
+            if value is None:
+                value = int.from_bytes(hashlib.blake2b(
+                    shingle.encode(), digest_size=4).digest(), 'little') >> 2
+                hashes[shingle] = value
+            values.append(value)
+
+        keys.append([
+            hash((band,) + tuple(sorted(map(seed.__xor__, values))[:ROWS]))
+            for band, seed in enumerate(_SEEDS)])
+    return keys
+
+
+# The titles and authors being scored, set in each worker process
+_titles = None
+_authors = None
+
+
+def _set_records(titles, authors):
+    global _titles, _authors
+    _titles = titles
+    _authors = authors
+
+
+def score_pairs(pairs, threshold):
+    '''
+    Return the (first, second, score) of the pairs of records whose titles
+    are at least threshold similar, as are their authors if both known.
+    '''
+    scores = compare_many(
+        [(_titles[first], _titles[second]) for first, second in pairs],
+        threshold)
+    matches = [
+        (first, second, score)
+        for (first, second), score in zip(pairs, scores)
+        if score >= threshold]
+
+    # Both authors known, so they must match too
+    known = [
+        (first, second) for first, second, score in matches
+        if _authors[first] and _authors[second]]
+    scores = compare_many(
+        [(_authors[first], _authors[second]) for first, second in known],
+        threshold)
+    different = set(
+        pair for pair, score in zip(known, scores) if score < threshold)
+
+    return [m for m in matches if (m[0], m[1]) not in different]
+
+
+class _Clusters(object):
+    '''A union-find forest over the book indexes.'''
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        i = self.find(i)
+        j = self.find(j)
+        if i != j:
+            if j < i:
+                i, j = j, i
+            self.parent[j] = i
+
+
+class DuplicateFinder(object):
+    '''
+    Finds clusters of duplicate books. Books are duplicates if they share
+    an ISBN (in either form), have the same normalised title and author,
+    or have titles (and known authors) at least threshold similar.
+
+    The MinHash signatures and the scoring of candidate pairs are spread
+    over workers processes (by default, one per CPU). Buckets of titles
+    too large to score, even once split by author surname, are counted
+    in oversized.
+    '''
+
+    def __init__(self, threshold=FUZZ_FACTOR, workers=None, max_bucket=MAX_BUCKET):
+        self.threshold = threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.max_bucket = max_bucket
+
+        # Statistics
+        self.records = 0
+        self.candidates = 0
+        self.matches = 0
+        self.oversized = 0
+
+    def _map(self, executor, function, items, *args):
+        '''Apply function to chunks of items, returning the results in order.'''
+        chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+        if executor is None:
+            results = [function(chunk, *args) for chunk in chunks]
+        else:
+            results = executor.map(function, chunks, *[[a] * len(chunks) for a in args])
+        combined = []
+        for result in results:
+            combined.extend(result)
+        return combined
+
+    def find(self, books):
+        '''
+        Return the clusters of duplicates among the books: a list of lists
+        of two or more books, each in the order given.
+        '''
+        clusters = _Clusters(len(books))
+
+        # Equivalent ISBNs, and identical normalised titles and authors
+        isbns = {}
+        records = {}
+        record_books = []
+        for i, book in enumerate(books):
+            for value in (book.isbn, book.isbn10, book.isbn13):
+                key = canonical_isbn(value)
+                if key is not None:
+                    first = isbns.setdefault(key, i)
+                    if first != i:
+                        clusters.union(first, i)
+
+            title = normalise_title(book.title)
+            if title == '':
+                continue
+            record = (title, normalise_author(book.author))
+            first = records.setdefault(record, i)
+            if first == i:
+                record_books.append(i)
+            else:
+                clusters.union(first, i)
+
+        # Each distinct title and author is a record to be blocked
+        titles = [normalise_title(books[i].title) for i in record_books]
+        authors = [normalise_author(books[i].author) for i in record_books]
+        surnames = [author_key(books[i].author) for i in record_books]
+        self.records = len(titles)
+
+        executor = None
+        if self.workers > 1 and len(titles) >= MIN_PARALLEL:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_set_records,
+                initargs=(titles, authors))
+        try:
+            buckets = {}
+            for record, keys in enumerate(self._map(executor, band_keys, titles)):
+                for key in keys:
+                    buckets.setdefault(key, []).append(record)
+
+            pairs = set()
+            self.oversized = 0
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                if len(bucket) > self.max_bucket:
+                    blocks = {}
+                    for record in bucket:
+                        blocks.setdefault(surnames[record], []).append(record)
+                    groups = []
+                    for block in blocks.values():
+                        if len(block) <= self.max_bucket:
+                            groups.append(block)
+                        else:
+                            self.oversized += 1
+                else:
+                    groups = [bucket]
+                for group in groups:
+                    for n, first in enumerate(group):
+                        for second in group[n + 1:]:
+                            pairs.add((first, second))
+            self.candidates = len(pairs)
+
+            if executor is None:
+                _set_records(titles, authors)
+            matches = self._map(executor, score_pairs, sorted(pairs), self.threshold)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.matches = len(matches)
+
+        for first, second, score in matches:
+            clusters.union(record_books[first], record_books[second])
+
+        groups = {}
+        for i in range(len(books)):
+            groups.setdefault(clusters.find(i), []).append(books[i])
+        return [g for root, g in sorted(groups.items()) if len(g) > 1]
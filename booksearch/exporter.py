@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Export the books of a library as XML, JSON Lines or tab separated
+values, with every field. The books are turned into text a line at a
+time by a chain of generators and written as they come, so the output
+is never held in memory whatever the size of the library.
+"""
+
+import json
+import operator
+import os
+import re
+import stat
+import tempfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from .book import bkFields
+
+# The export formats, and the file name extensions taken to mean them
+(
+    FORMAT_XML,
+    FORMAT_JSONL,
+    FORMAT_TSV
+) = ('xml', 'jsonl', 'tsv')
+
+FORMAT_EXTENSIONS = {
+    '.xml': FORMAT_XML,
+    '.jsonl': FORMAT_JSONL,
+    '.tsv': FORMAT_TSV}
+
+# The number of lines gathered into each write
+WRITE_LINES = 1024
+
+# Characters that may not appear in an XML 1.0 document at all
+_XML_INVALID = re.compile(
+    '[^\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+_TSV_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r'})
+
+
+def format_for(filename):
+    '''Return the export format meant by the file name's extension.'''
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError('No export format for {}, have: {}'.format(
+            filename, ', '.join(sorted(FORMAT_EXTENSIONS))))
+    return FORMAT_EXTENSIONS[extension]
+
+
+def book_rows(books):
+    '''Yield a tuple of each book's field values, in bkFields order.'''
+    values = operator.attrgetter(*[f[0] for f in bkFields])
+    for book in books:
+        yield values(book)
+
+
+def xml_text(value):
+    '''Return a field value escaped as XML character data.'''
+    return escape(_XML_INVALID.sub('', value))
+
+
+def xml_lines(rows):
+    '''Yield the lines of an XML document with a book element per row.'''
+    book = '  <book>{}</book>\n'.format(
+        ''.join(['<{0}>{{}}</{0}>'.format(f[0]) for f in bkFields]))
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<library>\n'
+    for row in rows:
+        yield book.format(*[xml_text(value) for value in row])
+    yield '</library>\n'
+
+
+def jsonl_lines(rows):
+    '''Yield a line of JSON per row, an object keyed by property name.'''
+    names = [f[0] for f in bkFields]
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for row in rows:
+        yield encode(dict(zip(names, row))) + '\n'
+
+
+def tsv_text(value):
+    '''
+    Return a field value for a tab separated file, with backslashes,
+    tabs and line breaks escaped.
+    '''
+    return value.translate(_TSV_ESCAPES)
+
+
+def tsv_lines(rows):
+    '''Yield a heading line and then a tab separated line per row.'''
+    yield '\t'.join([f[1] for f in bkFields]) + '\n'
+    for row in rows:
+        yield '\t'.join([tsv_text(value) for value in row]) + '\n'
+
+
+# The line generators for each export format
+FORMATS = {
+    FORMAT_XML: xml_lines,
+    FORMAT_JSONL: jsonl_lines,
+    FORMAT_TSV: tsv_lines}
+
+
+def write_lines(filename, lines):
+    '''
+    Write the lines to the file as they are generated, a few at a time.
+    The file is written under a temporary name and renamed into place
+    once complete, so an export that fails leaves nothing half written.
+    A file replaced keeps its permissions.
+    '''
+    lines = iter(lines)
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, temp_filename = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wt', encoding='utf-8') as export_file:
+            while True:
+                chunk = ''.join(islice(lines, WRITE_LINES))
+                if not chunk:
+                    break
+                export_file.write(chunk)
+        try:
+            mode = stat.S_IMODE(os.stat(filename).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(temp_filename, mode)
+        os.replace(temp_filename, filename)
+    except:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def export_books(books, filename, export_format=None):
+    '''
+    Export the books to the file in the given format, or in the one its
+    extension means. Returns the number of books exported. Raises
+    ValueError for an unknown format and OSError if the file can't be
+    written.
+    '''
+    if export_format is None:
+        export_format = format_for(filename)
+    if export_format not in FORMATS:
+        raise ValueError('No export format {}, have: {}'.format(
+            export_format, ', '.join(sorted(FORMATS))))
+
+    count = 0
+
+    def counted(books):
+        nonlocal count
+        for book in books:
+            count += 1
+            yield book
+
+    write_lines(filename, FORMATS[export_format](book_rows(counted(books))))
+    return count
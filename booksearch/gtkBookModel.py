@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+The tree models behind the GTKLibrary view: a ListStore holding a row
+per book, loaded in bulk, and a virtual model rendering the rows from
+the library's book list only as they are drawn.
+"""
+
+import html
+
+from .book import UNKNOWN
+from gi.repository import Gtk, GObject
+
+(
+    COLUMN_ISBN,
+    COLUMN_AUTHOR,
+    COLUMN_TITLE,
+    COLUMN_REFERENCE,
+    COLUMN_STATUS
+) = list(range(5))
+
+COLUMN_TYPES = (
+    GObject.TYPE_STRING,
+    GObject.TYPE_STRING,
+    GObject.TYPE_STRING,
+    GObject.TYPE_PYOBJECT,
+    GObject.TYPE_STRING)
+
+# The columns showing the book's fields
+BOOK_COLUMNS = [COLUMN_ISBN, COLUMN_AUTHOR, COLUMN_TITLE]
+
+HIGHLIGHT = "<span background='yellow' foreground='black'>{}</span>"
+
+
+def cell_markup(value):
+    """Return a book field as cell markup, highlighted if unknown."""
+    if value == UNKNOWN:
+        return HIGHLIGHT.format(value)
+    return html.escape(value, quote=False)
+
+
+def book_row(book, status=''):
+    """Return the values of a book's row."""
+    return [
+        book.isbn,
+        cell_markup(book.author),
+        cell_markup(book.title),
+        book,
+        status]
+
+
+class BookListStore(Gtk.ListStore):
+    """A ListStore holding a row for each book."""
+
+    def __init__(self):
+        Gtk.ListStore.__init__(self, *COLUMN_TYPES)
+
+    def load_books(self, books):
+        """
+        Add a row for each of the books. Sorting is turned off while they
+        are added, so each row is appended rather than sorted into place.
+        The store should not be shown in a view meanwhile.
+        """
+        column, order = self.get_sort_column_id()
+        if column is not None:
+            self.set_sort_column_id(
+                Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, order)
+
+        append = self.append
+        for book in books:
+            append(book_row(book))
+
+        if column is not None:
+            self.set_sort_column_id(column, order)
+
+    def append_book(self, book):
+        """Add a row for a book just added to the library."""
+        return self.append(book_row(book))
+
+    def show_book(self, treeiter, status=None):
+        """Show the book's current fields, and the status if given."""
+        row = book_row(self.get_value(treeiter, COLUMN_REFERENCE))
+        if status is None:
+            self.set(treeiter, BOOK_COLUMNS, [row[c] for c in BOOK_COLUMNS])
+        else:
+            row[COLUMN_STATUS] = status
+            self.set(
+                treeiter,
+                BOOK_COLUMNS + [COLUMN_STATUS],
+                [row[c] for c in BOOK_COLUMNS + [COLUMN_STATUS]])
+
+    def remove_book_row(self, treeiter, book):
+        """Remove the row of a book removed from the library."""
+        self.remove(treeiter)
+
+    def path_for(self, book):
+        """Return the path of the book's row, or None."""
+        # Usually the book has just been added
+        if len(self) > 0 and self[-1][COLUMN_REFERENCE] is book:
+            return self[-1].path
+        for row in self:
+            if row[COLUMN_REFERENCE] is book:
+                return row.path
+        return None
+
+
+class LibraryTreeModel(GObject.GObject, Gtk.TreeModel):
+    """
+    A list model whose rows are the books in the library's book_list,
+    rendered only when the view asks for them. Nothing is stored per row
+    except the status of books being looked up, so it costs the same
+    however large the library. Its rows can't be sorted.
+
+    The library must tell the model about books it adds or removes, with
+    append_book and remove_book_row.
+    """
+
+    def __init__(self, library):
+        GObject.GObject.__init__(self)
+        self.library = library
+        self.statuses = {}
+
+    def load_books(self, books):
+        """The rows are the library's books, so there is nothing to load."""
+        pass
+
+    def _iter(self, index):
+        treeiter = Gtk.TreeIter()
+        # Offset by one, as a zero user_data reads back as None
+        treeiter.user_data = index + 1
+        return treeiter
+
+    def append_book(self, book):
+        """Show the row for a book just appended to the library."""
+        index = len(self.library.book_list) - 1
+        treeiter = self._iter(index)
+        self.row_inserted(Gtk.TreePath((index,)), treeiter)
+        return treeiter
+
+    def show_book(self, treeiter, status=None):
+        """Redraw the book's row, setting its status if given."""
+        if status is not None:
+            book = self.library.book_list[treeiter.user_data - 1]
+            if status:
+                self.statuses[book] = status
+            else:
+                self.statuses.pop(book, None)
+        self.row_changed(self.get_path(treeiter), treeiter)
+
+    def remove_book_row(self, treeiter, book):
+        """Remove the row of a book just removed from the library."""
+        self.statuses.pop(book, None)
+        self.row_deleted(Gtk.TreePath((treeiter.user_data - 1,)))
+
+    def path_for(self, book):
+        """Return the path of the book's row, or None."""
+        position = self.library.position_of(book)
+        if position is None:
+            return None
+        return Gtk.TreePath((position,))
+
+    # The Gtk.TreeModel interface
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(COLUMN_TYPES)
+
+    def do_get_column_type(self, column):
+        return COLUMN_TYPES[column]
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) == 1 and 0 <= indices[0] < len(self.library.book_list):
+            return (True, self._iter(indices[0]))
+        return (False, None)
+
+    def do_get_path(self, treeiter):
+        return Gtk.TreePath((treeiter.user_data - 1,))
+
+    def do_get_value(self, treeiter, column):
+        book = self.library.book_list[treeiter.user_data - 1]
+        if column == COLUMN_ISBN:
+            return book.isbn
+        if column == COLUMN_AUTHOR:
+            return cell_markup(book.author)
+        if column == COLUMN_TITLE:
+            return cell_markup(book.title)
+        if column == COLUMN_REFERENCE:
+            return book
+        return self.statuses.get(book, '')
+
+    def do_iter_next(self, treeiter):
+        if treeiter.user_data < len(self.library.book_list):
+            treeiter.user_data += 1
+            return True
+        return False
+
+    def do_iter_children(self, parent):
+        if parent is None and len(self.library.book_list) > 0:
+            return (True, self._iter(0))
+        return (False, None)
+
+    def do_iter_has_child(self, treeiter):
+        return False
+
+    def do_iter_n_children(self, treeiter):
+        if treeiter is None:
+            return len(self.library.book_list)
+        return 0
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and 0 <= n < len(self.library.book_list):
+            return (True, self._iter(n))
+        return (False, None)
+
+    def do_iter_parent(self, child):
+        return (False, None)
@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 
+import os
+
 from .book import Book, bkFields, UNKNOWN, bkISBN, bkAuthor, bkTitle
+from .exporter import (
+    export_books, FORMAT_EXTENSIONS, FORMAT_XML, FORMAT_JSONL, FORMAT_TSV)
 from .library import Library
-from gi.repository import Gtk, GObject
+from .sqliteLibrary import SqliteLibrary
+from gi.repository import Gtk, GLib
+from .gtkBookModel import (
+    BookListStore, LibraryTreeModel, cell_markup,
+    COLUMN_ISBN, COLUMN_AUTHOR, COLUMN_TITLE, COLUMN_REFERENCE, COLUMN_STATUS)
 from .gtkScannerEntry import GTKScannerEntry
 from .gtkBookEntry import GTKBookEntry
+from .identifier import normalise_isbn, normalise_lccn, fill_isbns
 from .isbnSearch import Modes
+from .searcherRanking import AdaptiveSearchers
+from .searchWorker import SearchWorker, PENDING, FAILED, CANCELLED
 
-(
-    COLUMN_ISBN,
-    COLUMN_AUTHOR,
-    COLUMN_TITLE,
-    COLUMN_REFERENCE
-) = list(range(4))
+# The status of a book whose lookup found nothing
+NOT_FOUND = 'Not found'
 
 MENU_INFO = """
 <ui>
@@ -28,31 +35,51 @@ MENU_INFO = """
 </ui>
 """
 
-HIGHLIGHT = "<span background='yellow' foreground='black'>{}</span>"
+class GTKLibrary(Gtk.Window, Library):
 
+    # The class providing the library storage
+    library_class = Library
 
-class GTKLibrary(Gtk.Window, Library):
     def __init__(
             self,
             filename,
             searchers=None,
             mode=Modes.ISBN,
             parent=None,
-            delimiter='|'):
-
-        """Create a window with a list and a couple of buttons."""
+            delimiter='|',
+            search_pool=None,
+            journal=False,
+            search_workers=4,
+            virtual=False):
+
+        """
+        Create a window with a list and a couple of buttons. Searches
+        run on search_workers background threads. If virtual is True,
+        the list's rows are rendered from the library as they are shown,
+        rather than all being loaded up front; they can't be sorted.
+        """
 
         self.searchers = searchers
+        self.search_pool = search_pool
         self.search_mode = mode
 
+        # The lookups running in the background, by book
+        self.search_worker = SearchWorker(
+            self._lookup, GLib.idle_add, max_workers=search_workers)
+        self._lookups = {}
+
+        # The row to scroll to once the main loop is idle
+        self._scroll_row = None
+
         # create window
         Gtk.Window.__init__(self)
 
         # create library
-        Library.__init__(
+        self.library_class.__init__(
             self,
             filename=filename,
-            delimiter=delimiter)
+            delimiter=delimiter,
+            journal=journal)
 
         try:
             self.set_screen(parent.get_screen())
@@ -75,11 +102,11 @@ class GTKLibrary(Gtk.Window, Library):
         vbox1.pack_start(sw, expand=True, fill=True, padding=0)
 
         # create book model
-        self.book_model = Gtk.ListStore(
-            GObject.TYPE_STRING,
-            GObject.TYPE_STRING,
-            GObject.TYPE_STRING,
-            GObject.TYPE_PYOBJECT)
+        if virtual:
+            self.book_model = LibraryTreeModel(self)
+        else:
+            self.book_model = BookListStore()
+        self.tree_view = None
 
         # fill the model from file
         self.read_from_file()
@@ -100,6 +127,12 @@ class GTKLibrary(Gtk.Window, Library):
         hbox1.pack_start(
             self.query_button, expand=True, fill=True, padding=0)
 
+        # add a button to cancel the selected book's lookup
+        self.cancel_button = Gtk.Button("Cancel Query")
+        self.cancel_button.connect("clicked", self.on_cancel_callback, None)
+        hbox1.pack_start(
+            self.cancel_button, expand=True, fill=True, padding=0)
+
         # add a save button
         self.save_button = Gtk.Button("Save")
         self.save_button.connect("clicked", self.on_save_callback, None)
@@ -152,6 +185,7 @@ class GTKLibrary(Gtk.Window, Library):
 
         action_library_xml = Gtk.Action(
             'ExportXML', 'Export to XML', None, Gtk.STOCK_SAVE_AS)
+        action_library_xml.connect("activate", self.on_menu_export, None)
         action_group.add_action(action_library_xml)
 
         uimanager.insert_action_group(action_group)
@@ -174,6 +208,9 @@ class GTKLibrary(Gtk.Window, Library):
         self.tree_view = Gtk.TreeView(self.book_model)
         # hint across rows
         self.tree_view.set_rules_hint(True)
+        # all the rows are the same height, so only those shown are measured
+        self.tree_view.set_fixed_height_mode(True)
+        sortable = isinstance(self.book_model, Gtk.TreeSortable)
         #
         self.tree_view.set_search_column(COLUMN_ISBN)
 
@@ -181,7 +218,8 @@ class GTKLibrary(Gtk.Window, Library):
         renderer = Gtk.CellRendererText()
         column = Gtk.TreeViewColumn(
             bkFields[bkISBN][1], renderer, text=COLUMN_ISBN)
-        column.set_sort_column_id(COLUMN_ISBN)
+        if sortable:
+            column.set_sort_column_id(COLUMN_ISBN)
         column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column.set_resizable(True)
         column.set_min_width(120)
@@ -192,7 +230,8 @@ class GTKLibrary(Gtk.Window, Library):
         renderer.set_property("editable", True)
         column = Gtk.TreeViewColumn(
             bkFields[bkAuthor][1], renderer, markup=COLUMN_AUTHOR)
-        column.set_sort_column_id(COLUMN_AUTHOR)
+        if sortable:
+            column.set_sort_column_id(COLUMN_AUTHOR)
         column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column.set_resizable(True)
         column.set_min_width(150)
@@ -204,13 +243,24 @@ class GTKLibrary(Gtk.Window, Library):
         renderer.set_property("editable", True)
         column = Gtk.TreeViewColumn(
             bkFields[bkTitle][1], renderer, markup=COLUMN_TITLE)
-        column.set_sort_column_id(COLUMN_TITLE)
+        if sortable:
+            column.set_sort_column_id(COLUMN_TITLE)
         column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
         column.set_resizable(True)
         column.set_min_width(150)
         self.tree_view.append_column(column)
         renderer.connect("edited", self.on_title_edited, None)
 
+        # column for the lookup status
+        renderer = Gtk.CellRendererText()
+        column = Gtk.TreeViewColumn("Status", renderer, text=COLUMN_STATUS)
+        if sortable:
+            column.set_sort_column_id(COLUMN_STATUS)
+        column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        column.set_resizable(True)
+        column.set_min_width(90)
+        self.tree_view.append_column(column)
+
         select = self.tree_view.get_selection()
         select.connect("changed", self.on_selection_changed, None)
 
@@ -221,7 +271,7 @@ class GTKLibrary(Gtk.Window, Library):
 
     def on_title_edited(self, widget, path, text, user_data):
         """Called when the user edits a title, updates the book."""
-        if self.book_model[path][COLUMN_TITLE] != text:
+        if self.book_model[path][COLUMN_TITLE] != cell_markup(text):
             book = self.book_model[path][COLUMN_REFERENCE]
             print('Title From: {}'.format(book))
             book.title = text
@@ -229,11 +279,11 @@ class GTKLibrary(Gtk.Window, Library):
 
             # Do this last - if the column is sorted the path
             # points to the wrong entry
-            self.book_model[path][COLUMN_TITLE] = text
+            self.book_model.show_book(self.book_model.get_iter(path))
 
     def on_author_edited(self, widget, path, text, user_data):
         """Called when the user edits a author, updates the book."""
-        if self.book_model[path][COLUMN_AUTHOR] != text:
+        if self.book_model[path][COLUMN_AUTHOR] != cell_markup(text):
             book = self.book_model[path][COLUMN_REFERENCE]
             print('Author From: {}'.format(book))
             book.author = text
@@ -241,7 +291,7 @@ class GTKLibrary(Gtk.Window, Library):
 
             # Do this last - if the column is sorted the path
             # points to the wrong entry
-            self.book_model[path][COLUMN_AUTHOR] = text
+            self.book_model.show_book(self.book_model.get_iter(path))
 
     def on_selection_changed(self, selection, data=None):
         model, treeiter = selection.get_selected()
@@ -262,13 +312,63 @@ class GTKLibrary(Gtk.Window, Library):
         else:
             self.scannerEntry.present()
 
+    def on_menu_export(self, widget, data=None):
+        '''
+        Ask for a file to export the library to, in the format its
+        extension means or, failing that, the one chosen.
+        '''
+        dialog = Gtk.FileChooserDialog(
+            "Export Library", self, Gtk.FileChooserAction.SAVE,
+            (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+             Gtk.STOCK_SAVE, Gtk.ResponseType.OK))
+        dialog.set_do_overwrite_confirmation(True)
+        dialog.set_current_name('library.xml')
+
+        formats = {}
+        for export_format, name, pattern in (
+                (FORMAT_XML, 'XML', '*.xml'),
+                (FORMAT_JSONL, 'JSON Lines', '*.jsonl'),
+                (FORMAT_TSV, 'Tab separated values', '*.tsv')):
+            file_filter = Gtk.FileFilter()
+            file_filter.set_name(name)
+            file_filter.add_pattern(pattern)
+            dialog.add_filter(file_filter)
+            formats[name] = export_format
+
+        response = dialog.run()
+        filename = dialog.get_filename()
+        export_format = formats.get(dialog.get_filter().get_name())
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK or filename is None:
+            return
+
+        if os.path.splitext(filename)[1].lower() in FORMAT_EXTENSIONS:
+            export_format = None
+
+        try:
+            count = export_books(self.book_list, filename, export_format)
+        except (ValueError, OSError) as e:
+            print('### Could not export the library: {}'.format(e))
+            return
+        print('Exported {} books to {}'.format(count, filename))
+
     def on_query_callback(self, widget, data=None):
         """Called from the query button, attempts to update data from web."""
         selection = self.tree_view.get_selection()
         (model, treeiter) = selection.get_selected()
-        isbn = model.get(treeiter, 0)[COLUMN_ISBN]
-        print("querying %s" % (isbn))
-        self.search_isbn(isbn, add=False)
+        if treeiter is None:
+            return
+        book = model[treeiter][COLUMN_REFERENCE]
+        print("querying %s" % (book.isbn))
+        self.search_isbn(book.isbn, add=False, book=book)
+
+    def on_cancel_callback(self, widget, data=None):
+        """Called from the cancel button, stops the selected book's lookup."""
+        selection = self.tree_view.get_selection()
+        (model, treeiter) = selection.get_selected()
+        if treeiter is None:
+            return
+        self.cancel_search(model[treeiter][COLUMN_REFERENCE])
 
     def on_save_callback(self, widget, data=None):
         '''
@@ -283,14 +383,18 @@ class GTKLibrary(Gtk.Window, Library):
         print('Delete')
         selection = self.tree_view.get_selection()
         model, treeiter = selection.get_selected()
+        if treeiter is None:
+            return
         book = model[treeiter][COLUMN_REFERENCE]
+        self.cancel_search(book)
         self.remove_book(book)
-        model.remove(treeiter)
+        model.remove_book_row(treeiter, book)
 
     def destroy(self, widget, data=None):
         '''
         Called on closing the window, saves the CSV file.
         '''
+        self.search_worker.shutdown(wait=False)
         print('Saving...', end=' ')
         self.save_to_file()
         Gtk.main_quit()
@@ -299,40 +403,118 @@ class GTKLibrary(Gtk.Window, Library):
         self.search_mode = mode
 
     def add_web_searcher(self, searcher, mode):
-        self.searchers[mode].append(searcher)
+        if isinstance(self.searchers, AdaptiveSearchers):
+            self.searchers.add(searcher, mode)
+        else:
+            self.searchers[mode].append(searcher)
 
-    def search_isbn(self, isbn, add=True):
-        book = None
+    def _lookup(self, isbn, mode):
+        '''
+        Search for the ISBN with the searchers for the mode, returning a
+        new Book. Runs in a search worker thread.
+        '''
+        if self.search_pool is not None:
+            return self.search_pool.search(
+                self.searchers[mode],
+                isbn=isbn,
+                mode=mode)
 
-        for searcher in self.searchers[self.search_mode]:
+        book = None
+        for searcher in self.searchers[mode]:
             book = searcher.search(
                 isbn=isbn,
-                mode=self.search_mode,
+                mode=mode,
                 book=book)
-            print(book)
-            if add:
-                self.add_book(book)
+            if book.author != UNKNOWN:
+                break
+        return book
 
-        if book is None and add:
-            self.add_book(
-                Book(isbn=isbn))
+    def search_isbn(self, isbn, add=True, book=None):
+        '''
+        Look up the ISBN in the background. If add is True a new book is
+        added for it straight away, otherwise the answer fills in the
+        unknown fields of the given book. Returns the Lookup, or None if
+        the book is already being looked up or the ISBN is not valid.
+        '''
+        if self.search_mode == Modes.LCCN:
+            valid = normalise_lccn(isbn)
+        else:
+            valid = normalise_isbn(isbn)
+        if valid is None:
+            print('### {} is not a valid {}.'.format(isbn, self.search_mode.name))
+            return None
+        isbn = valid
+
+        if add:
+            book = Book(isbn=isbn)
+            self.add_book(book)
+        elif book in self._lookups:
+            return None
+
+        path = self.book_model.path_for(book)
+        if path is None:
+            return None
+        row = Gtk.TreeRowReference.new(self.book_model, path)
+        lookup = self.search_worker.submit(
+            isbn, self.on_lookup_done, mode=self.search_mode, book=book, data=row)
+        self._lookups[book] = lookup
+        self._set_status(lookup, PENDING)
+        return lookup
+
+    def cancel_search(self, book):
+        '''Cancel the lookup of a book, if it has one running.'''
+        lookup = self._lookups.pop(book, None)
+        if lookup is not None and self.search_worker.cancel(lookup):
+            print('Cancelled search for {}'.format(lookup.isbn))
+            self._set_status(lookup, CANCELLED)
+
+    def on_lookup_done(self, lookup):
+        '''Called in the main loop when a book's lookup has finished.'''
+        book = lookup.book
+        if self._lookups.get(book) is lookup:
+            del self._lookups[book]
+
+        found = lookup.result
+        if lookup.state == FAILED:
+            self._set_status(lookup, FAILED)
+        elif found is None or (found.title == UNKNOWN and found.author == UNKNOWN):
+            self._set_status(lookup, NOT_FOUND)
+        else:
+            print(found)
+            book.update_unknowns(**found.as_dict(known_only=True))
+            fill_isbns(book)
+            self._set_status(lookup, '')
+
+    def _set_status(self, lookup, status):
+        '''Show the status and the book's current fields in its row.'''
+        row = lookup.data
+        if not row.valid():
+            # The book has been deleted
+            return
+        self.book_model.show_book(
+            self.book_model.get_iter(row.get_path()), status)
 
     def add_book(self, book):
         # Call the super class function
         super(GTKLibrary, self).add_book(book)
 
         # Add it to the model
-        iter = self.book_model.append()
-        self.book_model.set(
-            iter,
-            COLUMN_ISBN, book.isbn,
-            COLUMN_TITLE, book.title,
-            COLUMN_AUTHOR, book.author,
-            COLUMN_REFERENCE, book)
-
-        self.tree_view.scroll_to_cell(
-            path=self.book_model.get_path(iter),
-            use_align=True)
+        iter = self.book_model.append_book(book)
+
+        # Scroll to the last book added once the main loop is idle,
+        # rather than after every one of a burst of books
+        scroll_pending = self._scroll_row is not None
+        self._scroll_row = Gtk.TreeRowReference.new(
+            self.book_model, self.book_model.get_path(iter))
+        if not scroll_pending:
+            GLib.idle_add(self._scroll_to_added)
+
+    def _scroll_to_added(self):
+        row = self._scroll_row
+        self._scroll_row = None
+        if row.valid() and self.tree_view is not None:
+            self.tree_view.scroll_to_cell(path=row.get_path(), use_align=True)
+        return False
 
     # def remove_book(self, book):
     #     super(GTKLibrary, self).remove_book(book)
@@ -344,23 +526,18 @@ class GTKLibrary(Gtk.Window, Library):
         # Call the super class function
         super(GTKLibrary, self).read_from_file()
 
-        for book in self.book_list:
-            iter = self.book_model.append()
-
-            title = book.title
-            if title == UNKNOWN:
-                title = HIGHLIGHT.format(title)
+        # Detach the model while it is filled, so the view isn't updated
+        # for every row
+        if self.tree_view is not None:
+            self.tree_view.set_model(None)
+        self.book_model.load_books(self.book_list)
+        if self.tree_view is not None:
+            self.tree_view.set_model(self.book_model)
 
-            author = book.author
-            if author == UNKNOWN:
-                author = HIGHLIGHT.format(author)
+class SqliteGTKLibrary(GTKLibrary, SqliteLibrary):
+    """A GTKLibrary that keeps its books in an SQLite database."""
 
-            self.book_model.set(
-                iter,
-                COLUMN_ISBN, book.isbn,
-                COLUMN_TITLE, title,
-                COLUMN_AUTHOR, author,
-                COLUMN_REFERENCE, book)
+    library_class = SqliteLibrary
 
 if __name__ == "__main__":
     gtkLibrary = GTKLibrary("library.csv")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Define an HTTP client that keeps connections to each host open."""
+
+import gzip
+import http.client
+import threading
+import urllib.error
+import urllib.parse
+import zlib
+
+# Seconds to wait to connect, and then for each read
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# The maximum number of connections open to each host
+DEFAULT_MAX_PER_HOST = 4
+
+# The maximum number of redirections followed for one request
+MAX_REDIRECTS = 5
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+USER_AGENT = 'pyBookSearch'
+
+
+class Response(object):
+    '''The status, headers and (decoded) body of an HTTP response.'''
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class _HostPool(object):
+    '''
+    The idle connections to one host, and a semaphore bounding the
+    number of connections in use.
+    '''
+
+    def __init__(self, max_connections):
+        self.idle = []
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.lock = threading.Lock()
+
+
+class HTTPClient(object):
+    '''
+    A thread-safe HTTP client that keeps up to max_per_host persistent
+    connections to each host, asks for gzip compressed responses, and
+    applies separate connect and read timeouts.
+
+    Errors are raised as urllib.error.HTTPError (for error statuses) and
+    urllib.error.URLError (for everything else), as urlopen does.
+    '''
+
+    def __init__(
+            self,
+            max_per_host=DEFAULT_MAX_PER_HOST,
+            connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+            read_timeout=DEFAULT_READ_TIMEOUT):
+
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._pools = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.requests = 0
+        self.connections = 0
+        self.bytes_received = 0
+
+    def _pool(self, key):
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _HostPool(self.max_per_host)
+                self._pools[key] = pool
+            return pool
+
+    def _connect(self, scheme, host, port, timeout=None):
+        connect_timeout = self.connect_timeout
+        if timeout is not None:
+            connect_timeout = min(connect_timeout, timeout)
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=connect_timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=connect_timeout)
+        connection.connect()
+        with self._lock:
+            self.connections += 1
+        return connection
+
+    def _request(self, pool, key, path, headers, timeout=None):
+        '''
+        Send one request, reusing an idle connection if there is one.
+        Returns the response and its (still compressed) body.
+        '''
+        read_timeout = self.read_timeout
+        if timeout is not None:
+            read_timeout = min(read_timeout, timeout)
+
+        with pool.lock:
+            connection = pool.idle.pop() if pool.idle else None
+
+        # A reused connection may have been closed by the server while
+        # idle, in which case try once more on a new connection.
+        for attempt in range(2):
+            reused = connection is not None
+            if connection is None:
+                connection = self._connect(*key, timeout=timeout)
+            try:
+                connection.sock.settimeout(read_timeout)
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected,
+                    http.client.BadStatusLine,
+                    ConnectionResetError,
+                    BrokenPipeError):
+                connection.close()
+                connection = None
+                if reused:
+                    continue
+                raise
+            except:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                with pool.lock:
+                    pool.idle.append(connection)
+            return response, body
+
+    def get(self, url, headers=None, timeout=None):
+        '''
+        GET the URL, following redirections, and return a Response.
+        If timeout is given, no connect or read waits longer than it.
+        '''
+        for redirect in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme = parts.scheme.lower()
+            if scheme not in ('http', 'https'):
+                raise urllib.error.URLError('unsupported scheme {}'.format(scheme))
+            port = parts.port or (443 if scheme == 'https' else 80)
+            key = (scheme, parts.hostname, port)
+
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            request_headers = {
+                'Host': parts.netloc,
+                'User-Agent': USER_AGENT,
+                'Accept-Encoding': 'gzip, deflate'}
+            if headers is not None:
+                request_headers.update(headers)
+
+            pool = self._pool(key)
+            pool.slots.acquire()
+            try:
+                response, body = self._request(
+                    pool, key, path, request_headers, timeout)
+            except (OSError, http.client.HTTPException) as err:
+                raise urllib.error.URLError(err)
+            finally:
+                pool.slots.release()
+
+            with self._lock:
+                self.requests += 1
+                self.bytes_received += len(body)
+
+            if response.status in REDIRECT_CODES and response.getheader('Location'):
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            encoding = (response.getheader('Content-Encoding') or '').lower()
+            try:
+                if encoding == 'gzip':
+                    body = gzip.decompress(body)
+                elif encoding == 'deflate':
+                    body = zlib.decompress(body)
+            except (OSError, zlib.error) as err:
+                raise urllib.error.URLError(err)
+
+            if response.status >= 400:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.msg, None)
+
+            return Response(
+                url, response.status, response.reason, response.msg, body)
+
+        raise urllib.error.URLError('too many redirections')
+
+    def close(self):
+        '''Close all the idle connections.'''
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            with pool.lock:
+                for connection in pool.idle:
+                    connection.close()
+                pool.idle = []
+
+
+# The client shared by all searchers, unless they are given their own.
+shared_client = HTTPClient()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Helpers to normalise book identifiers (ISBN-10, ISBN-13 and LCCN)."""
+
+import re
+
+from .book import UNKNOWN
+
+# The prefixes of the EAN-13s that are ISBN-13s
+ISBN_PREFIXES = ('978', '979')
+
+# The lengths of the EAN add-ons (a price, say) scanned after an ISBN
+ADDON_LENGTHS = (2, 5)
+
+# A normalised LCCN: a prefix of up to three letters and a two digit
+# year, or of up to two letters and a four digit year, then a six digit
+# serial number
+_LCCN = re.compile(r'[a-z]{0,3}[0-9]{8}|[a-z]{0,2}[0-9]{10}')
+
+
+def clean(value):
+    '''
+    Remove whitespace and hyphens from an identifier and upper-case it,
+    so that '0-586-03989-x' and '058603989X' compare equal.
+    '''
+    if '-' in value or ' ' in value:
+        value = value.replace('-', '').replace(' ', '')
+    return value.strip().upper()
+
+
+def isbn13_check_digit(digits):
+    '''
+    Return the ISBN-13 check digit (as a string) for the first twelve
+    digits given.
+    '''
+    total = sum(map(int, digits[0:12:2])) + 3 * sum(map(int, digits[1:12:2]))
+    return str((10 - total % 10) % 10)
+
+
+def isbn10_check_digit(digits):
+    '''
+    Return the ISBN-10 check digit (a digit or 'X') for the first nine
+    digits given.
+    '''
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def looks_like_isbn10(value):
+    '''
+    Returns True if the cleaned value has the shape of an ISBN-10.
+    '''
+    return (
+        len(value) == 10 and
+        value[:9].isdigit() and
+        (value[9].isdigit() or value[9] == 'X'))
+
+
+def looks_like_isbn13(value):
+    '''
+    Returns True if the cleaned value has the shape of an ISBN-13.
+    '''
+    return len(value) == 13 and value.isdigit()
+
+
+def is_valid_isbn10(value):
+    '''
+    Returns True if the cleaned value is an ISBN-10 with the right check
+    digit.
+    '''
+    return looks_like_isbn10(value) and value[9] == isbn10_check_digit(value)
+
+
+def is_valid_isbn13(value):
+    '''
+    Returns True if the cleaned value is an ISBN-13 (a 978 or 979 EAN-13)
+    with the right check digit.
+    '''
+    return (
+        looks_like_isbn13(value) and
+        value.startswith(ISBN_PREFIXES) and
+        value[12] == isbn13_check_digit(value))
+
+
+def strip_addon(value):
+    '''
+    Remove the two or five digit EAN add-on that a scanner may read after
+    an ISBN-13 barcode, if the cleaned value has one.
+    '''
+    if (value.isdigit() and
+            len(value) - 13 in ADDON_LENGTHS and
+            is_valid_isbn13(value[:13])):
+        return value[:13]
+    return value
+
+
+def normalise_isbn(value):
+    '''
+    Return the given ISBN cleaned of hyphens, spaces and any EAN add-on,
+    or None if it is not a valid ISBN-10 or ISBN-13. An ISBN-10 is kept
+    as one.
+    '''
+    if value is None:
+        return None
+    value = strip_addon(clean(value))
+    if is_valid_isbn13(value) or is_valid_isbn10(value):
+        return value
+    return None
+
+
+def canonical_isbn(value):
+    '''
+    Return the ISBN-13 form of a valid ISBN-10 or ISBN-13, or None if the
+    value is neither. This is the key every book with an ISBN is known
+    by.
+    '''
+    value = normalise_isbn(value)
+    if value is not None and len(value) == 10:
+        return isbn10_to_isbn13(value)
+    return value
+
+
+def isbn10_to_isbn13(value):
+    '''
+    Convert an ISBN-10 to its 978-prefixed ISBN-13 form.
+    '''
+    value = clean(value)
+    digits = '978' + value[:9]
+    return digits + isbn13_check_digit(digits)
+
+
+def normalise_lccn(value):
+    '''
+    Return an LCCN in the form the Library of Congress normalises them
+    to, or None if the value is not an LCCN. Blanks are removed, as is
+    anything from a slash on; a hyphen is removed and the serial number
+    after it is padded to six digits with zeros. The prefix is lower
+    cased. So 'n 78-890351', '78-890351/AC' and '78890351' are
+    'n78890351', '78890351' and '78890351'.
+    '''
+    if value is None or value == UNKNOWN:
+        return None
+    value = ''.join(value.split()).lower()
+    value = value.split('/', 1)[0]
+    if '-' in value:
+        prefix, serial = value.split('-', 1)
+        if serial.isdigit():
+            serial = serial.zfill(6)
+        value = prefix + serial
+    if _LCCN.fullmatch(value) is None:
+        return None
+    return value
+
+
+def index_key(value):
+    '''
+    Return the key under which the given identifier is indexed, or None
+    if the value is empty or UNKNOWN. Valid ISBNs are keyed by their
+    canonical ISBN-13 form, so that either form (with or without an EAN
+    add-on) finds the same book. Anything else, such as an LCCN, is
+    keyed as it is, cleaned.
+    '''
+    if value is None or value == UNKNOWN:
+        return None
+    key = strip_addon(clean(value))
+    if key == '':
+        return None
+    if is_valid_isbn10(key):
+        return isbn10_to_isbn13(key)
+    return key
+
+
+def isbn13_to_isbn10(value):
+    '''
+    Convert a 978-prefixed ISBN-13 to its ISBN-10 form. Returns None for
+    a 979 ISBN-13, which has none.
+    '''
+    value = clean(value)
+    if not value.startswith('978'):
+        return None
+    digits = value[3:12]
+    return digits + isbn10_check_digit(digits)
+
+
+def fill_isbns(book):
+    '''
+    Set a book's unknown ISBN-10 and ISBN-13 from its ISBN, when that is
+    valid and they can be worked out from it.
+    '''
+    isbn = canonical_isbn(book.isbn)
+    if isbn is None:
+        return
+    if book.isbn13 == UNKNOWN:
+        book.isbn13 = isbn
+    if book.isbn10 == UNKNOWN:
+        isbn10 = isbn13_to_isbn10(isbn)
+        if isbn10 is not None:
+            book.isbn10 = isbn10
+
+
+def field_key(field, value):
+    '''
+    Return the key under which a book's field value is indexed: the
+    normalised LCCN for an lccn field holding one, the index_key
+    otherwise.
+    '''
+    if field == 'lccn':
+        lccn = normalise_lccn(value)
+        if lccn is not None:
+            return lccn
+    return index_key(value)
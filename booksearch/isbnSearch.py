@@ -1,24 +1,19 @@
 #!/usr/bin/env python3
 
-from .book import Book, UNKNOWN
+from .book import Book, UNKNOWN, bkFields
+from .httpClient import shared_client
+from .identifier import normalise_lccn
+from .isbnSearchParser import parse_isbnsearch_page
+from .scheduler import shared_scheduler
+from .searchStats import shared_stats, HIT, MISS, ERROR
 import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 
-try:
-    import urllib.request
-    import urllib.error
-    import urllib.parse
-    HAVE_URLLIB = True
-except ImportError:
-    import urllib2
-    HAVE_URLLIB = False
-
-try:
-    from bs4 import BeautifulSoup, SoupStrainer
-    HAVE_SOUP = True
-except ImportError:
-    HAVE_SOUP = False
+import urllib.error
+import urllib.parse
 
 
 class Modes(IntEnum):
@@ -26,20 +21,276 @@ class Modes(IntEnum):
     LCCN = 2
 
 
+class SearchError(Exception):
+    '''
+    Raised by a searcher's lookup when the answer could not be retrieved
+    (as opposed to the identifier not being found).
+    '''
+    pass
+
+
+def unknown_fields(book_data):
+    '''
+    Return the number of book fields an answer gives, and how many of
+    those it leaves unknown.
+    '''
+    unknown = sum(
+        1 for f in bkFields if book_data.get(f[0], UNKNOWN) == UNKNOWN)
+    return len(bkFields), unknown
+
+
 class BaseSearcher(object):
     name = ''
 
     def __init__(self):
         self._resolver = None
+        self._cache = None
+        self._http = shared_client
+        self._scheduler = shared_scheduler
+        self._stats = shared_stats
 
     def set_resolver(self, resolver):
         self._resolver = resolver
 
+    def set_cache(self, cache):
+        self._cache = cache
+
+    def set_http_client(self, client):
+        self._http = client
+
+    def set_scheduler(self, scheduler):
+        self._scheduler = scheduler
+
+    def set_stats(self, stats):
+        '''Record into the given SearchStats rather than the shared one.'''
+        self._stats = stats
+
+    def fetch(self, url, mode):
+        '''
+        Fetch the URL through the HTTP client, as scheduled by the request
+        scheduler (rate limit, retries, deadline and circuit breaker), and
+        return the body. Raises urllib.error.URLError (or HTTPError) on
+        failure. The time taken and the size of the body are recorded
+        against the search mode.
+        '''
+        started = time.perf_counter()
+        body = self._scheduler.fetch(self._http, url).body
+        self._stats.record_fetch(
+            self.name, mode, time.perf_counter() - started, len(body))
+        return body
+
+    def parse(self, mode, function, *args):
+        '''Return function(*args), recording the time taken as parse time.'''
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._stats.record_parse(
+                self.name, mode, time.perf_counter() - started)
+
+    def _record(self, mode, book_data, seconds=None, cached=False, error=False):
+        '''
+        Record the outcome of a search. Only an answer giving the author
+        is a hit, and only the time of a search that went to the web
+        site is recorded.
+        '''
+        if cached:
+            seconds = None
+        if error:
+            self._stats.record_search(self.name, mode, ERROR, seconds)
+        elif book_data is None:
+            self._stats.record_search(
+                self.name, mode, MISS, seconds, cached=cached)
+        else:
+            fields, unknown = unknown_fields(book_data)
+            outcome = MISS
+            if book_data.get('author', UNKNOWN) != UNKNOWN:
+                outcome = HIT
+            self._stats.record_search(
+                self.name, mode, outcome, seconds, cached=cached,
+                fields=fields, unknown_fields=unknown)
+
+    def lookup(self, isbn, mode):
+        '''
+        Query the web site for the given ISBN (or LCCN) and return a
+        dictionary of book data keyed by Book property name, or None if
+        the site does not know the book. Raise SearchError if the site
+        could not be queried. Subclasses override this.
+        '''
+        return None
+
+    def answer(self, isbn, mode):
+        '''
+        Return the book data for the given ISBN (or LCCN), or None if the
+        site does not know the book. If a cache has been set, answers are
+        taken from it when possible and stored in it otherwise. Raises
+        SearchError if the site could not be queried.
+        '''
+        started = time.perf_counter()
+        found = False
+        if self._cache is not None:
+            found, book_data = self._cache.get(self.name, mode, isbn)
+
+        if not found:
+            try:
+                book_data = self.lookup(isbn, mode)
+            except SearchError:
+                self._record(
+                    mode, None, time.perf_counter() - started, error=True)
+                raise
+            if self._cache is not None:
+                self._cache.put(self.name, mode, isbn, book_data)
+
+        self._record(
+            mode, book_data, time.perf_counter() - started, cached=found)
+        return book_data
+
     def search(self, isbn, mode, book=None, fill=False):
+        '''
+        Search for the given ISBN (or LCCN) and update the book with
+        the results. If the site could not be queried the book is left
+        as it was.
+        '''
+        if book is None:
+            book = Book(isbn=str(isbn))
+        else:
+            book.isbn = isbn
+
+        try:
+            book_data = self.answer(isbn, mode)
+        except SearchError:
+            return book
+
+        self._merge(book, book_data, fill)
+
+        return book
+
+    def lookup_many(self, identifiers, mode):
+        '''
+        Query the web site for each of the given identifiers and return a
+        dictionary mapping each identifier to its book data, or to None if
+        the site does not know it. Identifiers that could not be queried
+        are left out. Subclasses whose site accepts several identifiers
+        per request override this.
+        '''
+        results = {}
+        for identifier in identifiers:
+            try:
+                results[identifier] = self.lookup(identifier, mode)
+            except SearchError:
+                pass
+        return results
+
+    def search_many(self, identifiers, mode, books=None, fill=False):
+        '''
+        Search for each of the given ISBNs (or LCCNs) and return a list of
+        books in the same order. If books is given it must be a list of
+        the same length, holding the book to update for each identifier
+        (or None for a new book). Cached answers are used where possible
+        and the rest are looked up together.
+        '''
+        identifiers = [str(i) for i in identifiers]
+        if books is None:
+            books = [None] * len(identifiers)
+
+        answers = {}
+        missing = []
+        for identifier in identifiers:
+            if identifier in answers:
+                continue
+            found = False
+            if self._cache is not None:
+                found, book_data = self._cache.get(self.name, mode, identifier)
+            if found:
+                answers[identifier] = book_data
+                self._record(mode, book_data, cached=True)
+            else:
+                # Mark as seen, so duplicates are only looked up once
+                answers[identifier] = None
+                missing.append(identifier)
+
+        if len(missing) > 0:
+            looked_up = self.lookup_many(missing, mode)
+            for identifier in missing:
+                if identifier not in looked_up:
+                    # Could not be queried, so don't cache it
+                    self._record(mode, None, error=True)
+                    continue
+                answers[identifier] = looked_up[identifier]
+                self._record(mode, looked_up[identifier])
+                if self._cache is not None:
+                    self._cache.put(
+                        self.name, mode, identifier, looked_up[identifier])
+
+        results = []
+        for identifier, book in zip(identifiers, books):
+            if book is None:
+                book = Book(isbn=identifier)
+            else:
+                book.isbn = identifier
+            self._merge(book, answers[identifier], fill)
+            results.append(book)
+        return results
+
+    def _merge(self, book, book_data, fill):
+        '''Update the book from the book data returned by a lookup.'''
+        if book_data is not None:
+            if fill:
+                book.update_unknowns(resolver=self._resolver, **book_data)
+            else:
+                book.update(**book_data)
+
+
+class SearchPool(object):
+    '''
+    Sends a query to all the searchers for a mode at once, using a
+    bounded pool of worker threads, and merges the answers in the
+    order the searchers are listed (highest priority first).
+    '''
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def search(self, searchers, isbn, mode, book=None, fill=False):
+        '''
+        Search for the given ISBN (or LCCN) with every searcher
+        concurrently.
+
+        In fill mode all answers are waited for and merged into the book,
+        in priority order, through Book.update_unknowns. Otherwise the
+        answer from the highest priority searcher that found an author
+        is returned as soon as it is available, without waiting for any
+        lower priority searchers.
+        '''
+
         if book is None:
             book = Book(isbn=str(isbn))
         else:
             book.isbn = isbn
+
+        # The workers only fetch the answers, which are merged here as
+        # the searchers' own search would merge them
+        futures = [
+            self._executor.submit(searcher.answer, isbn, mode)
+            for searcher in searchers]
+
+        for i, (searcher, future) in enumerate(zip(searchers, futures)):
+            try:
+                book_data = future.result()
+            except SearchError:
+                continue
+
+            searcher._merge(book, book_data, fill)
+            if not fill and book.author != UNKNOWN:
+                # Don't wait for the slower, lower priority searchers
+                for pending in futures[i + 1:]:
+                    pending.cancel()
+                break
+
         return book
 
 
@@ -50,15 +301,6 @@ class UPCDatabaseCom(BaseSearcher):
         super(UPCDatabaseCom, self).__init__()
         self.search_url = 'http://www.upcdatabase.com/item/'
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(UPCDatabaseCom, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-        return book
-
 
 class LibraryThingCom(BaseSearcher):
     name = 'www.librarything.com'
@@ -74,15 +316,6 @@ class LibraryThingCom(BaseSearcher):
         super(LibraryThingCom, self).__init__()
         self.search_url = 'http://www.librarything.com/tag/'
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(LibraryThingCom, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-        return book
-
 
 class OpenISBNCom(BaseSearcher):
     name = 'www.openisbn.com'
@@ -92,15 +325,6 @@ class OpenISBNCom(BaseSearcher):
         self.search_url = 'http://www.openisbn.com/isbn/'
         # http://openisbn.com/isbn/0006174280/
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(OpenISBNCom, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-        return book
-
 
 class ISBNDBCom(BaseSearcher):
     name = 'isbndb.com'
@@ -109,15 +333,6 @@ class ISBNDBCom(BaseSearcher):
         super(ISBNDBCom, self).__init__()
         self.search_url = 'http://isbndb.com/api/v2/json/[your-api-key]/book/'
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(ISBNDBCom, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-        return book
-
 
 class ISBNPlusOrg(BaseSearcher):
     name = 'isbnplus.org'
@@ -127,15 +342,6 @@ class ISBNPlusOrg(BaseSearcher):
         # http://isbnplus.org/api/
         self.search_url = ''
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(ISBNPlusOrg, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-        return book
-
 
 class OpenLibraryOrg(BaseSearcher):
     name = 'openlibrary.org'
@@ -145,99 +351,146 @@ class OpenLibraryOrg(BaseSearcher):
         # Documentation at https://openlibrary.org/dev/docs/api/books
         self.lccn_url = 'https://openlibrary.org/api/books?bibkeys=LCCN:{}&format=json&jscmd=data'
         self.isbn_url = 'https://openlibrary.org/api/books?bibkeys=ISBN:{}&format=json&jscmd=data'
-
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(OpenLibraryOrg, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
-
+        self.bibkeys_url = 'https://openlibrary.org/api/books?bibkeys={}&format=json&jscmd=data'
+
+        # The number of bibkeys sent in each request by lookup_many
+        self.batch_size = 50
+
+    @staticmethod
+    def _bibkey_value(identifier, mode):
+        '''
+        Return the identifier as sent in a bibkey: LCCNs normalised, so
+        that differently written forms of one are the same query.
+        '''
+        if mode == Modes.LCCN:
+            identifier = normalise_lccn(identifier) or identifier
+        return urllib.parse.quote(str(identifier), safe='')
+
+    def lookup(self, isbn, mode):
+        value = self._bibkey_value(isbn, mode)
         if mode == Modes.ISBN:
-            full_url = self.isbn_url.format(isbn)
+            full_url = self.isbn_url.format(value)
         elif mode == Modes.LCCN:
-            full_url = self.lccn_url.format(isbn)
+            full_url = self.lccn_url.format(value)
 
-        # Guard against URL errors
-        try:
+        book_json = self._fetch_json(full_url, mode)
 
-            # Open the URL
-            page = urllib.request.urlopen(full_url)
+        # If there are no keys, there is no data
+        if len(book_json.keys()) == 0:
+            print('\tISBN not found at www.openlibrary.org')
+            return None
 
-            # We expect JSON data
-            book_json = json.loads(page.read().decode())
-            book_data = {'isbn': isbn}
-
-            # identifiers -> {isbn_10, isbn_13, openlibrary, etc}
-            # authors -> list of {name, url}
-            # publish_date -> string
-            # publishers -> list of {name}
-            # title -> string
-            # subtitle -> string
-
-            # If there are no keys, there is no data
-            if len(book_json.keys()) > 0:
-
-                for k1 in book_json.keys():
-
-                    # print('OpenLibraryOrg key: {}'.format(k1))
-
-                    # Get the title and subtitle, join them
-                    book_data['title'] = book_json[k1].get(
-                        'title',
-                        UNKNOWN)
-                    subtitle = book_json[k1].get('subtitle', '')
-                    if subtitle != '':
-                        book_data['title'] = '{} : {}'.format(book_data['title'], subtitle)
-
-                    # Concatenate all the authors
-                    if 'authors' in book_json[k1]:
-                        authors = ';'.join(
-                            [a['name'] for a in book_json[k1]['authors']])
-                        if authors != '':
-                            book_data['author'] = authors
-
-                    # Concatenate all the publishers
-                    if 'publishers' in book_json[k1]:
-                        publishers = ';'.join(
-                            [p['name'] for p in book_json[k1]['publishers']])
-                        if publishers != '':
-                            book_data['publisher'] = publishers
-
-                    # Get the published date
-                    book_data['published'] = book_json[k1].get(
-                        'publish_date',
-                        UNKNOWN)
-
-                    # Get the identifiers
-                    if 'identifiers' in book_json[k1]:
-                        for i in book_json[k1]['identifiers'].get('isbn_10', []):
-                            book_data['isbn10'] = i
-                        for i in book_json[k1]['identifiers'].get('isbn_13', []):
-                            book_data['isbn13'] = i
-                            if mode == Modes.LCCN:
-                                book_data['isbn'] = i
-                        for i in book_json[k1]['identifiers'].get('lccn', []):
-                            book_data['lccn'] = i
-
-                if fill:
-                    book.update_unknowns(resolver=self._resolver, **book_data)
+        book_data = {'isbn': isbn}
+        if mode == Modes.LCCN:
+            book_data['lccn'] = normalise_lccn(isbn) or isbn
+        for k1 in book_json.keys():
+            self.parse(mode, self._parse_entry, book_json[k1], mode, book_data)
+        return book_data
+
+    def lookup_many(self, identifiers, mode):
+        '''
+        Query for many identifiers at once, batch_size bibkeys per request.
+        '''
+        if mode == Modes.LCCN:
+            prefix = 'LCCN'
+        else:
+            prefix = 'ISBN'
+
+        results = {}
+        for start in range(0, len(identifiers), self.batch_size):
+            chunk = identifiers[start:start + self.batch_size]
+
+            values = [self._bibkey_value(i, mode) for i in chunk]
+            bibkeys = ','.join(
+                ['{}:{}'.format(prefix, v) for v in values])
+
+            try:
+                book_json = self._fetch_json(
+                    self.bibkeys_url.format(bibkeys), mode)
+            except SearchError:
+                continue
+
+            # The response is keyed by the bibkeys that were found
+            for identifier, value in zip(chunk, values):
+                entry = book_json.get('{}:{}'.format(
+                    prefix, urllib.parse.unquote(value)))
+                if entry is None:
+                    results[identifier] = None
                 else:
-                    book.update(**book_data)
+                    book_data = {'isbn': identifier}
+                    if mode == Modes.LCCN:
+                        book_data['lccn'] = urllib.parse.unquote(value)
+                    self.parse(mode, self._parse_entry, entry, mode, book_data)
+                    results[identifier] = book_data
 
-            else:
-                print('\tISBN not found at www.openlibrary.org')
-                book_data['title'] = UNKNOWN
-                # book.unknown_title()
+        return results
+
+    def _fetch_json(self, full_url, mode):
+        '''Fetch the URL and decode the JSON response.'''
+
+        # Guard against URL errors
+        try:
+
+            # We expect JSON data
+            body = self.fetch(full_url, mode)
+            return self.parse(mode, json.loads, body.decode())
 
         except urllib.error.URLError as err:
             print('URLError {}'.format(err))
+            raise SearchError(err)
         except:
             print('Unexpected error:', sys.exc_info()[0])
             raise
 
-        return book
+    def _parse_entry(self, entry, mode, book_data):
+        '''
+        Fill book_data from one entry of a books API response.
+        '''
+
+        # identifiers -> {isbn_10, isbn_13, openlibrary, etc}
+        # authors -> list of {name, url}
+        # publish_date -> string
+        # publishers -> list of {name}
+        # title -> string
+        # subtitle -> string
+
+        # Get the title and subtitle, join them
+        book_data['title'] = entry.get(
+            'title',
+            UNKNOWN)
+        subtitle = entry.get('subtitle', '')
+        if subtitle != '':
+            book_data['title'] = '{} : {}'.format(book_data['title'], subtitle)
+
+        # Concatenate all the authors
+        if 'authors' in entry:
+            authors = ';'.join(
+                [a['name'] for a in entry['authors']])
+            if authors != '':
+                book_data['author'] = authors
+
+        # Concatenate all the publishers
+        if 'publishers' in entry:
+            publishers = ';'.join(
+                [p['name'] for p in entry['publishers']])
+            if publishers != '':
+                book_data['publisher'] = publishers
+
+        # Get the published date
+        book_data['published'] = entry.get(
+            'publish_date',
+            UNKNOWN)
+
+        # Get the identifiers
+        if 'identifiers' in entry:
+            for i in entry['identifiers'].get('isbn_10', []):
+                book_data['isbn10'] = i
+            for i in entry['identifiers'].get('isbn_13', []):
+                book_data['isbn13'] = i
+                if mode == Modes.LCCN:
+                    book_data['isbn'] = i
+            for i in entry['identifiers'].get('lccn', []):
+                book_data['lccn'] = i
 
 
 class ISBNSearchOrg(BaseSearcher):
@@ -247,120 +500,36 @@ class ISBNSearchOrg(BaseSearcher):
         super(ISBNSearchOrg, self).__init__()
         self.search_url = 'http://www.isbnsearch.org/isbn/'
 
-        if HAVE_SOUP:
-            # Only process the core content division
-            self.bookinfo_filter = SoupStrainer('div')
+    def lookup(self, isbn, mode):
+        full_url = self.search_url + str(isbn)
+        try:
+            page = self.fetch(full_url, mode)
+            book_data = self.parse(mode, parse_isbnsearch_page, page)
+
+        except urllib.error.HTTPError as err:
+            print('\tISBN not found at www.isbnsearch.org: {}'.format(
+                err.code))
+            if err.code == 404:
+                return None
+            raise SearchError(err)
+        except urllib.error.URLError as err:
+            # Not an HTTP error, so there is no status code
+            print('\tCould not reach www.isbnsearch.org: {}'.format(
+                err.reason))
+            raise SearchError(err)
 
-    def search(self, isbn, mode, book=None, fill=False):
-        # Call the superclass method to create the book
-        book = super(ISBNSearchOrg, self).search(
-            isbn=isbn,
-            mode=mode,
-            book=book,
-            fill=fill)
+        book_data['isbn'] = isbn
 
-        book_data = {'isbn': isbn}
+        # The title may be missing, or be the bogus title of an unknown ISBN
+        if book_data.get('title', 'ISBN')[:4] == 'ISBN':
+            book_data['title'] = UNKNOWN
 
-        if HAVE_SOUP:
-            full_url = self.search_url + str(isbn)
-            try:
-                if HAVE_URLLIB:
-                    urlexception = urllib.error.URLError
-                    page = urllib.request.urlopen(full_url)
-                else:
-                    urlexception = urllib2.URLError
-                    page = urllib2.urlopen(full_url)
-
-                soup = BeautifulSoup(
-                    page.read(),
-                    'html.parser',
-                    parse_only=self.bookinfo_filter)
-
-                # get the original encoding
-                # original_encoding = soup.originalEncoding
-                # print ('encoding: '.format(original_encoding))
-
-                # Get the title, which may fail
-                try:
-                    # TODO: This is a hack for &
-                    # TODO: make html/xml safe
-                    book_data['title'] = soup.h2.string.replace('&', '&amp;')
-                    # print ('title: {}'.format(soup.h2.string))
-                except AttributeError:
-                    # print('### Error retrieving Title.')
-                    book_data['title'] = UNKNOWN
-
-                if book_data['title'][:4] == 'ISBN':
-                    # BOGUS TITLE
-                    book_data['title'] = UNKNOWN
-
-                # Get the remaining values
-                for label in soup.find_all('strong'):
-
-                    # ISBN-13
-                    if label.string == 'ISBN-13:':
-                        try:
-                            book_data['isbn13'] = label.find_next_sibling('a').contents[0]
-                        except AttributeError:
-                            book_data['isbn13'] = UNKNOWN
-
-                    # ISBN-10
-                    if label.string == 'ISBN-10:':
-                        try:
-                            book_data['isbn10'] = label.find_next_sibling('a').contents[0]
-                        except AttributeError:
-                            book_data['isbn10'] = UNKNOWN
-
-                    # Get the author
-                    if label.string == 'Author:':
-                        try:
-                            # TODO: This is a hack for &
-                            # TODO: make html/xml safe
-                            book_data['author'] = label.nextSibling.string.replace(
-                                '&', '&amp;')
-                        except AttributeError:
-                            book_data['author'] = UNKNOWN
-
-                    if label.string == 'Authors:':
-                        try:
-                            # TODO: This is a hack for &
-                            # TODO: make html/xml safe
-                            book_data['author'] = label.nextSibling.replace(
-                                '&', '&amp;')
-                        except AttributeError:
-                            book_data['author'] = UNKNOWN
-
-                    if label.string == 'Binding:':
-                        # TODO: This is a hack for &
-                        book_data['binding'] = label.nextSibling.replace(
-                            '&', '&amp;')
-
-                    if label.string == 'Publisher:':
-                        # TODO: This is a hack for &
-                        book_data['publisher'] = label.nextSibling.replace(
-                            '&', '&amp;')
-
-                    if label.string == 'Published:':
-                        # TODO: This is a hack for &
-                        book_data['published'] = label.nextSibling.replace(
-                            '&', '&amp;')
-
-                # gets the first used price
-                try:
-                    book_data['usedPrice'] = soup.find_all('table', class_='prices')[1].tbody.tr.td.find_next_sibling(class_='price').p.a.contents
-                # if there isn't a price record
-                except IndexError:
-                    book_data['usedPrice'] = UNKNOWN
-
-            except urlexception as err:
-                print('\tISBN not found at www.isbnsearch.org: {}'.format(
-                    err.code))
-                book_data['title'] = UNKNOWN
-                # book.unknown_title()
-
-        if fill:
-            book.update_unknowns(resolver=self._resolver, **book_data)
-        else:
-            book.update(**book_data)
+        if 'usedPrice' not in book_data:
+            book_data['usedPrice'] = UNKNOWN
 
-        return book
+        # An unknown ISBN gives a page with a bogus title and no details
+        if book_data['title'] == UNKNOWN and 'author' not in book_data:
+            print('\tISBN not found at www.isbnsearch.org')
+            return None
+
+        return book_data
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Extract the book details from a www.isbnsearch.org page in one pass,
+without building a document tree.
+"""
+
+from html.parser import HTMLParser
+
+# The labels of the book details, and the field each one fills
+TEXT_LABELS = {
+    'Author:': 'author',
+    'Authors:': 'author',
+    'Binding:': 'binding',
+    'Publisher:': 'publisher',
+    'Published:': 'published'}
+LINK_LABELS = {
+    'ISBN-13:': 'isbn13',
+    'ISBN-10:': 'isbn10'}
+
+# The price tables are new, used and rental, the used price is wanted
+USED_PRICE_TABLE = 2
+
+# Elements that have no end tag
+VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'))
+
+# The amount of the page fed to the parser at a time
+CHUNK_SIZE = 1024
+
+
+class ISBNSearchParser(HTMLParser):
+    '''
+    Collects the title (the first h2 in a div), the labelled details
+    and the first used price from a www.isbnsearch.org page into
+    book_data. Entities are unescaped, so the values are plain text.
+
+    A detail's value is the text following its <strong> label up to the
+    end of the enclosing element, or for the ISBNs, the text of the
+    following link. The used price is the text of the link in the price
+    cell of the first row of the second "prices" table.
+    '''
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.book_data = {}
+        self.done = False
+
+        self._div_depth = 0
+        self._text = None
+        self._field = None
+        self._field_depth = 0
+        self._element_depth = 0
+
+        # The text of the <strong> label being read, and the ISBN label
+        # waiting for its link
+        self._label = None
+        self._link_label = None
+
+        self._tables = 0
+        self._in_prices = False
+        self._in_tbody = False
+        self._rows = 0
+        self._cells = 0
+        self._in_price_cell = False
+
+    def _start_text(self, field):
+        self._field = field
+        self._text = []
+
+    def _end_text(self):
+        if self._field is not None and self._field not in self.book_data:
+            self.book_data[self._field] = ''.join(self._text).strip()
+        self._field = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        self._element_depth += 1
+
+        if tag == 'div':
+            self._div_depth += 1
+
+        elif tag == 'h2':
+            if self._div_depth and 'title' not in self.book_data:
+                self._start_text('title')
+
+        elif tag == 'strong':
+            # A label also ends the text of the detail before it
+            if self._field in TEXT_LABELS.values():
+                self._end_text()
+            self._label = []
+
+        elif tag == 'a':
+            if self._field is None and self._link_label is not None:
+                self._start_text(LINK_LABELS[self._link_label])
+                self._link_label = None
+            elif self._in_price_cell:
+                self._start_text('usedPrice')
+
+        elif tag == 'table':
+            classes = (dict(attrs).get('class') or '').split()
+            if 'prices' in classes:
+                self._tables += 1
+                self._in_prices = self._tables == USED_PRICE_TABLE
+
+        elif tag == 'tbody':
+            if self._in_prices:
+                self._in_tbody = True
+
+        elif tag == 'tr':
+            if self._in_tbody:
+                self._rows += 1
+                self._cells = 0
+
+        elif tag == 'td':
+            if self._in_tbody and self._rows == 1:
+                self._cells += 1
+                classes = (dict(attrs).get('class') or '').split()
+                self._in_price_cell = self._cells > 1 and 'price' in classes
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        self._element_depth -= 1
+
+        if tag == 'div':
+            self._div_depth -= 1
+
+        elif tag == 'h2':
+            if self._field == 'title':
+                self._end_text()
+
+        elif tag == 'strong':
+            if self._label is not None:
+                label = ''.join(self._label).strip()
+                self._label = None
+                if label in TEXT_LABELS:
+                    self._start_text(TEXT_LABELS[label])
+                    self._field_depth = self._element_depth
+                elif label in LINK_LABELS:
+                    self._link_label = label
+
+        elif tag == 'a':
+            if self._field in LINK_LABELS.values():
+                self._end_text()
+            elif self._field == 'usedPrice':
+                self._end_text()
+                self.done = True
+
+        elif tag == 'td':
+            self._in_price_cell = False
+
+        elif tag == 'table':
+            if self._in_prices:
+                self._in_prices = False
+                self._in_tbody = False
+                # There is no used price
+                self.done = True
+
+        # The text of a detail runs to the end of the enclosing element
+        if (self._field in TEXT_LABELS.values() and
+                self._element_depth < self._field_depth):
+            self._end_text()
+
+        if tag == 'p':
+            # An ISBN label without a link
+            self._link_label = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+        elif self._label is not None:
+            self._label.append(data)
+
+
+def parse_isbnsearch_page(page):
+    '''
+    Return a dictionary of the book details found in the page, which
+    may be bytes (UTF-8) or a string. Fields that are not on the page
+    are missing from the dictionary.
+    '''
+    if isinstance(page, bytes):
+        page = page.decode('utf-8', errors='replace')
+
+    # Nothing in the head is wanted
+    body = page.find('<body')
+    if body < 0:
+        body = 0
+
+    parser = ISBNSearchParser()
+    # Stop reading once the used price has been seen
+    for start in range(body, len(page), CHUNK_SIZE):
+        parser.feed(page[start:start + CHUNK_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    parser._end_text()
+    return parser.book_data
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Define an append-only journal of the changes made to a Library."""
+
+import csv
+import io
+import os
+
+from .book import bkFields
+
+# Journal record types
+JOURNAL_HEADER = 'J'
+JOURNAL_ADD = 'A'
+JOURNAL_REMOVE = 'R'
+JOURNAL_EDIT = 'E'
+
+
+class LibraryJournal(object):
+    '''
+    Records each add, remove and edit made to a library as one line
+    appended to a side file, so that changes can be kept safely without
+    rewriting the whole library file.
+
+    Books are identified by a number: the books read from the library
+    file are numbered in file order, and added books follow on. The
+    first record of the journal identifies the library file it applies
+    to, so a journal left over from before the library file was last
+    rewritten is recognised as stale and ignored.
+    '''
+
+    def __init__(self, library_filename, delimiter='|'):
+        self.library_filename = library_filename
+        self.filename = library_filename + '.journal'
+        self.delimiter = delimiter
+
+        self._file = None
+        self._writer = None
+
+        # Book numbering
+        self._ids = {}
+        self._books = {}
+        self._next_id = 0
+
+        # Set while replaying, so that replayed changes are not recorded
+        self.replaying = False
+
+        # The number of records written since the last reset
+        self.record_count = 0
+
+    def _base_identity(self):
+        '''Identify the current library file.'''
+        try:
+            st = os.stat(self.library_filename)
+            return [str(st.st_ino), str(st.st_size), str(st.st_mtime_ns)]
+        except OSError:
+            return ['-', '-', '-']
+
+    def track(self, book):
+        '''Give the book the next number.'''
+        self._ids[book] = self._next_id
+        self._books[self._next_id] = book
+        self._next_id += 1
+
+    def book_for(self, book_id):
+        return self._books.get(book_id)
+
+    def _open(self):
+        '''
+        Open the journal for appending, starting a new one if there is
+        none or it belongs to an older library file.
+        '''
+        header = [JOURNAL_HEADER] + self._base_identity()
+        mode = 'wt'
+        try:
+            with open(self.filename, 'rt') as journal_file:
+                first = next(csv.reader(journal_file, delimiter=self.delimiter))
+            if first == header:
+                mode = 'at'
+        except (IOError, StopIteration, csv.Error):
+            pass
+
+        self._file = open(self.filename, mode)
+        self._writer = csv.writer(
+            self._file,
+            lineterminator='\n',
+            delimiter=self.delimiter)
+        if mode == 'wt':
+            self._write(header)
+
+    def _write(self, record):
+        if self._file is None:
+            self._open()
+        self._writer.writerow(record)
+        self._file.flush()
+        self.record_count += 1
+
+    def added(self, book):
+        '''Record a book added to the library.'''
+        self.track(book)
+        if not self.replaying:
+            self._write(
+                [JOURNAL_ADD, self._ids[book]] +
+                [getattr(book, f[0]) for f in bkFields])
+
+    def removed(self, book):
+        '''Record a book removed from the library.'''
+        book_id = self._ids.pop(book, None)
+        if book_id is None:
+            return
+        del self._books[book_id]
+        if not self.replaying:
+            self._write([JOURNAL_REMOVE, book_id])
+
+    def changed(self, book, field, value):
+        '''Record a change to one field of a book.'''
+        book_id = self._ids.get(book)
+        if book_id is not None and not self.replaying:
+            self._write([JOURNAL_EDIT, book_id, field, value])
+
+    def read(self):
+        '''
+        Read the journal, returning (records, torn) where torn is True
+        if the last record was only partly written. Returns None if
+        there is no journal, or it is stale.
+        '''
+        try:
+            with open(self.filename, 'rt') as journal_file:
+                data = journal_file.read()
+        except IOError:
+            return None
+
+        records = list(csv.reader(io.StringIO(data), delimiter=self.delimiter))
+        if len(records) == 0 or records[0] != [JOURNAL_HEADER] + self._base_identity():
+            return None
+
+        torn = not data.endswith('\n')
+        if torn:
+            records = records[:-1]
+        return records[1:], torn
+
+    def sync(self):
+        '''Make sure the journal has reached the disk.'''
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def reset(self, book_list):
+        '''
+        Start a new, empty journal for a newly written library file
+        holding the given books.
+        '''
+        self.close()
+        self._ids = {}
+        self._books = {}
+        self._next_id = 0
+        for book in book_list:
+            self.track(book)
+        self.record_count = 0
+        self._open()
+        self.sync()
+
+    def remove(self):
+        '''Delete the journal file.'''
+        self.close()
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
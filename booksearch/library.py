@@ -2,49 +2,196 @@
 """Define a Library class to store a list of books."""
 
 from .book import Book, bkFields
+from .identifier import field_key
+from .journal import LibraryJournal, JOURNAL_ADD, JOURNAL_REMOVE, JOURNAL_EDIT
+from .searchStats import timed_operation
+from .textIndex import TextIndex
 import csv
+import os
 import sys
+import tempfile
+
+# The Book properties that are indexed for fast lookup, in the order
+# they are checked by isbn_exists.
+INDEXED_FIELDS = ('isbn', 'isbn13', 'isbn10', 'lccn')
 
 
 class Library(object):
     """The Library class is responsible for..."""
 
-    def __init__(self, filename, delimiter='|'):
+    def __init__(self, filename, delimiter='|', journal=False, read_only=False):
         """
         Initialise the book list to an empty list and store the filename.
+        If journal is True, changes are also appended to a journal file
+        as they are made, and replayed when the library is next read.
+        If read_only is True the library is only to be read: its journal
+        is replayed but never removed or compacted.
         """
 
         self.book_list = []
         self.filename = filename
         self.delimiter = delimiter
+        self.read_only = read_only
+
+        # The position of each book in book_list
+        self._positions = {}
+
+        self._journal = None
+        if journal:
+            self._journal = LibraryJournal(filename, delimiter=delimiter)
+
+        # A dictionary per indexed field, mapping an identifier key
+        # to the list of books holding that identifier.
+        self._indexes = dict((f, {}) for f in INDEXED_FIELDS)
+
+        # The index of the words in the titles, authors and publishers,
+        # built when it is first searched.
+        self._text_index = None
 
     @property
     def book_count(self):
         return len(self.book_list)
 
+    @property
+    def text_index(self):
+        """The TextIndex of the books, built on first use."""
+        if self._text_index is None:
+            self._text_index = TextIndex(self.book_list)
+        return self._text_index
+
+    @timed_operation('find_text')
+    def find_text(self, text, limit=None):
+        """
+        Return the books with a word starting with each of the words in
+        text in their title, author or publisher, in library order.
+        """
+        return self.text_index.search(text, limit=limit)
+
     def isbn_exists(self, isbn):
         """
-        Check for the existence of the given ISBN within the list of books.
+        Check for the existence of the given ISBN (or LCCN) within the
+        list of books. Any of the isbn, isbn13, isbn10 and lccn fields
+        may match, and an ISBN-10 will find a book stored by its ISBN-13.
+        """
+
+        books = self.find_books(isbn)
+        if len(books) > 0:
+            return True, books[0]
+        return False, None
+
+    @timed_operation('lookup')
+    def find_books(self, identifier, fields=INDEXED_FIELDS):
+        """
+        Return a list of the books that have the given identifier in any
+        of the given indexed fields.
         """
 
-        exists = False
-        book = None
-        for book in self.book_list:
-            if book.isbn == isbn:
-                exists = True
-                break
-        return exists, book
+        found = []
+        for f in fields:
+            key = field_key(f, identifier)
+            if key is None:
+                continue
+            for book in self._indexes[f].get(key, ()):
+                if book not in found:
+                    found.append(book)
+        return found
+
+    def _index_add(self, field, value, book):
+        key = field_key(field, value)
+        if key is not None:
+            self._indexes[field].setdefault(key, []).append(book)
+
+    def _index_remove(self, field, value, book):
+        key = field_key(field, value)
+        if key is None:
+            return
+        books = self._indexes[field].get(key)
+        if books is None:
+            return
+        try:
+            books.remove(book)
+        except ValueError:
+            pass
+        if len(books) == 0:
+            del self._indexes[field][key]
+
+    def _index_book(self, book):
+        """Add the book to the indexes and watch it for changes."""
+        for f in INDEXED_FIELDS:
+            self._index_add(f, getattr(book, f), book)
+        book.add_observer(self)
+
+    def _unindex_book(self, book):
+        """Remove the book from the indexes and stop watching it."""
+        book.remove_observer(self)
+        for f in INDEXED_FIELDS:
+            self._index_remove(f, getattr(book, f), book)
+
+    def book_changed(self, book, field, old, new):
+        """Called by a book when one of its fields has changed."""
+        if field in self._indexes:
+            self._index_remove(field, old, book)
+            self._index_add(field, new, book)
+        if self._text_index is not None:
+            self._text_index.changed(book, field, old, new)
+        if self._journal is not None:
+            self._journal.changed(book, field, new)
+
+    def position_of(self, book):
+        """Return the position of the book in book_list, or None."""
+        return self._positions.get(book)
+
+    def _append(self, book):
+        self._positions[book] = len(self.book_list)
+        self.book_list.append(book)
+
+    def _pop(self, book):
+        """Take the book out of book_list, keeping the others in order."""
+        position = self._positions.pop(book)
+        del self.book_list[position]
+        for i in range(position, len(self.book_list)):
+            self._positions[self.book_list[i]] = i
 
     def add_book(self, book):
         """Add a book to the list managed by this Library."""
-        self.book_list.append(book)
+        self._append(book)
+        self._index_book(book)
+        if self._text_index is not None:
+            self._text_index.add(book)
+        if self._journal is not None:
+            self._journal.added(book)
 
     def remove_book(self, book):
         """Remove a book from the list managed by this Library."""
         try:
-            self.book_list.remove(book)
-        except ValueError:
+            self._pop(book)
+        except KeyError:
             print("### Could not remove book.")
+        else:
+            self._unindex_book(book)
+            if self._text_index is not None:
+                self._text_index.remove(book)
+            if self._journal is not None:
+                self._journal.removed(book)
+
+    @property
+    def saves_incrementally(self):
+        """
+        True if sync keeps the changes safe without rewriting the whole
+        library file.
+        """
+        return self._journal is not None
+
+    def sync(self):
+        """
+        Make sure the changes made so far are safely on disk. With a
+        journal this only flushes the journal, otherwise the whole
+        library file is saved.
+        """
+        if self._journal is not None:
+            self._journal.sync()
+        else:
+            self.save_to_file()
 
 #     def remove_isbn(self, isbn):
 #         """
@@ -60,12 +207,22 @@ class Library(object):
 # ##            if book.isbn == isbn:
 # ##                self.remove_book(book)
 
+    @timed_operation('load')
     def read_from_file(self):
         """
         Open the CSV file associated with this Library, and create a
-        Book for each book described within.
+        Book for each book described within. Then apply any changes
+        recorded in the journal.
         """
 
+        self._read_base()
+
+        if self._journal is not None:
+            self._replay_journal()
+
+    def _read_base(self):
+        """Read the books from the CSV file."""
+
         try:
             with open(self.filename, "rt") as library_file:
 
@@ -76,6 +233,9 @@ class Library(object):
                     sys.exit('{}'.format(e))
 
                 print('Detected delimiter:', dialect.delimiter)
+                # The sniffer can only see doubled quotes in the sample it is given,
+                # but the library is always written with them.
+                dialect.doublequote = True
                 # print('doublequote', dialect.doublequote)
                 # print('escapechar', dialect.escapechar)
                 # print('lineterminator', dialect.lineterminator)
@@ -86,34 +246,120 @@ class Library(object):
                 # Go back to start of file
                 library_file.seek(0)
 
+                book_reader = csv.reader(library_file, dialect=dialect)
+
                 # The first line of the file is to be used for key names
-                book_reader = csv.DictReader(library_file, dialect=dialect)
+                try:
+                    positions = Book.header_positions(next(book_reader))
+                except StopIteration:
+                    return
 
-                for book in book_reader:
-                    self.book_list.append(Book(**book))
+                for row in book_reader:
+                    # Skip blank lines, as csv.DictReader does
+                    if not row:
+                        continue
+                    book = Book.from_row(row, positions)
+                    self._append(book)
+                    self._index_book(book)
+                    if self._journal is not None:
+                        self._journal.track(book)
 
         except IOError:
             print("### No library file.")
 
+    def _replay_journal(self):
+        """
+        Apply the changes recorded in the journal to the books read from
+        the CSV file. This uses the Library methods directly, so that
+        subclasses see a fully loaded library as they would without a
+        journal.
+        """
+
+        journal = self._journal
+        contents = journal.read()
+        if contents is None:
+            # No journal, or one already included in the library file
+            if not self.read_only:
+                journal.remove()
+            return
+
+        records, torn = contents
+        positions = list(range(len(bkFields)))
+
+        journal.replaying = True
+        try:
+            for record in records:
+                if record[0] == JOURNAL_ADD and len(record) == len(bkFields) + 2:
+                    Library.add_book(self, Book.from_row(record[2:], positions))
+                elif record[0] == JOURNAL_REMOVE and len(record) == 2:
+                    book = journal.book_for(int(record[1]))
+                    if book is not None:
+                        Library.remove_book(self, book)
+                elif record[0] == JOURNAL_EDIT and len(record) == 4:
+                    book = journal.book_for(int(record[1]))
+                    if book is not None:
+                        setattr(book, record[2], record[3])
+        finally:
+            journal.replaying = False
+
+        print('Replayed {} journal entries'.format(len(records)))
+
+        if torn and not self.read_only:
+            # Don't append to a partly written record, start afresh
+            print('### Journal was not completely written, compacting.')
+            self.save_to_file()
+
+    @timed_operation('save')
     def save_to_file(self):
         '''
-        Open the CSV file associated with this library, and write an entry
-        for each book.
+        Write an entry for each book to the CSV file associated with this
+        library. The file is written under a temporary name and then
+        renamed over the old one, so a crash never leaves it half written.
+        With a journal, this compacts it into the library file.
         '''
 
-        with open(self.filename, "wt") as library_file:
-            book_writer = csv.writer(
-                library_file,
-                lineterminator='\n',
-                delimiter=self.delimiter)
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        handle, temp_filename = tempfile.mkstemp(
+            dir=directory,
+            prefix=os.path.basename(self.filename) + '.',
+            suffix='.tmp')
+
+        try:
+            with os.fdopen(handle, "wt") as library_file:
+                book_writer = csv.writer(
+                    library_file,
+                    lineterminator='\n',
+                    delimiter=self.delimiter)
+
+                # Write the heading row
+                book_writer.writerow([f[1] for f in bkFields])
+
+                # Write the book data
+                for book in self.book_list:
+                    book_writer.writerow(
+                        [getattr(book, f[0]) for f in bkFields])
+
+                library_file.flush()
+                os.fsync(library_file.fileno())
+
+            # Keep the permissions of the file being replaced
+            try:
+                os.chmod(temp_filename, os.stat(self.filename).st_mode)
+            except OSError:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temp_filename, 0o666 & ~umask)
 
-            # Write the heading row
-            book_writer.writerow([f[1] for f in bkFields])
+            os.replace(temp_filename, self.filename)
+        except:
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+            raise
 
-            # Write the book data
-            for book in self.book_list:
-                book_writer.writerow(
-                    [getattr(book, f[0]) for f in bkFields])
+        if self._journal is not None:
+            self._journal.reset(self.book_list)
 
         print("Saved", self.filename)
 
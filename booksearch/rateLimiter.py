@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Define a thread-safe, per-host token bucket rate limiter."""
+
+import ipaddress
+import threading
+import time
+import urllib.parse
+
+
+def is_local(host):
+    '''
+    Return True if the host (a name or a URL's netloc, with or without
+    a port) is this machine, which needs no protecting from requests.
+    '''
+    try:
+        hostname = urllib.parse.urlsplit('//' + str(host)).hostname
+    except ValueError:
+        return False
+    if hostname is None:
+        return False
+    if hostname == 'localhost' or hostname.endswith('.localhost'):
+        return True
+    try:
+        return ipaddress.ip_address(hostname).is_loopback
+    except ValueError:
+        return False
+
+
+class RateLimiter(object):
+    '''
+    Limit the rate of requests to each host with a token bucket.
+
+    Each host (any hashable key, usually a searcher name) gets a bucket
+    holding up to burst tokens, refilled at rate tokens per second.
+    acquire blocks until a token is available for the host. The default
+    rate and burst only apply to hosts on the network: requests to this
+    machine aren't limited unless set_limit has been given a limit for
+    them.
+    '''
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+
+        # Per host overrides, keyed by host, of (rate, burst)
+        self._limits = {}
+
+        # Per host state, keyed by host, of [tokens, last refill time]
+        self._buckets = {}
+
+        self._lock = threading.Lock()
+
+        # The total time spent waiting for tokens
+        self.waited = 0.0
+
+    def set_limit(self, host, rate, burst=1):
+        '''Set the rate (requests per second) and burst for a host.'''
+        with self._lock:
+            self._limits[host] = (rate, burst)
+            self._buckets.pop(host, None)
+
+    def _reserve(self, host):
+        '''
+        Take a token for the host, returning how long the caller must
+        wait before using it.
+        '''
+        limit = self._limits.get(host)
+        if limit is None:
+            if is_local(host):
+                return 0.0
+            limit = (self.rate, self.burst)
+        rate, burst = limit
+        if rate is None or rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = [float(burst), now]
+                self._buckets[host] = bucket
+
+            # Refill, then take a token (which may leave a debt)
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            tokens -= 1.0
+            bucket[0] = tokens
+            bucket[1] = now
+
+        if tokens >= 0.0:
+            return 0.0
+        return -tokens / rate
+
+    def acquire(self, host):
+        '''Block until a request may be made to the host.'''
+        delay = self._reserve(host)
+        if delay > 0.0:
+            with self._lock:
+                self.waited += delay
+            time.sleep(delay)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Re-query the books in a library that have unknown fields."""
+
+import csv
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .book import Book, UNKNOWN
+from .identifier import normalise_isbn, normalise_lccn
+from .isbnSearch import Modes, SearchError
+
+
+class ConflictCollector(object):
+    '''
+    Collects conflicting field values found while merging, so they can
+    be reviewed later rather than asking the user there and then.
+    '''
+
+    def __init__(self):
+        self.conflicts = []
+        self._lock = threading.Lock()
+
+    def resolver_for(self, book, book_data):
+        '''
+        Return a resolver for merging book_data into the book with
+        Book.update_unknowns, that records the conflict and keeps the
+        book's current value.
+        '''
+        def resolver(field, new, old):
+            current = getattr(book, field)
+            found = book_data.get(field, new)
+            with self._lock:
+                self.conflicts.append((book.isbn, field, current, found))
+            return current
+        return resolver
+
+    def write(self, filename, delimiter='|'):
+        '''
+        Append the collected conflicts to a CSV file and forget them.
+        '''
+        with self._lock:
+            conflicts = self.conflicts
+            self.conflicts = []
+
+        if len(conflicts) == 0:
+            return
+
+        new_file = not os.path.exists(filename)
+        with open(filename, 'at') as conflict_file:
+            writer = csv.writer(
+                conflict_file,
+                lineterminator='\n',
+                delimiter=delimiter)
+            if new_file:
+                writer.writerow(['ISBN', 'Field', 'Current', 'Found'])
+            for conflict in conflicts:
+                writer.writerow(conflict)
+
+
+class Requery(object):
+    '''
+    Re-query every book in a library that has UNKNOWN fields, using a
+    bounded pool of workers. The searchers' request scheduler limits
+    the rate of requests to each host; a rate_limiter may be given to
+    limit each searcher further.
+
+    Progress is checkpointed: every checkpoint_every books the changes
+    are synced (only the journal is flushed, if the library has one) and
+    the identifiers done so far are appended to the checkpoint file, so
+    that an interrupted run carries on where it stopped. A book that no
+    searcher could be asked about is not checkpointed, so it is tried
+    again. The library is saved and the checkpoint file removed when the
+    run completes.
+
+    No more than window books (twice the workers, by default) are being
+    queried at any time, so a large library isn't queued all at once.
+    '''
+
+    def __init__(
+            self,
+            library,
+            searchers,
+            max_workers=4,
+            rate_limiter=None,
+            checkpoint_file=None,
+            conflict_file=None,
+            checkpoint_every=500,
+            progress_interval=2.0,
+            window=None):
+
+        self.library = library
+        self.searchers = searchers
+        self.max_workers = max_workers
+        if window is None:
+            window = 2 * max_workers
+        self.window = window
+        self.checkpoint_every = checkpoint_every
+        self.progress_interval = progress_interval
+
+        self.rate_limiter = rate_limiter
+
+        if checkpoint_file is None:
+            checkpoint_file = library.filename + '.requery'
+        self.checkpoint_file = checkpoint_file
+
+        if conflict_file is None:
+            conflict_file = library.filename + '.conflicts'
+        self.conflict_file = conflict_file
+
+        self.conflicts = ConflictCollector()
+
+        # Statistics
+        self.done = 0
+        self.improved = 0
+        self.failed = 0
+
+    @staticmethod
+    def identifier(book):
+        '''
+        Return the (identifier, mode) to query the book by, or None if
+        the book has no usable identifier. An invalid ISBN is not worth
+        asking about.
+        '''
+        isbn = normalise_isbn(book.isbn)
+        if isbn is not None:
+            return isbn, Modes.ISBN
+        lccn = normalise_lccn(book.lccn)
+        if lccn is not None:
+            return lccn, Modes.LCCN
+        return None
+
+    def read_checkpoint(self):
+        '''Return the set of identifiers already done.'''
+        try:
+            with open(self.checkpoint_file, 'rt') as checkpoint:
+                return set(line.strip() for line in checkpoint)
+        except IOError:
+            return set()
+
+    def write_checkpoint(self, identifiers):
+        '''
+        Make the changes safe, then record the identifiers as done.
+        '''
+        self.library.sync()
+        self.conflicts.write(self.conflict_file, self.library.delimiter)
+        with open(self.checkpoint_file, 'at') as checkpoint:
+            for identifier in identifiers:
+                checkpoint.write(identifier + '\n')
+
+    def query(self, identifier, mode):
+        '''
+        Ask each searcher for the mode about the identifier, in a worker.
+        Returns a list of (searcher, book data) in priority order. Raises
+        SearchError if none of the searchers could be asked.
+        '''
+        answers = []
+        error = None
+        for searcher in self.searchers[mode]:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(searcher.name)
+            try:
+                book_data = searcher.answer(identifier, mode)
+            except SearchError as err:
+                error = err
+                continue
+            found = Book(isbn=identifier)
+            if book_data is not None:
+                found.update(**book_data)
+            answers.append((searcher, found.as_dict(known_only=True)))
+        if len(answers) == 0 and error is not None:
+            raise error
+        return answers
+
+    def merge(self, book, answers):
+        '''
+        Merge the answers into the book, collecting any conflicts.
+        Returns True if any unknown fields were filled.
+        '''
+        unknowns = len([v for v in book.as_dict().values() if v == UNKNOWN])
+        for searcher, book_data in answers:
+            book.update_unknowns(
+                resolver=self.conflicts.resolver_for(book, book_data),
+                **book_data)
+        return len([v for v in book.as_dict().values() if v == UNKNOWN]) < unknowns
+
+    def report(self, total, started):
+        elapsed = time.time() - started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        print('Requeried {}/{} books ({:.1f} books/s), {} improved, {} failed'.format(
+            self.done, total, rate, self.improved, self.failed))
+
+    def run(self):
+        '''
+        Re-query the books, returning True if the run completed.
+        '''
+        already_done = self.read_checkpoint()
+        if len(already_done) > 0:
+            print('Resuming, {} books already requeried'.format(
+                len(already_done)))
+
+        todo = []
+        for book in self.library.book_list:
+            if not book.has_unknowns:
+                continue
+            key = self.identifier(book)
+            if key is None or key[0] in already_done:
+                continue
+            todo.append((book, key))
+
+        total = len(todo)
+        print('Requerying {} books with unknown fields'.format(total))
+
+        started = time.time()
+        last_report = started
+        pending_checkpoint = []
+        futures = {}
+        queue = iter(todo)
+
+        def submit_more():
+            """Keep the window of books being queried full."""
+            while len(futures) < self.window:
+                try:
+                    book, key = next(queue)
+                except StopIteration:
+                    return
+                future = executor.submit(self.query, key[0], key[1])
+                futures[future] = (book, key[0])
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            submit_more()
+            while len(futures) > 0:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    book, identifier = futures.pop(future)
+                    try:
+                        answers = future.result()
+                    except Exception as err:
+                        # Not checkpointed, so it is retried on resume
+                        print('### Requery of {} failed: {}'.format(
+                            identifier, err))
+                        self.failed += 1
+                    else:
+                        if self.merge(book, answers):
+                            self.improved += 1
+                        pending_checkpoint.append(identifier)
+
+                    self.done += 1
+
+                submit_more()
+
+                if len(pending_checkpoint) >= self.checkpoint_every:
+                    self.write_checkpoint(pending_checkpoint)
+                    pending_checkpoint = []
+
+                now = time.time()
+                if now - last_report >= self.progress_interval:
+                    self.report(total, started)
+                    last_report = now
+
+        except KeyboardInterrupt:
+            print('\nInterrupted, saving progress...')
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.write_checkpoint(pending_checkpoint)
+            self.report(total, started)
+            return False
+
+        executor.shutdown(wait=True)
+
+        # Finished, so there is nothing to resume
+        self.library.save_to_file()
+        self.conflicts.write(self.conflict_file, self.library.delimiter)
+        try:
+            os.remove(self.checkpoint_file)
+        except OSError:
+            pass
+
+        self.report(total, started)
+        return True
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Define the scheduling of searcher requests: a per-host rate limit,
+retries with backoff, a deadline per request, and a circuit breaker
+per host.
+"""
+
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+from .rateLimiter import RateLimiter
+
+# HTTP statuses worth retrying after a pause
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_DEADLINE = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60.0
+
+
+class CircuitOpenError(urllib.error.URLError):
+    '''Raised instead of making a request to a host that is failing.'''
+    pass
+
+
+class CircuitBreaker(object):
+    '''
+    Stops requests to a host after failure_threshold requests in a row
+    have failed. After reset_timeout seconds one trial request is let
+    through: if it succeeds the host is used again, otherwise it is
+    skipped for another reset_timeout.
+    '''
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(
+            self,
+            failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        '''Returns True if a request may be made.'''
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at >= self.reset_timeout:
+                    # Let this one request through as a trial
+                    self.state = self.HALF_OPEN
+                    return True
+                return False
+            # Half open, a trial request is already being made
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RequestScheduler(object):
+    '''
+    Makes requests through an HTTP client on behalf of the searchers,
+    limiting the rate of requests to each host, retrying requests
+    that fail with 429, a 5xx status or a connection error after a
+    jittered exponential backoff, giving up when the deadline for the
+    request has passed, and skipping hosts whose circuit breaker is open.
+    '''
+
+    def __init__(
+            self,
+            rate_limiter=None,
+            max_retries=DEFAULT_MAX_RETRIES,
+            backoff_base=DEFAULT_BACKOFF_BASE,
+            backoff_max=DEFAULT_BACKOFF_MAX,
+            deadline=DEFAULT_DEADLINE,
+            failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout=DEFAULT_RESET_TIMEOUT,
+            seed=None):
+
+        if rate_limiter is None:
+            # No limit unless one is asked for
+            rate_limiter = RateLimiter(rate=None)
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._random = random.Random(seed)
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _count(self, host, name, amount=1):
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = {
+                    'requests': 0, 'retries': 0, 'failures': 0,
+                    'skipped': 0, 'deadline_exceeded': 0, 'throttled': 0.0}
+                self._stats[host] = stats
+            stats[name] += amount
+
+    def backoff(self, attempt, err=None):
+        '''
+        Return the pause before the given retry: a random time up to an
+        exponentially growing cap, or the server's Retry-After if given.
+        '''
+        if isinstance(err, urllib.error.HTTPError) and err.headers is not None:
+            retry_after = err.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        with self._lock:
+            return self._random.uniform(cap / 2, cap)
+
+    def fetch(self, client, url):
+        '''
+        GET the URL with the client, returning its Response. Raises
+        urllib.error.URLError (or HTTPError) if the request fails for
+        good, and CircuitOpenError if the host is being skipped.
+        '''
+        host = urllib.parse.urlsplit(url).netloc
+        breaker = self.breaker(host)
+
+        if not breaker.allow():
+            self._count(host, 'skipped')
+            raise CircuitOpenError('{} is failing, skipped'.format(host))
+
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            self.rate_limiter.acquire(host)
+            self._count(host, 'throttled', time.monotonic() - started)
+
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                self._count(host, 'deadline_exceeded')
+                breaker.record_failure()
+                raise urllib.error.URLError('deadline exceeded for {}'.format(url))
+
+            self._count(host, 'requests')
+            try:
+                response = client.get(url, timeout=remaining)
+            except urllib.error.HTTPError as err:
+                if err.code not in RETRY_STATUSES:
+                    # The host answered, it just doesn't have the page
+                    breaker.record_success()
+                    raise
+                failure = err
+            except urllib.error.URLError as err:
+                failure = err
+            else:
+                breaker.record_success()
+                return response
+
+            pause = self.backoff(attempt, failure)
+            if attempt >= self.max_retries or time.monotonic() + pause >= give_up_at:
+                self._count(host, 'failures')
+                if attempt < self.max_retries:
+                    self._count(host, 'deadline_exceeded')
+                breaker.record_failure()
+                raise failure
+
+            self._count(host, 'retries')
+            attempt += 1
+            time.sleep(pause)
+
+    def stats(self):
+        '''
+        Return a dictionary, keyed by host, of the request statistics
+        and circuit breaker state.
+        '''
+        with self._lock:
+            stats = dict((host, dict(s)) for host, s in self._stats.items())
+            breakers = dict(self._breakers)
+        for host, breaker in breakers.items():
+            host_stats = stats.setdefault(host, {})
+            host_stats['circuit'] = breaker.state
+            host_stats['circuit_opened'] = breaker.times_opened
+        return stats
+
+    def __str__(self):
+        lines = []
+        for host, s in sorted(self.stats().items()):
+            lines.append(
+                '{}: {} requests, {} retries, {} failures, {} skipped, '
+                '{} past deadline, {:.1f}s throttled, circuit {}'.format(
+                    host, s.get('requests', 0), s.get('retries', 0),
+                    s.get('failures', 0), s.get('skipped', 0),
+                    s.get('deadline_exceeded', 0), s.get('throttled', 0.0),
+                    s['circuit']))
+        return '\n'.join(lines)
+
+
+# The scheduler shared by all searchers, unless they are given their own.
+shared_scheduler = RequestScheduler()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Define a persistent cache of searcher answers, stored with SQLite."""
+
+import json
+import sqlite3
+import threading
+import time
+
+from .identifier import clean, canonical_isbn, normalise_lccn
+from .isbnSearch import Modes
+
+# Answers are kept for 30 days by default.
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+# "Not found" answers are kept for a day by default, as the sites
+# may learn about a book later.
+DEFAULT_NEGATIVE_TTL = 24 * 60 * 60
+
+# The default maximum number of answers kept in the cache.
+DEFAULT_MAX_ENTRIES = 500000
+
+# The number of hits whose access times are gathered before they are
+# written to the database together.
+ACCESS_BATCH = 1000
+
+
+class SearchCache(object):
+    '''
+    A cache of searcher answers keyed by (searcher name, mode, identifier).
+
+    Answers are stored as the JSON encoded book data returned by a
+    searcher's lookup, or as NULL for "not found" answers. Each searcher
+    may have its own time to live for both kinds of answer. When the
+    cache holds more than max_entries answers the least recently used
+    are evicted. The times answers are used are kept in memory and
+    written in batches, so a hit doesn't cost a write to disk.
+
+    ISBNs are keyed by their ISBN-13, so a book's ISBN-10 and ISBN-13
+    share one answer.
+
+    The LCCNs and ISBN-13s found together in answers are kept in a cross
+    reference, so that an answer cached for a book's LCCN also answers
+    a query for its ISBN, and the other way round.
+    '''
+
+    def __init__(
+            self,
+            filename,
+            max_entries=DEFAULT_MAX_ENTRIES,
+            ttl=DEFAULT_TTL,
+            negative_ttl=DEFAULT_NEGATIVE_TTL):
+
+        self.filename = filename
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        # Per searcher overrides of the time to live, keyed by name
+        self._ttls = {}
+        self._negative_ttls = {}
+
+        # The access times of answers used since the last batch was
+        # written, keyed by answer key
+        self._accessed = {}
+
+        # Counters
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.cross_referenced = 0
+
+        # The searchers may be called from a pool of threads
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute(
+            '''CREATE TABLE IF NOT EXISTS answers (
+                searcher TEXT NOT NULL,
+                mode INTEGER NOT NULL,
+                identifier TEXT NOT NULL,
+                data TEXT,
+                stored REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (searcher, mode, identifier))''')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)')
+        self._db.execute(
+            '''CREATE TABLE IF NOT EXISTS xref (
+                lccn TEXT PRIMARY KEY,
+                isbn13 TEXT NOT NULL)''')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS xref_isbn13 ON xref (isbn13)')
+        self._db.commit()
+
+        self._count = self._db.execute(
+            'SELECT COUNT(*) FROM answers').fetchone()[0]
+
+    def set_ttl(self, searcher_name, ttl, negative_ttl=None):
+        '''
+        Set the time to live, in seconds, of the answers from the named
+        searcher and, optionally, of its "not found" answers.
+        '''
+        self._ttls[searcher_name] = ttl
+        if negative_ttl is not None:
+            self._negative_ttls[searcher_name] = negative_ttl
+
+    @staticmethod
+    def _key(searcher_name, mode, identifier):
+        '''
+        Return the key of an answer: LCCNs are normalised and ISBNs
+        turned into ISBN-13s.
+        '''
+        identifier = str(identifier)
+        if mode == Modes.LCCN:
+            identifier = normalise_lccn(identifier) or clean(identifier)
+        else:
+            identifier = canonical_isbn(identifier) or clean(identifier)
+        return (searcher_name, int(mode), identifier)
+
+    def get(self, searcher_name, mode, identifier):
+        '''
+        Look for an answer in the cache. Returns a tuple of
+        (found, book_data), where book_data is None for a cached
+        "not found" answer. If there is no answer for the identifier, an
+        answer for the book's other identifier (its ISBN for an LCCN, or
+        its LCCN for an ISBN) is used, if the cross reference knows it.
+        '''
+        key = self._key(searcher_name, mode, identifier)
+        now = time.time()
+
+        with self._lock:
+            found, data = self._answer(key, now)
+            if not found:
+                data = self._cross_referenced_answer(key, identifier, now)
+                if data is None:
+                    self.misses += 1
+                    return False, None
+                self.cross_referenced += 1
+                self.hits += 1
+                return True, data
+
+            if data is None:
+                self.negative_hits += 1
+                return True, None
+
+            self.hits += 1
+            book_data = json.loads(data)
+            if mode == Modes.ISBN and 'isbn' in book_data:
+                # As asked, which may be the other form of the ISBN
+                book_data['isbn'] = str(identifier)
+            return True, book_data
+
+    def _answer(self, key, now):
+        '''
+        Return (found, data) for the key, data being the JSON encoded
+        book data or None. Expired answers are not found.
+        '''
+        row = self._db.execute(
+            '''SELECT data, stored FROM answers
+               WHERE searcher=? AND mode=? AND identifier=?''',
+            key).fetchone()
+
+        if row is None:
+            return False, None
+
+        data, stored = row
+        if data is None:
+            ttl = self._negative_ttls.get(key[0], self.negative_ttl)
+        else:
+            ttl = self._ttls.get(key[0], self.ttl)
+
+        if now - stored > ttl:
+            self.expired += 1
+            return False, None
+
+        self._accessed[key] = now
+        if len(self._accessed) >= ACCESS_BATCH:
+            self._write_accessed()
+            self._db.commit()
+        return True, data
+
+    def _write_accessed(self):
+        '''Write the access times gathered since the last batch.'''
+        if len(self._accessed) == 0:
+            return
+        self._db.executemany(
+            '''UPDATE answers SET accessed=?
+               WHERE searcher=? AND mode=? AND identifier=?''',
+            [(accessed,) + key for key, accessed in self._accessed.items()])
+        self._accessed = {}
+
+    def _cross_referenced_answer(self, key, identifier, now):
+        '''
+        Return the book data cached for the other identifier of the book
+        with the key's identifier, or None.
+        '''
+        searcher_name, mode, value = key
+        if mode == Modes.LCCN:
+            row = self._db.execute(
+                'SELECT isbn13 FROM xref WHERE lccn=?', (value,)).fetchone()
+            if row is None:
+                return None
+            others = [row[0]]
+            other_mode = Modes.ISBN
+        else:
+            isbn13 = canonical_isbn(value)
+            if isbn13 is None:
+                return None
+            row = self._db.execute(
+                'SELECT lccn FROM xref WHERE isbn13=?', (isbn13,)).fetchone()
+            if row is None:
+                return None
+            others = [row[0]]
+            other_mode = Modes.LCCN
+
+        for other in others:
+            found, data = self._answer(
+                (searcher_name, int(other_mode), other), now)
+            if found and data is not None:
+                book_data = json.loads(data)
+                # As the searcher would have answered the query
+                if mode == Modes.LCCN:
+                    book_data['isbn'] = row[0]
+                    book_data['lccn'] = value
+                else:
+                    book_data['isbn'] = str(identifier)
+                return book_data
+        return None
+
+    def _link(self, mode, identifier, book_data):
+        '''Record the LCCN and ISBN-13 of the book data, if it has both.'''
+        lccn = normalise_lccn(book_data.get('lccn'))
+        isbn13 = (
+            canonical_isbn(book_data.get('isbn13')) or
+            canonical_isbn(book_data.get('isbn10')))
+        if mode == Modes.LCCN:
+            lccn = lccn or normalise_lccn(str(identifier))
+        else:
+            isbn13 = isbn13 or canonical_isbn(str(identifier))
+        if lccn is not None and isbn13 is not None:
+            self._db.execute(
+                'INSERT OR REPLACE INTO xref (lccn, isbn13) VALUES (?, ?)',
+                (lccn, isbn13))
+
+    def isbn_for_lccn(self, lccn):
+        '''Return the ISBN-13 of the book with the LCCN, if known.'''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT isbn13 FROM xref WHERE lccn=?',
+                (normalise_lccn(lccn),)).fetchone()
+        return None if row is None else row[0]
+
+    def lccn_for_isbn(self, isbn):
+        '''Return the LCCN of the book with the ISBN (either form), if known.'''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT lccn FROM xref WHERE isbn13=?',
+                (canonical_isbn(isbn),)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, searcher_name, mode, identifier, book_data):
+        '''
+        Store an answer in the cache. A book_data of None records that
+        the searcher does not know the identifier.
+        '''
+        key = self._key(searcher_name, mode, identifier)
+        now = time.time()
+
+        with self._lock:
+            if book_data is not None:
+                self._link(mode, identifier, book_data)
+                book_data = json.dumps(book_data)
+
+            replaced = self._db.execute(
+                '''DELETE FROM answers
+                   WHERE searcher=? AND mode=? AND identifier=?''',
+                key).rowcount
+            self._db.execute(
+                '''INSERT INTO answers
+                   (searcher, mode, identifier, data, stored, accessed)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                key + (book_data, now, now))
+            self._count += 1 - replaced
+            self._accessed.pop(key, None)
+
+            # The least recently used must be known before evicting
+            self._write_accessed()
+            if self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+
+            self._db.commit()
+
+    def _evict(self, number):
+        '''Remove the least recently used answers.'''
+        evicted = self._db.execute(
+            '''DELETE FROM answers WHERE rowid IN (
+                   SELECT rowid FROM answers ORDER BY accessed LIMIT ?)''',
+            (number,)).rowcount
+        self._count -= evicted
+        self.evictions += evicted
+
+    def clear(self):
+        '''Remove all answers from the cache.'''
+        with self._lock:
+            self._db.execute('DELETE FROM answers')
+            self._db.commit()
+            self._accessed = {}
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._write_accessed()
+            self._db.commit()
+            self._db.close()
+
+    @property
+    def entry_count(self):
+        return self._count
+
+    def stats(self):
+        '''
+        Return a dictionary of the cache counters.
+        '''
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'cross_referenced': self.cross_referenced,
+            'entries': self._count}
+
+    def __str__(self):
+        return ('Cache {}: {hits} hits, {negative_hits} not found hits, '
+                '{misses} misses ({expired} expired), {evictions} evictions, '
+                '{cross_referenced} answered by cross reference, '
+                '{entries} entries').format(self.filename, **self.stats())
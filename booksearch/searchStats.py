@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Count and time what the searchers and the library do: for each searcher
+and mode, the searches made and how they turned out, their latency,
+the bytes fetched and the time spent parsing; and the time taken to
+load, save and look up books in the library. The totals can be shown,
+dumped as JSON or written out in the Prometheus text format.
+"""
+
+import bisect
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# The upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+    5.0, 10.0, 30.0)
+
+# The outcomes of a search
+(
+    HIT,
+    MISS,
+    ERROR
+) = ('hit', 'miss', 'error')
+
+# The prefix of the Prometheus metric names
+METRIC_PREFIX = 'booksearch'
+
+
+class Histogram(object):
+    '''Counts of observed values in the LATENCY_BUCKETS, and their sum.'''
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One count per bucket, and one for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        '''
+        Return the upper bound of the bucket holding the q quantile, or
+        None if there is nothing to go on.
+        '''
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        return {
+            # (upper bound, count) pairs, in order
+            'buckets': list(zip(self.bounds, self.counts)),
+            'above': self.counts[-1],
+            'count': self.count,
+            'sum': self.sum}
+
+
+def _searcher_stats():
+    return {
+        'searches': 0,
+        HIT: 0,
+        MISS: 0,
+        ERROR: 0,
+        'cached': 0,
+        'fields': 0,
+        'unknown_fields': 0,
+        'requests': 0,
+        'bytes': 0,
+        'fetch_seconds': 0.0,
+        'parse_seconds': 0.0,
+        'latency': Histogram()}
+
+
+def _label(value):
+    '''Escape a Prometheus label value.'''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(k, _label(v)) for k, v in sorted(labels.items()))
+
+
+def write_atomically(filename, text):
+    '''Write the file under a temporary name and rename it into place.'''
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, temp_filename = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wt') as stats_file:
+            stats_file.write(text)
+        os.chmod(temp_filename, 0o644)
+        os.replace(temp_filename, filename)
+    except:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+class SearchStats(object):
+    '''
+    The counters and timings, kept per (searcher name, mode name) for the
+    searchers and per operation name for the library. The searchers may
+    record from a pool of threads.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._searchers = {}
+        self._operations = {}
+        self.started = time.time()
+
+    def _searcher(self, name, mode):
+        key = (name, getattr(mode, 'name', str(mode)))
+        stats = self._searchers.get(key)
+        if stats is None:
+            stats = _searcher_stats()
+            self._searchers[key] = stats
+        return stats
+
+    def totals(self, name, mode):
+        '''
+        Return the number of searches a searcher has made in a mode, how
+        many found the book, and the number timed and their total time.
+        '''
+        with self._lock:
+            stats = self._searchers.get((name, getattr(mode, 'name', str(mode))))
+            if stats is None:
+                return 0, 0, 0, 0.0
+            return (stats['searches'], stats[HIT],
+                    stats['latency'].count, stats['latency'].sum)
+
+    def record_search(self, name, mode, outcome, seconds=None,
+                      cached=False, fields=0, unknown_fields=0):
+        '''
+        Record a search: its outcome (HIT, MISS or ERROR), how long it
+        took, whether it was answered from the cache, and for an answer
+        how many of the book's fields were given and how many were unknown.
+        '''
+        with self._lock:
+            stats = self._searcher(name, mode)
+            stats['searches'] += 1
+            stats[outcome] += 1
+            if cached:
+                stats['cached'] += 1
+            stats['fields'] += fields
+            stats['unknown_fields'] += unknown_fields
+            if seconds is not None:
+                stats['latency'].observe(seconds)
+
+    def record_fetch(self, name, mode, seconds, size):
+        '''Record a page fetched from the web site, and its size in bytes.'''
+        with self._lock:
+            stats = self._searcher(name, mode)
+            stats['requests'] += 1
+            stats['bytes'] += size
+            stats['fetch_seconds'] += seconds
+
+    def record_parse(self, name, mode, seconds):
+        '''Record the time taken to parse a page.'''
+        with self._lock:
+            self._searcher(name, mode)['parse_seconds'] += seconds
+
+    def record_operation(self, operation, seconds):
+        '''Record the time taken by a library operation.'''
+        with self._lock:
+            histogram = self._operations.get(operation)
+            if histogram is None:
+                histogram = Histogram()
+                self._operations[operation] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, operation):
+        '''Time the block as a library operation.'''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_operation(operation, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self._searchers = {}
+            self._operations = {}
+            self.started = time.time()
+
+    def stats(self):
+        '''
+        Return a dictionary of the totals: 'searchers', keyed by
+        "name mode", and 'library', keyed by operation.
+        '''
+        with self._lock:
+            searchers = {}
+            for (name, mode), s in sorted(self._searchers.items()):
+                s = dict(s)
+                s['latency'] = s['latency'].as_dict()
+                searchers['{} {}'.format(name, mode)] = dict(s, searcher=name, mode=mode)
+            operations = dict(
+                (operation, histogram.as_dict())
+                for operation, histogram in sorted(self._operations.items()))
+        return {
+            'started': self.started,
+            'searchers': searchers,
+            'library': operations}
+
+    def write_json(self, filename, **extra):
+        '''
+        Write the totals to a JSON file, with any extra sections given
+        (the scheduler's and cache's statistics, say).
+        '''
+        stats = self.stats()
+        stats.update(extra)
+        write_atomically(filename, json.dumps(stats, indent=2, sort_keys=True, default=str) + '\n')
+
+    def prometheus_text(self):
+        '''Return the totals in the Prometheus text exposition format.'''
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = '{}_{}'.format(METRIC_PREFIX, name)
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for suffix, labels, value in samples:
+                lines.append('{}{}{{{}}} {}'.format(name, suffix, labels, value))
+
+        def histogram_samples(histogram, **labels):
+            samples = []
+            seen = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                seen += count
+                samples.append(('_bucket', _labels(le=bound, **labels), seen))
+            samples.append(('_bucket', _labels(le='+Inf', **labels), histogram.count))
+            samples.append(('_sum', _labels(**labels), histogram.sum))
+            samples.append(('_count', _labels(**labels), histogram.count))
+            return samples
+
+        with self._lock:
+            searchers = sorted(
+                (key, dict(s)) for key, s in self._searchers.items())
+            operations = sorted(self._operations.items())
+
+            metric('searches_total', 'counter',
+                   'Searches made, by searcher, mode and outcome.',
+                   [('', _labels(searcher=name, mode=mode, outcome=outcome), s[outcome])
+                    for (name, mode), s in searchers
+                    for outcome in (HIT, MISS, ERROR)])
+            metric('cached_searches_total', 'counter',
+                   'Searches answered from the cache.',
+                   [('', _labels(searcher=name, mode=mode), s['cached'])
+                    for (name, mode), s in searchers])
+            metric('answer_fields_total', 'counter',
+                   'Book fields in the answers found.',
+                   [('', _labels(searcher=name, mode=mode), s['fields'])
+                    for (name, mode), s in searchers])
+            metric('unknown_fields_total', 'counter',
+                   'Book fields left unknown by the answers found.',
+                   [('', _labels(searcher=name, mode=mode), s['unknown_fields'])
+                    for (name, mode), s in searchers])
+            metric('requests_total', 'counter',
+                   'Pages fetched from the web sites.',
+                   [('', _labels(searcher=name, mode=mode), s['requests'])
+                    for (name, mode), s in searchers])
+            metric('response_bytes_total', 'counter',
+                   'Bytes fetched from the web sites.',
+                   [('', _labels(searcher=name, mode=mode), s['bytes'])
+                    for (name, mode), s in searchers])
+            metric('fetch_seconds_total', 'counter',
+                   'Time spent fetching pages.',
+                   [('', _labels(searcher=name, mode=mode), s['fetch_seconds'])
+                    for (name, mode), s in searchers])
+            metric('parse_seconds_total', 'counter',
+                   'Time spent parsing pages.',
+                   [('', _labels(searcher=name, mode=mode), s['parse_seconds'])
+                    for (name, mode), s in searchers])
+            metric('search_seconds', 'histogram',
+                   'Time taken by each search, including the cache.',
+                   [sample for (name, mode), s in searchers
+                    for sample in histogram_samples(s['latency'], searcher=name, mode=mode)])
+            metric('library_operation_seconds', 'histogram',
+                   'Time taken to load, save and look up books in the library.',
+                   [sample for operation, histogram in operations
+                    for sample in histogram_samples(histogram, operation=operation)])
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename):
+        '''
+        Write the totals in the Prometheus text format, for a node
+        exporter's textfile collector. The file is replaced atomically,
+        so it is never read half written.
+        '''
+        write_atomically(filename, self.prometheus_text())
+
+    def __str__(self):
+        def seconds(value):
+            return '-' if value is None else '{:g}s'.format(value)
+
+        lines = []
+        stats = self.stats()
+        for key, s in stats['searchers'].items():
+            with self._lock:
+                histogram = self._searchers[(s['searcher'], s['mode'])]['latency']
+                p50 = histogram.quantile(0.5)
+                p95 = histogram.quantile(0.95)
+            unknown = 100.0 * s['unknown_fields'] / s['fields'] if s['fields'] else 0.0
+            lines.append(
+                '{}: {} searches, {} found, {} not found, {} failed, {} cached, '
+                '{:.0f}% of fields unknown, p50 {} p95 {}, {} requests, {:.1f}kB, '
+                '{:.3f}s parsing'.format(
+                    key, s['searches'], s[HIT], s[MISS], s[ERROR], s['cached'],
+                    unknown, seconds(p50), seconds(p95), s['requests'],
+                    s['bytes'] / 1024, s['parse_seconds']))
+        for operation, h in stats['library'].items():
+            lines.append('library {}: {} times, {:.3f}s in all'.format(
+                operation, h['count'], h['sum']))
+        if len(lines) == 0:
+            lines.append('Nothing searched yet')
+        return '\n'.join(lines)
+
+
+# The statistics shared by all searchers and libraries, unless they are
+# given their own.
+shared_stats = SearchStats()
+
+
+def timed_operation(operation):
+    '''Decorate a library method to record its time in shared_stats.'''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with shared_stats.timed(operation):
+                return method(*args, **kwargs)
+        return wrapper
+    return decorator
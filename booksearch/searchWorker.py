@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Run book lookups on a pool of worker threads, handing each result back
+to the thread that asked for it (the GTK main loop, say) so that the
+searchers' network round trips never block it.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The states of a lookup
+(
+    PENDING,
+    DONE,
+    FAILED,
+    CANCELLED
+) = ('Searching...', 'Done', 'Failed', 'Cancelled')
+
+
+class Lookup(object):
+    '''
+    A lookup of one ISBN (or LCCN) submitted to a SearchWorker, in the
+    given search mode. The book is whatever the caller wants the answer
+    for; it is not touched by the worker threads.
+    '''
+
+    def __init__(self, isbn, mode=None, book=None, data=None):
+        self.isbn = isbn
+        self.mode = mode
+        self.book = book
+        self.data = data
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self._future = None
+
+    @property
+    def pending(self):
+        return self.state == PENDING
+
+    def __repr__(self):
+        return 'Lookup({!r}, {})'.format(self.isbn, self.state)
+
+
+class SearchWorker(object):
+    '''
+    Runs search(isbn, mode) for each submitted lookup on up to max_workers
+    threads. When a lookup finishes, post(function, *args) is used to
+    call the done callback as done(lookup) in the caller's thread, which
+    for GTK is GLib.idle_add. A cancelled lookup is never reported.
+    '''
+
+    def __init__(self, search, post, max_workers=4):
+        self._search = search
+        self._post = post
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._lookups = []
+
+    @property
+    def pending(self):
+        '''The lookups that have not finished yet, oldest first.'''
+        with self._lock:
+            return list(self._lookups)
+
+    def submit(self, isbn, done, mode=None, book=None, data=None):
+        '''Start looking up isbn, returning the Lookup.'''
+        lookup = Lookup(isbn, mode=mode, book=book, data=data)
+        with self._lock:
+            self._lookups.append(lookup)
+        lookup._future = self._executor.submit(self._run, lookup, done)
+        return lookup
+
+    def cancel(self, lookup):
+        '''
+        Cancel a lookup. One already being searched for runs on, but its
+        result is thrown away.
+        '''
+        if lookup.state != PENDING:
+            return False
+        lookup.state = CANCELLED
+        if lookup._future is not None:
+            lookup._future.cancel()
+        self._forget(lookup)
+        return True
+
+    def cancel_all(self):
+        for lookup in self.pending:
+            self.cancel(lookup)
+
+    def shutdown(self, wait=False):
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
+
+    def _forget(self, lookup):
+        with self._lock:
+            try:
+                self._lookups.remove(lookup)
+            except ValueError:
+                pass
+
+    def _run(self, lookup, done):
+        '''Search for the lookup, in a worker thread.'''
+        if lookup.state != PENDING:
+            return
+        try:
+            result = self._search(lookup.isbn, lookup.mode)
+        except Exception as e:
+            print('### Search for {} failed: {}'.format(lookup.isbn, e))
+            self._post(self._finish, lookup, done, None, e)
+        else:
+            self._post(self._finish, lookup, done, result, None)
+
+    def _finish(self, lookup, done, result, error):
+        '''Report the lookup's result, in the caller's thread.'''
+        if lookup.state == PENDING:
+            self._forget(lookup)
+            lookup.result = result
+            lookup.error = error
+            lookup.state = DONE if error is None else FAILED
+            done(lookup)
+        # Called once from GLib.idle_add
+        return False
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Order the searchers for each mode by their expected cost per answer,
+worked out from their hit rates and latencies, so that a lookup which
+stops at the first searcher to find the book asks the likeliest and
+quickest one first.
+"""
+
+import json
+import random
+import threading
+import time
+
+from .isbnSearch import Modes
+from .searchStats import shared_stats, write_atomically
+
+# What is assumed of a searcher before anything is known of it: that
+# it finds PRIOR_HITS books in PRIOR_SEARCHES, taking PRIOR_SECONDS each
+PRIOR_HITS = 1
+PRIOR_SEARCHES = 2
+PRIOR_SECONDS = 1.0
+
+# The searches remembered from earlier runs are scaled down to this many
+# per searcher and mode, so that the current run soon outweighs them
+HISTORY_LIMIT = 200
+
+# The chance of a lookup trying a searcher other than the best first
+EXPLORATION = 0.1
+
+HISTORY_VERSION = 1
+
+
+class Estimate(object):
+    '''
+    What is known of a searcher in a mode: the searches it has made, how
+    many found the book, and how many were timed and for how long.
+    '''
+
+    def __init__(self, searcher, searches=0, hits=0, timed=0, seconds=0.0):
+        self.searcher = searcher
+        self.searches = searches
+        self.hits = hits
+        self.timed = timed
+        self.seconds = seconds
+
+    @property
+    def hit_rate(self):
+        return (self.hits + PRIOR_HITS) / (self.searches + PRIOR_SEARCHES)
+
+    @property
+    def latency(self):
+        return (self.seconds + PRIOR_SECONDS) / (self.timed + 1)
+
+    @property
+    def cost(self):
+        '''
+        The expected time spent per book found. Asking searchers in
+        order of this, cheapest first, keeps the expected time of a
+        lookup lowest.
+        '''
+        return self.latency / self.hit_rate
+
+    def as_dict(self):
+        return {
+            'searches': self.searches,
+            'hit_rate': round(self.hit_rate, 4),
+            'latency': round(self.latency, 4),
+            'cost': round(self.cost, 4)}
+
+
+class AdaptiveSearchers(object):
+    '''
+    Stands in for the dictionary of searcher lists keyed by mode, giving
+    the searchers for a mode cheapest first each time it is indexed.
+
+    The estimates combine the searches recorded in the SearchStats with
+    those remembered in the history file from earlier runs. Now and then
+    (exploration being the chance) a searcher other than the cheapest is
+    put first, so that one that has got better is noticed. Each ordering
+    is appended to the log file, if given, as a line of JSON; changes to
+    the usual order are printed.
+    '''
+
+    def __init__(
+            self,
+            searchers,
+            stats=shared_stats,
+            history_file=None,
+            log_file=None,
+            exploration=EXPLORATION,
+            seed=None):
+        self._searchers = dict((mode, list(s)) for mode, s in searchers.items())
+        self.stats = stats
+        self.history_file = history_file
+        self.exploration = exploration
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._history = {}
+        self._orders = {}
+        self._log = None
+
+        if history_file is not None:
+            self._load_history()
+        if log_file is not None:
+            self._log = open(log_file, 'at')
+
+    def __getitem__(self, mode):
+        return self.order(mode)
+
+    def __contains__(self, mode):
+        return mode in self._searchers
+
+    def __iter__(self):
+        return iter(self._searchers)
+
+    def keys(self):
+        return self._searchers.keys()
+
+    def add(self, searcher, mode):
+        '''Add a searcher for the mode, ranked with the others.'''
+        self._searchers.setdefault(Modes(mode), []).append(searcher)
+
+    @staticmethod
+    def _key(searcher, mode):
+        return '{} {}'.format(searcher.name, Modes(mode).name)
+
+    def estimate(self, searcher, mode):
+        '''Return the Estimate of a searcher in a mode.'''
+        mode = Modes(mode)
+        searches, hits, timed, seconds = self.stats.totals(searcher.name, mode)
+        past = self._history.get(self._key(searcher, mode), {})
+        return Estimate(
+            searcher,
+            searches=searches + past.get('searches', 0),
+            hits=hits + past.get('hits', 0),
+            timed=timed + past.get('timed', 0),
+            seconds=seconds + past.get('seconds', 0.0))
+
+    def order(self, mode):
+        '''Return the searchers for the mode, in the order to ask them.'''
+        mode = Modes(mode)
+        # Sorting is stable, so searchers costing the same keep the
+        # order they were given in
+        ranked = sorted(
+            [self.estimate(s, mode) for s in self._searchers[mode]],
+            key=lambda e: e.cost)
+
+        with self._lock:
+            explored = None
+            if len(ranked) > 1 and self._random.random() < self.exploration:
+                explored = ranked.pop(self._random.randrange(1, len(ranked)))
+                ranked.insert(0, explored)
+            self._audit(mode, ranked, explored)
+
+        return [e.searcher for e in ranked]
+
+    def _audit(self, mode, ranked, explored):
+        '''Log an ordering, and print it if the usual order has changed.'''
+        names = [e.searcher.name for e in ranked]
+
+        if explored is None and self._orders.get(mode) != names:
+            self._orders[mode] = names
+            print('Searching by {} at {}'.format(
+                mode.name,
+                ', '.join(['{} ({:.2f}s per book found)'.format(
+                    e.searcher.name, e.cost) for e in ranked])))
+
+        if self._log is not None:
+            self._log.write(json.dumps({
+                'time': round(time.time(), 3),
+                'mode': mode.name,
+                'order': names,
+                'explored': None if explored is None else explored.searcher.name,
+                'estimates': dict((e.searcher.name, e.as_dict()) for e in ranked)},
+                sort_keys=True) + '\n')
+            self._log.flush()
+
+    def _load_history(self):
+        '''Read the searches remembered from earlier runs.'''
+        try:
+            with open(self.history_file, 'rt') as history_file:
+                history = json.load(history_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print('### Could not read the searcher history: {}'.format(e))
+            return
+
+        if history.get('version') != HISTORY_VERSION:
+            return
+
+        for key, past in history.get('searchers', {}).items():
+            searches = past.get('searches', 0)
+            scale = 1.0
+            if searches > HISTORY_LIMIT:
+                scale = HISTORY_LIMIT / searches
+            self._history[key] = dict(
+                (name, past.get(name, 0) * scale)
+                for name in ('searches', 'hits', 'timed', 'seconds'))
+
+    def save(self):
+        '''
+        Write the searches remembered from earlier runs, with those of
+        this run, to the history file.
+        '''
+        if self.history_file is None:
+            return
+
+        searchers = dict(self._history)
+        for mode, mode_searchers in self._searchers.items():
+            for searcher in mode_searchers:
+                e = self.estimate(searcher, mode)
+                searchers[self._key(searcher, mode)] = {
+                    'searches': e.searches,
+                    'hits': e.hits,
+                    'timed': e.timed,
+                    'seconds': e.seconds}
+
+        try:
+            write_atomically(self.history_file, json.dumps({
+                'version': HISTORY_VERSION,
+                'saved': time.time(),
+                'searchers': searchers}, indent=2, sort_keys=True) + '\n')
+        except OSError as e:
+            print('### Could not save the searcher history: {}'.format(e))
+
+    def close(self):
+        '''Save the history and close the log.'''
+        self.save()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Define a Library that keeps its books in an SQLite database."""
+
+from .book import Book, bkFields
+from .identifier import field_key
+from .library import Library, INDEXED_FIELDS
+from .searchStats import timed_operation
+from .textIndex import query_terms, tokenise, TEXT_FIELDS
+from array import array
+from collections import OrderedDict
+import bisect
+import pathlib
+import sqlite3
+import weakref
+
+# The names of the columns holding the book fields, in bkFields order.
+FIELD_COLUMNS = [f[0] for f in bkFields]
+
+# The positions of the book fields in a row of the id and field columns.
+ROW_POSITIONS = list(range(1, len(FIELD_COLUMNS) + 1))
+
+# The columns holding the normalised identifiers that are searched.
+KEY_COLUMNS = dict((f, f + '_key') for f in INDEXED_FIELDS)
+
+# The version of the identifier normalisation the key columns were
+# made with, kept in the database's user_version. They are remade when
+# it changes.
+KEY_VERSION = 1
+
+# The file name extensions taken to mean an SQLite library.
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+# The number of rows read at a time when going through every book
+PAGE_SIZE = 1000
+
+# The number of books last read that are kept in memory, so a list view
+# drawing the same rows over and over doesn't read them each time
+RECENT_BOOKS = 1000
+
+
+def is_sqlite_filename(filename):
+    return filename.lower().endswith(SQLITE_EXTENSIONS)
+
+
+class SqliteBookList(object):
+    """
+    The book_list of an SqliteLibrary: a sequence of its books in the
+    order they were added, holding only their row ids. The books are
+    read from the database as they are asked for.
+    """
+
+    def __init__(self, library):
+        self._library = library
+        # Sorted, as rows are always added with a larger id
+        self._rowids = array('q')
+
+    def __len__(self):
+        return len(self._rowids)
+
+    def __getitem__(self, index):
+        return self._library._book(self._rowids[index])
+
+    def __iter__(self):
+        """Go through the books a page of rows at a time."""
+        library = self._library
+        last = -1
+        while True:
+            rows = library._db.execute(
+                'SELECT id, {} FROM books WHERE id > ? ORDER BY id LIMIT ?'.format(
+                    ', '.join(FIELD_COLUMNS)),
+                (last, PAGE_SIZE)).fetchall()
+            if len(rows) == 0:
+                return
+            for row in rows:
+                yield library._book(row[0], row)
+            last = rows[-1][0]
+
+    def index(self, book):
+        rowid = self._library._rowids.get(book)
+        if rowid is not None:
+            position = bisect.bisect_left(self._rowids, rowid)
+            if position < len(self._rowids) and self._rowids[position] == rowid:
+                return position
+        raise ValueError('book is not in the library')
+
+    def _append(self, rowid):
+        self._rowids.append(rowid)
+
+    def _remove(self, rowid):
+        del self._rowids[bisect.bisect_left(self._rowids, rowid)]
+
+
+class SqliteLibrary(Library):
+    """
+    A Library stored in an SQLite database rather than a CSV file.
+
+    Every add, remove and edit is written to the database as it happens,
+    in transactions of up to batch_size changes that are committed by
+    sync or save_to_file. The identifier columns are indexed by their
+    normalised form, so isbn_exists is answered by the database.
+
+    Only the row ids are held in memory. A book is read from the
+    database when it is asked for, and kept while it is in use or among
+    the RECENT_BOOKS last read, so the same row always gives the same
+    Book.
+    """
+
+    def __init__(self, filename, delimiter='|', journal=False, batch_size=500,
+                 read_only=False):
+        """
+        Open (creating if need be) the database. The delimiter is used
+        when importing and exporting CSV files. SQLite keeps its own
+        journal, so journal is ignored. If read_only is True the database
+        is opened only for reading, and must already exist.
+        """
+
+        Library.__init__(
+            self, filename=filename, delimiter=delimiter, read_only=read_only)
+
+        self.batch_size = batch_size
+        self._pending = 0
+        self.book_list = SqliteBookList(self)
+
+        # Map between the books in memory and their database rows
+        self._rowids = weakref.WeakKeyDictionary()
+        self._books = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+
+        if read_only:
+            self._db = sqlite3.connect(
+                pathlib.Path(filename).absolute().as_uri() + '?mode=ro', uri=True)
+        else:
+            self._db = sqlite3.connect(filename)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS books (id INTEGER PRIMARY KEY, {}, {})'.format(
+                    ', '.join(['{} TEXT NOT NULL'.format(c) for c in FIELD_COLUMNS]),
+                    ', '.join(['{} TEXT'.format(KEY_COLUMNS[f]) for f in INDEXED_FIELDS])))
+            for f in INDEXED_FIELDS:
+                self._db.execute(
+                    'CREATE INDEX IF NOT EXISTS books_{0} ON books ({0})'.format(
+                        KEY_COLUMNS[f]))
+            self._db.commit()
+
+            if self._db.execute('PRAGMA user_version').fetchone()[0] < KEY_VERSION:
+                self._rekey()
+
+        self._insert_sql = 'INSERT INTO books ({}, {}) VALUES ({})'.format(
+            ', '.join(FIELD_COLUMNS),
+            ', '.join([KEY_COLUMNS[f] for f in INDEXED_FIELDS]),
+            ', '.join(['?'] * (len(FIELD_COLUMNS) + len(INDEXED_FIELDS))))
+
+    @property
+    def saves_incrementally(self):
+        return True
+
+    @staticmethod
+    def _row_values(book):
+        return (
+            [getattr(book, c) for c in FIELD_COLUMNS] +
+            [field_key(f, getattr(book, f)) for f in INDEXED_FIELDS])
+
+    def _rekey(self):
+        """Remake the key columns with the current normalisation."""
+        rows = self._db.execute('SELECT id, {} FROM books'.format(
+            ', '.join(INDEXED_FIELDS))).fetchall()
+        self._db.executemany(
+            'UPDATE books SET {} WHERE id = ?'.format(
+                ', '.join(['{} = ?'.format(KEY_COLUMNS[f]) for f in INDEXED_FIELDS])),
+            [[field_key(f, v) for f, v in zip(INDEXED_FIELDS, row[1:])] + [row[0]]
+             for row in rows])
+        self._db.execute('PRAGMA user_version = {}'.format(KEY_VERSION))
+        self._db.commit()
+
+    def _changed(self):
+        """Count a change, committing when the batch is full."""
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.sync()
+
+    # The database does the indexing, so only watch the books for edits
+
+    def _index_book(self, book):
+        book.add_observer(self)
+
+    def _unindex_book(self, book):
+        book.remove_observer(self)
+
+    def _track(self, book, rowid):
+        self._rowids[book] = rowid
+        self._books[rowid] = book
+        self._index_book(book)
+
+    def position_of(self, book):
+        """Return the position of the book in book_list, or None."""
+        try:
+            return self.book_list.index(book)
+        except ValueError:
+            return None
+
+    def _book(self, rowid, row=None):
+        """
+        Return the Book of a row, reading it from the database unless it
+        is in memory. The row, if given, holds the id and then the field
+        columns.
+        """
+        book = self._books.get(rowid)
+        if book is None:
+            if row is None:
+                row = self._db.execute(
+                    'SELECT id, {} FROM books WHERE id = ?'.format(
+                        ', '.join(FIELD_COLUMNS)),
+                    (rowid,)).fetchone()
+            book = Book.from_row(row, ROW_POSITIONS)
+            self._track(book, rowid)
+        self._recent[rowid] = book
+        self._recent.move_to_end(rowid)
+        if len(self._recent) > RECENT_BOOKS:
+            self._recent.popitem(last=False)
+        return book
+
+    @timed_operation('lookup')
+    def find_books(self, identifier, fields=INDEXED_FIELDS):
+        """
+        Return a list of the books that have the given identifier in any
+        of the given indexed fields.
+        """
+
+        found = []
+        for f in fields:
+            key = field_key(f, identifier)
+            if key is None:
+                continue
+            rows = self._db.execute(
+                'SELECT id, {} FROM books WHERE {} = ? ORDER BY id'.format(
+                    ', '.join(FIELD_COLUMNS), KEY_COLUMNS[f]),
+                (key,))
+            for row in rows:
+                book = self._book(row[0], row)
+                if book not in found:
+                    found.append(book)
+        return found
+
+    @timed_operation('find_text')
+    def find_text(self, text, limit=None):
+        """
+        Return the books with a word starting with each of the words in
+        text in their title, author or publisher, in library order. The
+        rows are read and checked in turn rather than kept in a TextIndex.
+        """
+        terms = query_terms(text)
+        if len(terms) == 0:
+            return []
+
+        found = []
+        rows = self._db.execute('SELECT id, {} FROM books ORDER BY id'.format(
+            ', '.join(TEXT_FIELDS)))
+        for row in rows:
+            tokens = set()
+            for value in row[1:]:
+                tokens |= tokenise(value)
+            if all(any(t.startswith(term) for t in tokens) for term in terms):
+                found.append(row[0])
+                if limit is not None and len(found) >= limit:
+                    break
+        return [self._book(rowid) for rowid in found]
+
+    def book_changed(self, book, field, old, new):
+        """Called by a book when one of its fields has changed."""
+        if self._text_index is not None:
+            self._text_index.changed(book, field, old, new)
+        rowid = self._rowids.get(book)
+        if rowid is None:
+            return
+        if field in KEY_COLUMNS:
+            self._db.execute(
+                'UPDATE books SET {} = ?, {} = ? WHERE id = ?'.format(
+                    field, KEY_COLUMNS[field]),
+                (new, field_key(field, new), rowid))
+        else:
+            self._db.execute(
+                'UPDATE books SET {} = ? WHERE id = ?'.format(field),
+                (new, rowid))
+        self._changed()
+
+    def _insert(self, book):
+        """Write a new book to the database and add it to the book_list."""
+        cursor = self._db.execute(self._insert_sql, self._row_values(book))
+        self._track(book, cursor.lastrowid)
+        self.book_list._append(cursor.lastrowid)
+
+    def add_book(self, book):
+        """Add a book to the list managed by this Library."""
+        self._insert(book)
+        if self._text_index is not None:
+            self._text_index.add(book)
+        self._changed()
+
+    def remove_book(self, book):
+        """Remove a book from the list managed by this Library."""
+        rowid = self._rowids.pop(book, None)
+        if rowid is None:
+            print("### Could not remove book.")
+            return
+        self._unindex_book(book)
+        if self._text_index is not None:
+            self._text_index.remove(book)
+        self._books.pop(rowid, None)
+        self._recent.pop(rowid, None)
+        self.book_list._remove(rowid)
+        self._db.execute('DELETE FROM books WHERE id = ?', (rowid,))
+        self._changed()
+
+    def sync(self):
+        """Commit the changes made so far."""
+        self._db.commit()
+        self._pending = 0
+
+    @timed_operation('load')
+    def read_from_file(self):
+        """
+        Read the row id of each book in the database; the books are read
+        as they are needed.
+        """
+
+        self.book_list._rowids = array('q', [
+            row[0] for row in self._db.execute('SELECT id FROM books ORDER BY id')])
+
+    @timed_operation('save')
+    def save_to_file(self):
+        """
+        Commit the changes to the database; they have already been written.
+        """
+        self.sync()
+        print("Saved", self.filename)
+
+    def close(self):
+        self.sync()
+        self._db.close()
+
+    def import_books(self, books):
+        """
+        Add the books in a single transaction, for bulk loading.
+        """
+        for book in books:
+            self._insert(book)
+            if self._text_index is not None:
+                self._text_index.add(book)
+        self.sync()
+
+    def import_csv(self, csv_filename, delimiter=None):
+        """
+        Add all the books in a CSV library file.
+        """
+        if delimiter is None:
+            delimiter = self.delimiter
+        # Include the changes in the journal, without folding it in
+        csv_library = Library(
+            csv_filename, delimiter=delimiter, journal=True, read_only=True)
+        csv_library.read_from_file()
+        self.import_books(csv_library.book_list)
+        return csv_library.book_count
+
+    def export_csv(self, csv_filename, delimiter=None):
+        """
+        Write all the books to a CSV library file.
+        """
+        if delimiter is None:
+            delimiter = self.delimiter
+        csv_library = Library(csv_filename, delimiter=delimiter)
+        # Written as they are read from the database
+        csv_library.book_list = self.book_list
+        csv_library.save_to_file()
+        return csv_library.book_count
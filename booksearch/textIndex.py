@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+An inverted index over the words of the titles, authors and publishers
+of a library's books, answering queries such as "austen pri" (books
+with a word starting "austen" and a word starting "pri") without
+looking at every book.
+"""
+
+import bisect
+import heapq
+import re
+
+from .book import UNKNOWN, normalise
+
+# The Book properties whose words are indexed
+TEXT_FIELDS = ('title', 'author', 'publisher')
+
+# Candidate sets smaller than this are checked book by book against the
+# remaining terms, rather than intersected with the terms' postings
+CHECK_LIMIT = 1000
+
+_WORDS = re.compile(r'\w+')
+
+# Sorts after every word with a given prefix
+_LAST_CHARACTER = chr(0x10ffff)
+
+
+def tokenise(value):
+    '''
+    Return the set of words in a field value, case folded and without
+    accents. An unknown value has no words.
+    '''
+    if not value or value == UNKNOWN:
+        return set()
+    return set(_WORDS.findall(normalise(value)))
+
+
+def query_terms(text):
+    '''Return the distinct words of a query, in the order given.'''
+    terms = []
+    if text:
+        for term in _WORDS.findall(normalise(text)):
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def book_tokens(book, field=None, value=None):
+    '''
+    Return the set of words in the book's text fields, taking the given
+    field to have the given value rather than its current one.
+    '''
+    tokens = set()
+    for f in TEXT_FIELDS:
+        tokens |= tokenise(value if f == field else getattr(book, f))
+    return tokens
+
+
+class TextIndex(object):
+    '''
+    Maps each word of the books' text fields to the set of books using
+    it, and keeps the words sorted so that those starting with a prefix
+    are found by bisection. Kept up to date with add, remove and
+    changed, which the Library calls as its books come, go and are
+    edited.
+    '''
+
+    def __init__(self, books=()):
+        self._postings = {}
+        # The order the books were added in, which results are given in
+        self._order = {}
+        self._added = 0
+        for book in books:
+            self._order[book] = self._added
+            self._added += 1
+            for token in book_tokens(book):
+                books_with = self._postings.get(token)
+                if books_with is None:
+                    self._postings[token] = set((book,))
+                else:
+                    books_with.add(book)
+        self._tokens = sorted(self._postings)
+
+    def __len__(self):
+        '''The number of distinct words indexed.'''
+        return len(self._tokens)
+
+    def _add_tokens(self, book, tokens):
+        for token in tokens:
+            books_with = self._postings.get(token)
+            if books_with is None:
+                self._postings[token] = set((book,))
+                bisect.insort(self._tokens, token)
+            else:
+                books_with.add(book)
+
+    def _remove_tokens(self, book, tokens):
+        for token in tokens:
+            books_with = self._postings.get(token)
+            if books_with is None:
+                continue
+            books_with.discard(book)
+            if len(books_with) == 0:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def add(self, book):
+        '''Index the words of a book added to the library.'''
+        self._order[book] = self._added
+        self._added += 1
+        self._add_tokens(book, book_tokens(book))
+
+    def remove(self, book):
+        '''Forget a book removed from the library.'''
+        self._remove_tokens(book, book_tokens(book))
+        self._order.pop(book, None)
+
+    def changed(self, book, field, old, new):
+        '''Reindex a book whose field has changed from old to new.'''
+        if field not in TEXT_FIELDS:
+            return
+        old_tokens = book_tokens(book, field, old)
+        new_tokens = book_tokens(book, field, new)
+        self._remove_tokens(book, old_tokens - new_tokens)
+        self._add_tokens(book, new_tokens - old_tokens)
+
+    def _prefixed(self, term):
+        '''Return the indexed words starting with term.'''
+        start = bisect.bisect_left(self._tokens, term)
+        end = bisect.bisect_left(self._tokens, term + _LAST_CHARACTER, start)
+        return self._tokens[start:end]
+
+    def _matching(self, tokens):
+        '''Return the set of books using any of the words.'''
+        if len(tokens) == 1:
+            return self._postings[tokens[0]]
+        books = set()
+        for token in tokens:
+            books.update(self._postings[token])
+        return books
+
+    def search(self, text, limit=None):
+        '''
+        Return the books with, for every word in text, a word in their
+        title, author or publisher starting with it, in the order they
+        were added. No more than limit are returned.
+        '''
+        terms = query_terms(text)
+        if len(terms) == 0:
+            return []
+
+        # Start from the term matching fewest books
+        expanded = []
+        for term in terms:
+            tokens = self._prefixed(term)
+            if len(tokens) == 0:
+                return []
+            size = sum(len(self._postings[t]) for t in tokens)
+            expanded.append((size, term, tokens))
+        expanded.sort()
+
+        found = self._matching(expanded[0][2])
+        for size, term, tokens in expanded[1:]:
+            if len(found) == 0:
+                break
+            if len(found) < CHECK_LIMIT:
+                found = [
+                    book for book in found
+                    if any(t.startswith(term) for t in book_tokens(book))]
+            else:
+                found = self._matching(tokens).intersection(found)
+
+        key = self._order.__getitem__
+        if limit is not None and limit < len(found):
+            return heapq.nsmallest(limit, found, key=key)
+        return sorted(found, key=key)
@@ -1,7 +1,15 @@
 
+import collections
+import queue
+
 from .library import Library
+from .sqliteLibrary import SqliteLibrary
 from .book import Book, UNKNOWN, bkFields
+from .exporter import export_books
+from .identifier import normalise_isbn, normalise_lccn, fill_isbns
 from .isbnSearch import Modes
+from .searchStats import shared_stats
+from .searchWorker import SearchWorker, FAILED
 
 TEXT_HELP = '''
 [h | help]     - show this help
@@ -10,10 +18,21 @@ TEXT_HELP = '''
 [i | isbn]     - ISBN search mode (default)
 [c | lccn]     - LCCN search mode
 [m | manual]   - Enter book manually
+[f | find] WORDS - find books by the words of their title, author or publisher
+[stats]        - show how the searchers and the library are doing
+[e | export] FILE - export the library as XML, JSON Lines or TSV, by the
+                 extension of the file name (.xml, .jsonl or .tsv)
 '''
 
+# The number of books the find command lists
+FIND_LIMIT = 20
+
 
 class TextLibrary(Library):
+
+    # The class providing the library storage
+    library_class = Library
+
     def __init__(
             self,
             filename,
@@ -21,18 +40,39 @@ class TextLibrary(Library):
             mode=Modes.ISBN,
             delimiter='|',
             fill=False,
-            noquestions=False):
+            noquestions=False,
+            search_pool=None,
+            journal=False,
+            scan_ahead=False,
+            scan_workers=4):
 
         self.searchers = searchers
+        self.search_pool = search_pool
         self.mode = mode
         self.fill = fill
         self.noquestions = noquestions
 
+        # In scan ahead mode each scan is looked up in the background and
+        # the next one asked for straight away. The lookups are kept in
+        # the order scanned, and the books needing questions answered are
+        # kept for a review once scanning is over.
+        self.scan_ahead = scan_ahead
+        self._scan_worker = None
+        if scan_ahead:
+            self._results = queue.Queue()
+            self._scan_worker = SearchWorker(
+                self._scan_ahead_lookup,
+                self._post_result,
+                max_workers=scan_workers)
+        self._scanned = collections.deque()
+        self._review = []
+
         # create library
-        Library.__init__(
+        self.library_class.__init__(
             self,
             filename=filename,
-            delimiter=delimiter)
+            delimiter=delimiter,
+            journal=journal)
 
         # fill the model from file
         self.read_from_file()
@@ -51,8 +91,30 @@ class TextLibrary(Library):
             if another == 'n':
                 break
 
+    def checked_value(self, value):
+        '''
+        Return the value to search for, or None if it can't be found. The
+        ISBN or LCCN is checked and normalised before any searcher is
+        asked about it.
+        '''
+        if self.mode == Modes.LCCN:
+            normalised = normalise_lccn(value)
+        else:
+            normalised = normalise_isbn(value)
+        if normalised is None:
+            print('### {} is not a valid {}.'.format(value, self.mode.name))
+        return normalised
+
     def find_book(self, value):
 
+        value = self.checked_value(value)
+        if value is None:
+            return
+
+        if self.search_pool is not None:
+            self.find_book_concurrently(value)
+            return
+
         # Create an empty book
         book = Book(isbn=value)
 
@@ -78,21 +140,203 @@ class TextLibrary(Library):
             else:
                 print('\tNot found')
 
+        self.finish_book(book)
+
+    def find_book_concurrently(self, value):
+        """
+        Query all the searchers for the mode at once using the search
+        pool, merging their answers in priority order.
+        """
+
+        searchers = self.searchers[self.mode]
+
+        print("Checking for the {} at {}... ".format(
+            self.mode.name,
+            ', '.join([s.name for s in searchers])))
+
+        book = self.search_pool.search(
+            searchers,
+            isbn=value,
+            mode=self.mode,
+            fill=self.fill)
+
+        if book.has_unknowns:
+            book.display_unknowns()
+
+        self.finish_book(book)
+
+    def finish_book(self, book):
+        """Ask for a missing title if allowed, then add the book."""
+
+        fill_isbns(book)
+
         if book.title == UNKNOWN and not self.noquestions:
             book.title = input('Enter Unknown title:')
 
         self.add_book(book)
         print(book)
 
-    def isbn_loop(self):
-        print(TEXT_HELP)
+        # Keep each scan safe without rewriting the library file
+        if self.saves_incrementally:
+            self.sync()
+
+    def _post_result(self, function, *args):
+        '''Pass a finished lookup back to the main thread.'''
+        self._results.put((function, args))
+
+    def _scan_ahead_lookup(self, value, mode):
+        '''
+        Look up a scanned value, in a search worker thread, returning the
+        book and the conflicts found filling it. Nothing is asked of the
+        user here; the conflicts are left for the review.
+        '''
+        book = Book(isbn=value)
+        conflicts = []
+
+        def recorder(searcher):
+            def resolver(field, new, old):
+                conflicts.append((searcher, field, new, old))
+                return old
+            return resolver
+
+        for searcher in self.searchers[mode]:
+            if self.fill:
+                found = searcher.search(isbn=value, mode=mode)
+                book.update_unknowns(
+                    resolver=recorder(searcher),
+                    **found.as_dict(known_only=True))
+                if not book.has_unknowns:
+                    break
+            else:
+                book = searcher.search(isbn=value, mode=mode, book=book)
+                if book.author != UNKNOWN:
+                    break
+
+        fill_isbns(book)
+        return book, conflicts
+
+    def scan_book(self, value):
+        '''
+        Queue a scanned value to be looked up in the background, and add
+        any books whose lookups have finished.
+        '''
+        value = self.checked_value(value)
+        if value is not None:
+            if any(lookup.isbn == value for lookup in self._scanned):
+                print('### {} is already being looked up.'.format(value))
+            else:
+                self._scanned.append(self._scan_worker.submit(
+                    value, self._scan_done, mode=self.mode))
+        self.add_scanned_books()
+
+    def _scan_done(self, lookup):
+        '''The lookups are taken in scan order by add_scanned_books.'''
+        pass
+
+    def add_scanned_books(self, wait=False):
+        '''
+        Add the books whose lookups have finished, in the order they were
+        scanned: a book is not added until those scanned before it are.
+        If wait is True, wait for all the lookups to finish.
+        '''
+        waiting = False
+        while True:
+            # Take in the lookups that have finished
+            while True:
+                try:
+                    function, args = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                function(*args)
+
+            while self._scanned and not self._scanned[0].pending:
+                self._add_scanned(self._scanned.popleft())
+
+            if not (wait and self._scanned):
+                break
+            if not waiting:
+                print('Waiting for {} lookups...'.format(len(self._scanned)))
+                waiting = True
+            function, args = self._results.get()
+            function(*args)
+
+    def _add_scanned(self, lookup):
+        if lookup.state == FAILED:
+            # Keep the scan, to be filled in later
+            book, conflicts = Book(isbn=lookup.isbn), []
+        else:
+            book, conflicts = lookup.result
+
+        self.add_book(book)
+        print(book)
+        if conflicts or (book.title == UNKNOWN and not self.noquestions):
+            self._review.append((book, conflicts))
+
+        # Keep each scan safe without rewriting the library file
+        if self.saves_incrementally:
+            self.sync()
+
+    def review_scanned_books(self):
+        '''
+        Wait for the lookups still running, then go through the scanned
+        books that need a choice between conflicting values or a title.
+        '''
+        self.add_scanned_books(wait=True)
+        if self._review:
+            print('{} scanned books to review'.format(len(self._review)))
+
+        for book, conflicts in self._review:
+            print(book)
+            for searcher, field, new, old in conflicts:
+                if searcher._resolver is not None:
+                    setattr(book, field, searcher._resolver(field, new, old))
+            if book.title == UNKNOWN and not self.noquestions:
+                book.title = input('Enter Unknown title for {}:'.format(book.isbn))
+        self._review = []
+
+        if self.saves_incrementally:
+            self.sync()
+
+    def _prompt(self):
+        '''Return the next command, or 'q' at the end of the input.'''
+        if self._scanned:
+            prompt = 'Enter {} ({} looking up):'.format(
+                self.mode.name, len(self._scanned))
+        else:
+            prompt = 'Enter {}:'.format(self.mode.name)
         try:
-            command = input("Enter {}:".format(self.mode.name))
+            return input(prompt)
         except EOFError:
             # When using redirected input, don't bomb out on EOF
-            command = 'q'
+            return 'q'
+
+    def find_text_books(self, text):
+        '''List the books whose title, author or publisher match the words.'''
+        found = self.find_text(text)
+        for book in found[:FIND_LIMIT]:
+            print('{} | {} | {} | {}'.format(
+                book.isbn, book.title, book.author, book.publisher))
+        if len(found) > FIND_LIMIT:
+            print('... and {} more'.format(len(found) - FIND_LIMIT))
+        print('Found {} books'.format(len(found)))
+
+    def export_to_file(self, filename):
+        '''Export the library to the file, in the format its name implies.'''
+        try:
+            count = export_books(self.book_list, filename)
+        except (ValueError, OSError) as e:
+            print('### Could not export the library: {}'.format(e))
+            return
+        print('Exported {} books to {}'.format(count, filename))
+
+    def isbn_loop(self):
+        print(TEXT_HELP)
+        command = self._prompt()
 
         while (command != '0') and (command != 'q') and (command != 'quit'):
+            if self.scan_ahead:
+                self.add_scanned_books()
+
             if command == "save" or command == 's':
                 self.save_to_file()
             elif command == 'help' or command == 'h':
@@ -106,23 +350,36 @@ class TextLibrary(Library):
             elif command == 'manual' or command == 'm':
                 print('Entering books manually')
                 self.manual_entry_loop()
+            elif command.startswith('find ') or command.startswith('f '):
+                self.find_text_books(command.split(' ', 1)[1])
+            elif command == 'stats':
+                print(shared_stats)
+            elif command.startswith('export ') or command.startswith('e '):
+                self.export_to_file(command.split(' ', 1)[1].strip())
             else:
+                find = self.scan_book if self.scan_ahead else self.find_book
                 # TODO:
                 if self.noquestions:
-                    self.find_book(value=command)
+                    find(command)
                 else:
                     exists, book = self.isbn_exists(command)
                     if exists:
                         print(book)
                         add_again = input("### Book exists, do you want to search again?")
                         if add_again == "y":
-                            self.find_book(value=command)
+                            find(command)
                     else:
-                        self.find_book(value=command)
+                        find(command)
 
             # Ask for the next input
-            try:
-                command = input("Enter {}:".format(self.mode.name))
-            except EOFError:
-                # When using redirected input, don't bomb out on EOF
-                command = 'q'
+            command = self._prompt()
+
+        if self.scan_ahead:
+            self.review_scanned_books()
+            self._scan_worker.shutdown()
+
+
+class SqliteTextLibrary(TextLibrary, SqliteLibrary):
+    """A TextLibrary that keeps its books in an SQLite database."""
+
+    library_class = SqliteLibrary
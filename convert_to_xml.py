@@ -1,21 +1,51 @@
-#!/usr/bin/env python
-import csv
+#!/usr/bin/env /usr/bin/python3
 
-input_file = open("auto_library.csv", "rb")
-output_file = open("library.xml", "wb")
+import sys
+import argparse
 
-csv_reader = csv.DictReader(input_file)
+from booksearch.exporter import export_books, FORMATS
+from booksearch.library import Library
 
-output_file.write("""<?xml version="1.0" encoding="UTF-8"?>\n""")
-output_file.write("<library>\n")
 
-for line in csv_reader:
-    output_file.write("<book><isbn>" +
-                      line["ISBN"].decode("iso-8859-1").encode("utf-8") +
-                      "</isbn><title>" +
-                      line["Title"].decode("iso-8859-1").encode("utf-8") +
-                      "</title><author>" +
-                      line["Author"].decode("iso-8859-1").encode("utf-8") +
-                      "</author></book>\n")
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export a CSV library file as XML, JSON Lines or TSV')
 
-output_file.write("</library>\n")
+    parser.add_argument(
+        dest="libfile",
+        nargs='?',
+        default='auto_library.csv',
+        help="CSV library file (default: %(default)s)",
+        metavar="libfile")
+
+    parser.add_argument(
+        dest="outfile",
+        nargs='?',
+        default='library.xml',
+        help="file to export to, in the format its extension (.xml, .jsonl or .tsv) implies (default: %(default)s)",
+        metavar="outfile")
+
+    parser.add_argument(
+        "-f", "--format",
+        dest="export_format",
+        choices=sorted(FORMATS),
+        default=None,
+        help="the export format, whatever the extension of outfile")
+
+    # process options
+    args = parser.parse_args()
+
+    # Include the changes in the journal, without folding it in
+    library = Library(args.libfile, journal=True, read_only=True)
+    library.read_from_file()
+
+    try:
+        count = export_books(library.book_list, args.outfile, args.export_format)
+    except (ValueError, OSError) as e:
+        sys.exit('### Could not export the library: {}'.format(e))
+
+    print('Exported {} books to {}'.format(count, args.outfile))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env /usr/bin/python3
+
+import sys
+import argparse
+import csv
+import time
+
+from booksearch.book import bkFields, FUZZ_FACTOR
+from booksearch.duplicates import DuplicateFinder
+from booksearch.library import Library
+from booksearch.sqliteLibrary import SqliteLibrary, is_sqlite_filename
+
+
+def write_clusters(filename, clusters, delimiter):
+    '''
+    Write the clusters to a CSV file, one row per book, numbering the
+    cluster each book is in.
+    '''
+    with open(filename, "wt") as cluster_file:
+        writer = csv.writer(
+            cluster_file,
+            lineterminator='\n',
+            delimiter=delimiter)
+        writer.writerow(['Cluster'] + [f[1] for f in bkFields])
+        for number, cluster in enumerate(clusters, 1):
+            for book in cluster:
+                writer.writerow(
+                    [number] + [getattr(book, f[0]) for f in bkFields])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Books are duplicates if they share an ISBN (an ISBN-10 matches its
+ISBN-13), have the same title and author once case, punctuation and a
+leading article are ignored, or have titles (and authors, when both
+are known) at least as similar as the threshold. Only books whose
+titles are likely to be similar are compared.''',
+        description='Find the clusters of duplicate books in a library')
+
+    parser.add_argument(
+        dest="libfile",
+        help="library file, CSV or SQLite",
+        metavar="libfile")
+
+    parser.add_argument(
+        "-o", "--output",
+        dest="outfile",
+        default=None,
+        help="write the clusters to this CSV file rather than printing them",
+        metavar="FILE")
+
+    parser.add_argument(
+        "-d", "--delimit",
+        dest="delimiter",
+        default="|",
+        help="set the CSV delimiter (default: %(default)s)")
+
+    parser.add_argument(
+        "-t", "--threshold",
+        dest="threshold",
+        type=int,
+        default=FUZZ_FACTOR,
+        help="similarity (0 to 100) at which titles match (default: %(default)s)")
+
+    parser.add_argument(
+        "-w", "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)")
+
+    # process options
+    args = parser.parse_args()
+
+    if is_sqlite_filename(args.libfile):
+        library = SqliteLibrary(args.libfile, delimiter=args.delimiter)
+    else:
+        library = Library(args.libfile, delimiter=args.delimiter)
+    library.read_from_file()
+
+    started = time.time()
+    finder = DuplicateFinder(threshold=args.threshold, workers=args.workers)
+    clusters = finder.find(list(library.book_list))
+    elapsed = time.time() - started
+
+    if args.outfile is not None:
+        write_clusters(args.outfile, clusters, args.delimiter)
+    else:
+        for number, cluster in enumerate(clusters, 1):
+            print('Cluster {}:'.format(number))
+            for book in cluster:
+                print('\t{} | {} | {}'.format(book.isbn, book.title, book.author))
+
+    print('{} books, {} distinct titles, {} pairs compared, {} matched'.format(
+        library.book_count, finder.records, finder.candidates, finder.matches))
+    if finder.oversized:
+        print('### {} groups of more than {} similar titles were too large to compare'.format(
+            finder.oversized, finder.max_bucket))
+    print('Found {} clusters of {} books in {:.1f}s'.format(
+        len(clusters), sum(len(c) for c in clusters), elapsed))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,8 +3,24 @@
 import sys
 import argparse
 import csv
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
 
 from booksearch.book import Book, UNKNOWN, bkFields, FUZZ_FACTOR
+from booksearch.identifier import index_key
+from booksearch.requery import ConflictCollector
+
+# The number of books sorted in memory before being spilled to a run
+DEFAULT_RUN_SIZE = 100000
+
+# The maximum number of runs merged at once
+DEFAULT_FAN_IN = 64
+
+# The number of conflicts held before they are written out
+CONFLICT_FLUSH = 1000
 
 
 def resolver(field, first, second):
@@ -19,7 +35,10 @@ def resolver(field, first, second):
     return choice
 
 
-def read_library(filename, books, books_no_id):
+def read_library(filename):
+    '''
+    Generate the books in a library file, one at a time.
+    '''
     try:
         with open(filename, "rt") as library_file:
 
@@ -30,56 +49,208 @@ def read_library(filename, books, books_no_id):
                 sys.exit('{}'.format(e))
 
             print('Detected delimiter:', dialect.delimiter)
+            # The sniffer can only see doubled quotes in the sample it is given,
+            # but the library is always written with them.
+            dialect.doublequote = True
 
             # Go back to start of file
             library_file.seek(0)
 
+            book_reader = csv.reader(library_file, dialect=dialect)
+
             # The first line of the file is to be used for key names
-            book_reader = csv.DictReader(library_file, dialect=dialect)
-
-            for book in book_reader:
-                isbn = book['ISBN']
-                new_book = Book(**book)
-                if isbn in ['', 'NA', UNKNOWN]:
-                    books_no_id.append(new_book)
-                else:
-                    if isbn in books:
-                        print('\nDuplicate book found')
-                        # print(books[isbn])
-                        # print(new_book)
-                        books[isbn].update_unknowns(resolver=resolver, **book)
-                        print(books[isbn])
-                    else:
-                        books[isbn] = new_book
+            try:
+                header = next(book_reader)
+            except StopIteration:
+                return
+            positions = Book.header_positions(header)
+
+            for row in book_reader:
+                # Skip blank lines, as csv.DictReader does
+                if not row:
+                    continue
+                yield Book.from_row(row, positions)
 
     except IOError:
         print("### No library file {}.".format(filename))
 
 
-def write_library(filename, books, books_no_id):
+def book_key(book):
+    '''
+    Return the normalised ISBN the book is merged on, or None if the book
+    has no ISBN.
+    '''
+    if book.isbn in ['', 'NA', UNKNOWN]:
+        return None
+    return index_key(book.isbn)
+
+
+def write_run(rows, directory):
+    '''
+    Sort the rows (key first, then the book fields) and write them to a
+    new run file in the directory. Returns the file name.
+    '''
+    # Stable, so books with the same key stay in the order they were read
+    rows.sort(key=lambda row: row[0])
+    handle, filename = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(handle, 'wt', newline='') as run_file:
+        csv.writer(run_file, delimiter='|').writerows(rows)
+    return filename
+
+
+def read_run(filename):
+    '''Generate the rows of a run file.'''
+    with open(filename, 'rt', newline='') as run_file:
+        for row in csv.reader(run_file, delimiter='|'):
+            yield row
+
+
+def merge_runs(filenames):
+    '''
+    Generate the rows of the sorted runs in key order. Rows with the same
+    key come in the order of the runs they are in.
+    '''
+    return heapq.merge(
+        *[read_run(filename) for filename in filenames],
+        key=lambda row: row[0])
+
+
+def reduce_runs(filenames, directory, fan_in):
+    '''
+    Merge the runs fan_in at a time until no more than fan_in are left,
+    so that the final merge need not open too many files at once.
+    '''
+    while len(filenames) > fan_in:
+        merged = []
+        for start in range(0, len(filenames), fan_in):
+            group = filenames[start:start + fan_in]
+            handle, filename = tempfile.mkstemp(suffix='.run', dir=directory)
+            with os.fdopen(handle, 'wt', newline='') as run_file:
+                csv.writer(run_file, delimiter='|').writerows(merge_runs(group))
+            for old in group:
+                os.remove(old)
+            merged.append(filename)
+        filenames = merged
+    return filenames
+
+
+def spill_libraries(filenames, directory, run_size):
     '''
-    Open the CSV file associated with this library, and write an entry
-    for each book.
+    Read the libraries, spilling the books with an ISBN to sorted runs of
+    up to run_size books, and the books without one to a file of their
+    own. Returns the run file names, the file of books without an ISBN,
+    and the number of books read.
     '''
+    runs = []
+    rows = []
+    count = 0
+
+    handle, no_id_filename = tempfile.mkstemp(suffix='.noid', dir=directory)
+    with os.fdopen(handle, 'wt', newline='') as no_id_file:
+        no_id_writer = csv.writer(no_id_file, delimiter='|')
+
+        for filename in filenames:
+            for book in read_library(filename):
+                count += 1
+                fields = [getattr(book, f[0]) for f in bkFields]
+                key = book_key(book)
+                if key is None:
+                    no_id_writer.writerow(fields)
+                    continue
+                rows.append([key] + fields)
+                if len(rows) >= run_size:
+                    runs.append(write_run(rows, directory))
+                    rows = []
+
+    if len(rows) > 0:
+        runs.append(write_run(rows, directory))
+
+    return runs, no_id_filename, count
+
+
+def merge_libraries(
+        outfile,
+        filenames,
+        conflict_file=None,
+        interactive=False,
+        run_size=DEFAULT_RUN_SIZE,
+        fan_in=DEFAULT_FAN_IN,
+        temp_dir=None):
+    '''
+    Merge any number of library files into outfile, using a bounded
+    amount of memory however large they are.
+
+    The books are spilled to sorted runs keyed on their normalised ISBN,
+    which are merged. Books sharing an ISBN are merged into the first one
+    read with Book.update_unknowns. Conflicting values are written to
+    conflict_file (or asked about, if interactive). Books without an ISBN
+    are written after the rest.
+    '''
+    directory = tempfile.mkdtemp(prefix='merge_libraries.', dir=temp_dir)
+    conflicts = ConflictCollector()
+    if conflict_file is not None and os.path.exists(conflict_file):
+        os.remove(conflict_file)
+
+    written = 0
+    duplicates = 0
+    try:
+        runs, no_id_filename, count = spill_libraries(
+            filenames, directory, run_size)
+        print('Read {} books into {} sorted runs'.format(count, len(runs)))
+        runs = reduce_runs(runs, directory, fan_in)
 
-    with open(filename, "wt") as library_file:
-        book_writer = csv.writer(
-            library_file,
-            lineterminator='\n',
-            delimiter='|')
+        with open(outfile, "wt") as library_file:
+            book_writer = csv.writer(
+                library_file,
+                lineterminator='\n',
+                delimiter='|')
 
-        # Write the heading row
-        book_writer.writerow([f[1] for f in bkFields])
+            # Write the heading row
+            book_writer.writerow([f[1] for f in bkFields])
 
-        # Write the book data
-        for book in books:
-            book_writer.writerow(
-                [getattr(books[book], f[0]) for f in bkFields])
-        for book in books_no_id:
-            book_writer.writerow(
-                [getattr(book, f[0]) for f in bkFields])
+            positions = list(range(len(bkFields)))
+            for key, group in itertools.groupby(
+                    merge_runs(runs), key=lambda row: row[0]):
+                book = None
+                for row in group:
+                    if book is None:
+                        book = Book.from_row(row[1:], positions)
+                        continue
+                    duplicates += 1
+                    other = Book.from_row(row[1:], positions)
+                    book_data = other.as_dict(known_only=True)
+                    # Matched on the ISBN, which may be in either form
+                    book_data.pop('isbn', None)
+                    if interactive:
+                        print('\nDuplicate book found')
+                        book.update_unknowns(resolver=resolver, **book_data)
+                        print(book)
+                    else:
+                        book.update_unknowns(
+                            resolver=conflicts.resolver_for(book, book_data),
+                            **book_data)
+
+                book_writer.writerow([getattr(book, f[0]) for f in bkFields])
+                written += 1
+
+                if conflict_file is not None and len(conflicts.conflicts) >= CONFLICT_FLUSH:
+                    conflicts.write(conflict_file)
+
+            # Then the books without an ISBN, as they were read
+            for row in read_run(no_id_filename):
+                book_writer.writerow(row)
+                written += 1
+
+        if conflict_file is not None:
+            conflicts.write(conflict_file)
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
 
-    print("Saved", filename)
+    print("Saved {} books to {}, {} duplicates merged".format(
+        written, outfile, duplicates))
+    if conflict_file is not None and os.path.exists(conflict_file):
+        print("Conflicting values written to {}".format(conflict_file))
 
 
 def main():
@@ -90,9 +261,12 @@ def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog='''
-Concatenates two library files add_argument removes duplicates after
-merging identical books to remove Unknown values.''',
-        description='Merge two libraries')
+Concatenates library files and removes duplicates after merging
+identical books to remove Unknown values. Books are matched on their
+ISBN, with ISBN-10s matching the equivalent ISBN-13. Conflicting values
+are written to a conflicts file for review, unless --interactive is
+given. Any number of libraries, larger than memory, can be merged.''',
+        description='Merge libraries')
 
     parser.add_argument(
         dest="outfile",
@@ -101,26 +275,53 @@ merging identical books to remove Unknown values.''',
         metavar="outputfile")
 
     parser.add_argument(
-        dest="libfile1",
+        dest="libfiles",
+        nargs='+',
+        help="library files to merge",
+        metavar="inputfile")
+
+    parser.add_argument(
+        "-c", "--conflicts",
+        dest="conflict_file",
         default=None,
-        help="first library file (default: %(default)s)",
-        metavar="inputfile1")
+        help="file for conflicting values (default: outputfile.conflicts)",
+        metavar="FILE")
+
+    parser.add_argument(
+        "-i", "--interactive",
+        dest="interactive",
+        action="store_true",
+        default=False,
+        help="ask which of two conflicting values to keep (default: %(default)s)")
+
+    parser.add_argument(
+        "--run-size",
+        dest="run_size",
+        type=int,
+        default=DEFAULT_RUN_SIZE,
+        help="books sorted in memory at a time (default: %(default)s)")
 
     parser.add_argument(
-        dest="libfile2",
+        "--temp-dir",
+        dest="temp_dir",
         default=None,
-        help="second library file (default: %(default)s)",
-        metavar="inputfile2")
+        help="directory for the sorted runs (default: the system's)",
+        metavar="DIR")
 
     # process options
     args = parser.parse_args()
 
-    books_no_id = []
-    books = {}
+    conflict_file = args.conflict_file
+    if conflict_file is None and not args.interactive:
+        conflict_file = args.outfile + '.conflicts'
 
-    read_library(args.libfile1, books, books_no_id)
-    read_library(args.libfile2, books, books_no_id)
-    write_library(args.outfile, books, books_no_id)
+    merge_libraries(
+        args.outfile,
+        args.libfiles,
+        conflict_file=conflict_file,
+        interactive=args.interactive,
+        run_size=args.run_size,
+        temp_dir=args.temp_dir)
 
 if __name__ == '__main__':
     main()
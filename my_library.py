@@ -3,17 +3,27 @@
 import sys
 import os
 import argparse
+import sqlite3
 
 try:
     from gi.repository import Gtk
-    from booksearch.gtkLibrary import GTKLibrary
+    from booksearch.gtkLibrary import GTKLibrary, SqliteGTKLibrary
     USE_GTK = True
 except ImportError:
     print("### No GTK - reverting to text mode")
     USE_GTK = False
 
-from booksearch.isbnSearch import Modes, ISBNSearchOrg, OpenLibraryOrg
-from booksearch.textLibrary import TextLibrary
+from booksearch.exporter import export_books, FORMATS
+from booksearch.isbnSearch import Modes, ISBNSearchOrg, OpenLibraryOrg, SearchPool
+from booksearch.library import Library
+from booksearch.rateLimiter import RateLimiter
+from booksearch.requery import Requery
+from booksearch.scheduler import RequestScheduler
+from booksearch.searchCache import SearchCache
+from booksearch.searcherRanking import AdaptiveSearchers, EXPLORATION
+from booksearch.searchStats import shared_stats
+from booksearch.sqliteLibrary import SqliteLibrary, is_sqlite_filename
+from booksearch.textLibrary import TextLibrary, SqliteTextLibrary
 
 # ==========================
 
@@ -34,6 +44,20 @@ def text_resolver(field, first, second):
         return second
 
 
+def write_stats(args, scheduler, cache):
+    '''Write the search statistics to the files asked for, if any.'''
+    try:
+        if args.stats_json:
+            extra = {'scheduler': scheduler.stats()}
+            if cache is not None:
+                extra['cache'] = cache.stats()
+            shared_stats.write_json(args.stats_json, **extra)
+        if args.prometheus:
+            shared_stats.write_prometheus(args.prometheus)
+    except OSError as e:
+        print('### Could not write the statistics: {}'.format(e))
+
+
 def main(argv=None):
     '''Command line options.'''
 
@@ -62,7 +86,7 @@ http://www.apache.org/licenses/LICENSE-2.0""".format(
             "-l", "--library",
             dest="libfile",
             default='auto_library.csv',
-            help="set library file path (default: %(default)s)",
+            help="set library file path, a .sqlite, .sqlite3 or .db file is an SQLite library (default: %(default)s)",
             metavar="FILE")
         parser.add_argument(
             "-t", "--text",
@@ -93,6 +117,132 @@ http://www.apache.org/licenses/LICENSE-2.0""".format(
             dest="noquestions",
             default=False,
             help="just do it (default: %(default)s)")
+        parser.add_argument(
+            "-c", "--concurrent",
+            action="store_true",
+            dest="concurrent",
+            default=False,
+            help="query all searchers at once rather than one after another (default: %(default)s)")
+        parser.add_argument(
+            "-w", "--workers",
+            dest="workers",
+            type=int,
+            default=4,
+            help="number of concurrent search threads (default: %(default)s)")
+        parser.add_argument(
+            "--cache",
+            dest="cachefile",
+            default='search_cache.sqlite',
+            help="set search cache file path (default: %(default)s)",
+            metavar="FILE")
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            dest="nocache",
+            default=False,
+            help="always query the web sites (default: %(default)s)")
+        parser.add_argument(
+            "--no-journal",
+            action="store_true",
+            dest="nojournal",
+            default=False,
+            help="don't journal changes to the library file as they are made (default: %(default)s)")
+        parser.add_argument(
+            "--rate",
+            dest="rate",
+            type=float,
+            default=1.0,
+            help="maximum requests per second to each web site, 0 for no limit; sites on this machine aren't limited (default: %(default)s)")
+        parser.add_argument(
+            "--burst",
+            dest="burst",
+            type=int,
+            default=5,
+            help="number of requests to a web site allowed at once before the rate applies (default: %(default)s)")
+        parser.add_argument(
+            "--retries",
+            dest="retries",
+            type=int,
+            default=3,
+            help="times to retry a request that failed with 429, a 5xx status or a connection error (default: %(default)s)")
+        parser.add_argument(
+            "--deadline",
+            dest="deadline",
+            type=float,
+            default=60.0,
+            help="seconds allowed for a request, including retries (default: %(default)s)")
+        parser.add_argument(
+            "--breaker-failures",
+            dest="breaker_failures",
+            type=int,
+            default=5,
+            help="failed requests in a row after which a web site is skipped (default: %(default)s)")
+        parser.add_argument(
+            "--breaker-reset",
+            dest="breaker_reset",
+            type=float,
+            default=60.0,
+            help="seconds to skip a failing web site before trying it again (default: %(default)s)")
+        parser.add_argument(
+            "--scan-ahead",
+            action="store_true",
+            dest="scan_ahead",
+            default=False,
+            help="in text mode, look books up in the background and ask for the next scan at once, leaving questions for a review at the end (default: %(default)s)")
+        parser.add_argument(
+            "--virtual",
+            action="store_true",
+            dest="virtual",
+            default=False,
+            help="draw the GTK list from the library as it is shown, for very large libraries; it can't be sorted (default: %(default)s)")
+        parser.add_argument(
+            "--adaptive",
+            action="store_true",
+            dest="adaptive",
+            default=False,
+            help="ask the searchers in order of their expected time per book found, rather than a fixed order; not used with --fill or --requery (default: %(default)s)")
+        parser.add_argument(
+            "--searcher-history",
+            dest="searcher_history",
+            metavar="FILE",
+            default='searcher_history.json',
+            help="file remembering the searchers' hit rates and latencies between runs, for --adaptive (default: %(default)s)")
+        parser.add_argument(
+            "--order-log",
+            dest="order_log",
+            metavar="FILE",
+            default=None,
+            help="append each searcher ordering chosen by --adaptive to a JSON lines file")
+        parser.add_argument(
+            "--explore",
+            dest="explore",
+            type=float,
+            default=EXPLORATION,
+            help="chance of --adaptive trying a searcher other than the best first (default: %(default)s)")
+        parser.add_argument(
+            "--export",
+            dest="export",
+            metavar="FILE",
+            default=None,
+            help="export the library to FILE and exit, as XML, JSON Lines or TSV by its extension (.xml, .jsonl or .tsv)")
+        parser.add_argument(
+            "--export-format",
+            dest="export_format",
+            choices=sorted(FORMATS),
+            default=None,
+            help="the format for --export, whatever the file's extension")
+        parser.add_argument(
+            "--stats-json",
+            dest="stats_json",
+            metavar="FILE",
+            default=None,
+            help="write the searcher, library, scheduler and cache statistics to a JSON file at exit")
+        parser.add_argument(
+            "--prometheus",
+            dest="prometheus",
+            metavar="FILE",
+            default=None,
+            help="write the searcher and library statistics to a Prometheus text file at exit, for a node exporter's textfile collector")
 
         # process options
         args = parser.parse_args()
@@ -110,6 +260,8 @@ http://www.apache.org/licenses/LICENSE-2.0""".format(
         print("Fill mode:", args.fill)
         print("Re-query:", args.requery)
         print("No-questions:", args.noquestions)
+        print("Concurrent:", args.concurrent)
+        print("Cache:", 'None' if args.nocache else args.cachefile)
 
     except Exception as e:
         indent = len(program_name) * " "
@@ -117,37 +269,150 @@ http://www.apache.org/licenses/LICENSE-2.0""".format(
         sys.stderr.write(indent + "  for help use --help\n")
         return 2
 
+    # Exporting needs no searchers
+    if args.export:
+        if is_sqlite_filename(args.libfile):
+            library_class = SqliteLibrary
+        else:
+            library_class = Library
+        # Only read, so the journal is replayed but left as it is
+        try:
+            library = library_class(
+                filename=args.libfile,
+                delimiter=args.delimiter,
+                journal=not args.nojournal,
+                read_only=True)
+        except sqlite3.Error as e:
+            print('### Could not open the library: {}'.format(e))
+            return 1
+        library.read_from_file()
+        try:
+            count = export_books(
+                library.book_list, args.export, args.export_format)
+        except (ValueError, OSError) as e:
+            print('### Could not export the library: {}'.format(e))
+            return 1
+        print('Exported {} books to {}'.format(count, args.export))
+        return 0
+
     # Create some searcher objects
     isbnSearchOrg = ISBNSearchOrg()
     openLibraryOrg = OpenLibraryOrg()
 
+    # Schedule their requests
+    scheduler = RequestScheduler(
+        rate_limiter=RateLimiter(rate=args.rate, burst=args.burst),
+        max_retries=args.retries,
+        deadline=args.deadline,
+        failure_threshold=args.breaker_failures,
+        reset_timeout=args.breaker_reset)
+    isbnSearchOrg.set_scheduler(scheduler)
+    openLibraryOrg.set_scheduler(scheduler)
+
+    # Cache their answers between runs
+    cache = None
+    if not args.nocache:
+        cache = SearchCache(args.cachefile)
+        isbnSearchOrg.set_cache(cache)
+        openLibraryOrg.set_cache(cache)
+
     # Put them in lists for ordered processing
     searchers = {
         Modes.ISBN: [isbnSearchOrg, openLibraryOrg],
         Modes.LCCN: [openLibraryOrg]
     }
 
+    # The fill and requery modes ask every searcher, and their order
+    # decides which answers are kept, so it stays fixed for them
+    adaptive = None
+    if args.adaptive and not (args.fill or args.requery):
+        adaptive = AdaptiveSearchers(
+            searchers,
+            history_file=args.searcher_history,
+            log_file=args.order_log,
+            exploration=args.explore)
+
+    # Choose the library storage from the file name
+    use_sqlite = is_sqlite_filename(args.libfile)
+
+    if args.requery:
+        if use_sqlite:
+            library_class = SqliteLibrary
+        else:
+            library_class = Library
+        library = library_class(
+            filename=args.libfile,
+            delimiter=args.delimiter,
+            journal=not args.nojournal)
+        library.read_from_file()
+        requery = Requery(
+            library,
+            searchers,
+            max_workers=args.workers)
+        requery.run()
+        print(scheduler)
+        print(shared_stats)
+        write_stats(args, scheduler, cache)
+        if cache is not None:
+            print(cache)
+            cache.close()
+        return 0
+
+    search_pool = None
+    if args.concurrent:
+        search_pool = SearchPool(max_workers=args.workers)
+
     if USE_GTK:
-        library = GTKLibrary(
+        if use_sqlite:
+            library_class = SqliteGTKLibrary
+        else:
+            library_class = GTKLibrary
+        library = library_class(
             filename=args.libfile,
-            searchers=searchers,
-            delimiter=args.delimiter)
+            searchers=adaptive or searchers,
+            delimiter=args.delimiter,
+            search_pool=search_pool,
+            journal=not args.nojournal,
+            search_workers=args.workers,
+            virtual=args.virtual)
         Gtk.main()
     else:
         if not args.noquestions:
             isbnSearchOrg.set_resolver(text_resolver)
             openLibraryOrg.set_resolver(text_resolver)
 
-        library = TextLibrary(
+        if use_sqlite:
+            library_class = SqliteTextLibrary
+        else:
+            library_class = TextLibrary
+        library = library_class(
             filename=args.libfile,
-            searchers=searchers,
+            searchers=adaptive or searchers,
             delimiter=args.delimiter,
             fill=args.fill,
-            noquestions=args.noquestions)
+            noquestions=args.noquestions,
+            search_pool=search_pool,
+            journal=not args.nojournal,
+            scan_ahead=args.scan_ahead,
+            scan_workers=args.workers)
         library.isbn_loop()
 
         # Save before exiting
         library.save_to_file()
 
+    if search_pool is not None:
+        search_pool.shutdown(wait=False)
+
+    if adaptive is not None:
+        adaptive.close()
+
+    print(scheduler)
+    print(shared_stats)
+    write_stats(args, scheduler, cache)
+
+    if cache is not None:
+        print(cache)
+        cache.close()
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env /usr/bin/python3
+
+import sys
+import argparse
+
+from booksearch.sqliteLibrary import SqliteLibrary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+import: adds the books in a CSV library file to an SQLite library,
+creating it if need be.
+export: writes the books in an SQLite library to a CSV library file.''',
+        description='Move libraries between CSV files and SQLite databases')
+
+    parser.add_argument(
+        dest="command",
+        choices=['import', 'export'],
+        help="import a CSV file into, or export a CSV file from, the database")
+
+    parser.add_argument(
+        dest="dbfile",
+        default=None,
+        help="SQLite library file (default: %(default)s)",
+        metavar="dbfile")
+
+    parser.add_argument(
+        dest="csvfile",
+        default=None,
+        help="CSV library file (default: %(default)s)",
+        metavar="csvfile")
+
+    parser.add_argument(
+        "-d", "--delimit",
+        dest="delimiter",
+        default="|",
+        help="set the CSV delimiter for export (default: %(default)s)")
+
+    # process options
+    args = parser.parse_args()
+
+    library = SqliteLibrary(args.dbfile, delimiter=args.delimiter)
+    library.read_from_file()
+
+    if args.command == 'import':
+        count = library.import_csv(args.csvfile)
+        print('Imported {} books, {} in {}'.format(
+            count, library.book_count, args.dbfile))
+    else:
+        count = library.export_csv(args.csvfile)
+        print('Exported {} books to {}'.format(count, args.csvfile))
+
+    library.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booksearch.book import Book
+from booksearch.isbnSearch import BaseSearcher, Modes, SearchError
+from booksearch.library import Library
+from booksearch.requery import Requery
+from booksearch.searchStats import SearchStats
+
+# A book the searcher can't be asked about, and one it knows
+FAILING_ISBN = '9780306406157'
+FOUND_ISBN = '9781861972712'
+
+
+class FlakySearcher(BaseSearcher):
+    name = 'flaky.example'
+
+    def lookup(self, isbn, mode):
+        if isbn == FAILING_ISBN:
+            raise SearchError('connection refused')
+        return {'isbn': isbn, 'title': 'Title', 'author': 'Author'}
+
+
+class CheckpointRecordingRequery(Requery):
+    '''Keeps what the checkpoint file held after each write.'''
+
+    def __init__(self, *args, **kwargs):
+        Requery.__init__(self, *args, **kwargs)
+        self.checkpoints = []
+
+    def write_checkpoint(self, identifiers):
+        Requery.write_checkpoint(self, identifiers)
+        with open(self.checkpoint_file, 'rt') as checkpoint:
+            self.checkpoints.append(checkpoint.read().split())
+
+
+class RequeryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = Library(os.path.join(self.directory.name, 'library.csv'))
+        for isbn in (FAILING_ISBN, FOUND_ISBN):
+            self.library.add_book(Book(isbn=isbn))
+
+        searcher = FlakySearcher()
+        searcher.set_stats(SearchStats())
+        self.requery = CheckpointRecordingRequery(
+            self.library,
+            {Modes.ISBN: [searcher], Modes.LCCN: []},
+            max_workers=1,
+            checkpoint_every=1,
+            progress_interval=3600)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_failed_search_is_not_checkpointed(self):
+        self.assertTrue(self.requery.run())
+
+        self.assertEqual(self.requery.failed, 1)
+        self.assertEqual(self.requery.improved, 1)
+        self.assertEqual(self.requery.checkpoints, [[FOUND_ISBN]])
+        self.assertEqual(
+            [b.author for b in self.library.book_list], ['Unknown', 'Author'])
+        self.assertFalse(os.path.exists(self.requery.checkpoint_file))
+
+
+if __name__ == '__main__':
+    unittest.main()